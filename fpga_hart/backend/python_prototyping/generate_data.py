@@ -11,6 +11,8 @@ import torch
 from fpbinary import FpBinary
 from torch import nn
 
+from fpga_hart.backend.python_prototyping.transform_data import (
+    transform_biases, transform_weights, transform_weights_fc)
 from fpga_hart.parser.onnx_parser import OnnxModelParser
 from fpga_hart.utils.graph_manipulation import get_branch_start_end_points
 
@@ -261,170 +263,6 @@ def array_init(arr):
     return ",\n".join([i for i in prev])
 
 
-def transform_weights(
-    weights_raw, coarse_in, coarse_out, wr_factor=1, coarse_group=1, groups=1
-):
-    # parameters
-    num_filters = int(weights_raw.shape[0] / (groups * coarse_out * wr_factor))
-    num_channels = int(weights_raw.shape[1] / coarse_in)
-    kd_size = weights_raw.shape[2]
-    kh_size = weights_raw.shape[3]
-    kw_size = weights_raw.shape[4]
-    print(
-        f"num_filters={num_filters}  |  num_channels={num_channels}  |  kd_size={kd_size}  |  kh_size={kh_size}  |  kw_size={kw_size}"
-    )
-    # correct output shape for weights
-    weights = np.ndarray(
-        shape=(
-            wr_factor,
-            coarse_group,
-            coarse_in,
-            coarse_out,
-            int(groups / coarse_group),
-            num_channels,
-            num_filters,
-            kh_size,
-            kw_size,
-            kd_size,
-        ),
-        dtype=np.float32,
-        order="C",
-    )
-
-    # transform weights raw shape
-    for index, _ in np.ndenumerate(weights):
-        # print(f"index={index}, weights_raw[{index[4]*coarse_group*num_filters*wr_factor*coarse_out+index[1]*num_filters*wr_factor*coarse_out+index[6]*wr_factor*coarse_out+index[0]*coarse_out+index[3]}][{index[5]*coarse_in+index[2]}][{index[9]}][{index[7]}][{index[8]}]")
-        weights[index] = weights_raw[
-            index[4] * coarse_group * num_filters * wr_factor * coarse_out
-            + index[1] * num_filters * wr_factor * coarse_out
-            + index[6] * wr_factor * coarse_out
-            + index[0] * coarse_out
-            + index[3],
-            index[5] * coarse_in + index[2],
-            index[9],
-            index[7],
-            index[8],
-        ]
-    # merge channel and filter dimensions
-    print("*" * 30)
-    print(weights.shape)
-    print(
-        [
-            wr_factor,
-            coarse_in * coarse_group,
-            coarse_out,
-            int(groups / coarse_group) * num_channels,
-            num_filters,
-            kh_size,
-            kw_size,
-            kd_size,
-        ]
-    )
-    weights = np.reshape(
-        weights,
-        [
-            wr_factor,
-            coarse_in * coarse_group,
-            coarse_out,
-            int(groups / coarse_group) * num_channels,
-            num_filters,
-            kh_size,
-            kw_size,
-            kd_size,
-        ],
-    )
-    # print(weights)
-    print(weights.shape)
-    print("*" * 30)
-    # return transformed weights
-    return weights
-
-
-def transform_weights_fc(
-    weights_raw, coarse_in, coarse_out, wr_factor=1,):
-    # parameters
-    num_filters = int(weights_raw.shape[0] / (coarse_out * wr_factor))
-    num_channels = int(weights_raw.shape[1] / coarse_in)
-    print(
-        f"num_filters={num_filters}  |  num_channels={num_channels}"
-    )
-    # correct output shape for weights
-    weights = np.ndarray(
-        shape=(
-            wr_factor,
-            coarse_in,
-            coarse_out,
-            num_channels,
-            num_filters,
-        ),
-        dtype=np.float32,
-        order="C",
-    )
-
-    # transform weights raw shape
-    for index, _ in np.ndenumerate(weights):
-        weights[index] = weights_raw[
-            + index[4] * wr_factor * coarse_out
-            + index[0] * coarse_out
-            + index[2],
-            index[3] * coarse_in + index[1],
-        ]
-
-    # merge channel and filter dimensions
-    print("*" * 30)
-    print(weights.shape)
-
-    weights = np.reshape(
-        weights,
-        [
-            wr_factor,
-            coarse_in,
-            coarse_out,
-            num_channels,
-            num_filters,
-        ],
-    )
-    print(weights.shape)
-    print("*" * 30)
-    # return transformed weights
-    return weights
-
-def transform_biases(
-        biases_raw, coarse_out, wr_factor=1, coarse_group=1, groups=1
-):
-    # parameters
-    num_filters = int(biases_raw.shape[0] / (groups * coarse_out * wr_factor))
-    print(
-        f"num_filters={num_filters}"
-    )
-    # correct output shape for biases
-    biases = np.ndarray(
-        shape=(
-            wr_factor,
-            coarse_group,
-            coarse_out,
-            int(groups / coarse_group),
-            num_filters,
-        ),
-        dtype=np.float32,
-        order="C",
-    )
-
-    # transform biases raw shape
-    for index,_ in np.ndenumerate(biases):
-        biases[index] = biases_raw[index[3]*coarse_group*num_filters*wr_factor*coarse_out+index[1]*num_filters*wr_factor*coarse_out+index[4]*wr_factor*coarse_out+index[0]*coarse_out+index[2]]
-
-    print("*" * 30)
-    print(biases.shape)
-
-    biases = np.reshape(biases,[wr_factor,coarse_out*coarse_group, int(groups/coarse_group)*num_filters])
-
-    print(biases.shape)
-    print("*" * 30)
-
-    # return transformed biases
-    return biases
-
 def create_host_binary(data, fp_int_part, fp_frac_part, coarse_factor, dma_width) -> list:
     # create host binary
     word_bytes = (fp_int_part + fp_frac_part) // 8
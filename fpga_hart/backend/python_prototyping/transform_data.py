@@ -0,0 +1,107 @@
+import numpy as np
+
+
+def transform_weights(
+    weights_raw, coarse_in, coarse_out, wr_factor=1, coarse_group=1, groups=1
+):
+    # parameters
+    num_filters = int(weights_raw.shape[0] / (groups * coarse_out * wr_factor))
+    num_channels = int(weights_raw.shape[1] / coarse_in)
+    kd_size = weights_raw.shape[2]
+    kh_size = weights_raw.shape[3]
+    kw_size = weights_raw.shape[4]
+    print(
+        f"num_filters={num_filters}  |  num_channels={num_channels}  |  kd_size={kd_size}  |  kh_size={kh_size}  |  kw_size={kw_size}"
+    )
+    # split the filters to [groups/coarse_group, coarse_group, num_filters, wr_factor, coarse_out] and the channels to [num_channels, coarse_in]
+    filters = int(groups / coarse_group) * coarse_group * num_filters * wr_factor * coarse_out
+    weights = np.reshape(
+        weights_raw[:filters, : num_channels * coarse_in],
+        [
+            int(groups / coarse_group),
+            coarse_group,
+            num_filters,
+            wr_factor,
+            coarse_out,
+            num_channels,
+            coarse_in,
+            kd_size,
+            kh_size,
+            kw_size,
+        ],
+    )
+    # correct output shape for weights: [wr_factor, coarse_group, coarse_in, coarse_out, groups/coarse_group, num_channels, num_filters, kh_size, kw_size, kd_size]
+    weights = np.ascontiguousarray(
+        weights.transpose(3, 1, 6, 4, 0, 5, 2, 8, 9, 7), dtype=np.float32
+    )
+    # merge channel and filter dimensions
+    print("*" * 30)
+    print(weights.shape)
+    weights = np.reshape(
+        weights,
+        [
+            wr_factor,
+            coarse_in * coarse_group,
+            coarse_out,
+            int(groups / coarse_group) * num_channels,
+            num_filters,
+            kh_size,
+            kw_size,
+            kd_size,
+        ],
+    )
+    print(weights.shape)
+    print("*" * 30)
+    # return transformed weights
+    return weights
+
+
+def transform_weights_fc(
+    weights_raw, coarse_in, coarse_out, wr_factor=1,):
+    # parameters
+    num_filters = int(weights_raw.shape[0] / (coarse_out * wr_factor))
+    num_channels = int(weights_raw.shape[1] / coarse_in)
+    print(
+        f"num_filters={num_filters}  |  num_channels={num_channels}"
+    )
+    # split the filters to [num_filters, wr_factor, coarse_out] and the channels to [num_channels, coarse_in]
+    weights = np.reshape(
+        weights_raw[: num_filters * wr_factor * coarse_out, : num_channels * coarse_in],
+        [num_filters, wr_factor, coarse_out, num_channels, coarse_in],
+    )
+    # correct output shape for weights: [wr_factor, coarse_in, coarse_out, num_channels, num_filters]
+    weights = np.ascontiguousarray(weights.transpose(1, 4, 2, 3, 0), dtype=np.float32)
+
+    print("*" * 30)
+    print(weights.shape)
+    print("*" * 30)
+    # return transformed weights
+    return weights
+
+def transform_biases(
+        biases_raw, coarse_out, wr_factor=1, coarse_group=1, groups=1
+):
+    # parameters
+    num_filters = int(biases_raw.shape[0] / (groups * coarse_out * wr_factor))
+    print(
+        f"num_filters={num_filters}"
+    )
+    # split the filters to [groups/coarse_group, coarse_group, num_filters, wr_factor, coarse_out]
+    filters = int(groups / coarse_group) * coarse_group * num_filters * wr_factor * coarse_out
+    biases = np.reshape(
+        biases_raw[:filters],
+        [int(groups / coarse_group), coarse_group, num_filters, wr_factor, coarse_out],
+    )
+    # correct output shape for biases: [wr_factor, coarse_group, coarse_out, groups/coarse_group, num_filters]
+    biases = np.ascontiguousarray(biases.transpose(3, 1, 4, 0, 2), dtype=np.float32)
+
+    print("*" * 30)
+    print(biases.shape)
+
+    biases = np.reshape(biases,[wr_factor,coarse_out*coarse_group, int(groups/coarse_group)*num_filters])
+
+    print(biases.shape)
+    print("*" * 30)
+
+    # return transformed biases
+    return biases
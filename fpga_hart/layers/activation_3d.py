@@ -91,11 +91,11 @@ class Activation3DLayer(BaseLayer3D):
         supported_ops: list
     ) -> Tuple[float, float]:
 
-        if self.op_type == "Relu":
-            pipeline_depth = 2
-        elif self.op_type == "Sigmoid":
+        # A generic activation block supports every operation in supported_ops, so its depth is the one of the deepest of them
+        pipeline_depth = 2
+        if "Sigmoid" in supported_ops + [self.op_type]:
             pipeline_depth = 28  # 28 cycles is the delay for the execution of math for sigmoid. This value came up from some experiments on HLS.
-        elif self.op_type == "Swish":
+        if "Swish" in supported_ops + [self.op_type]:
             pipeline_depth = 33  # 33 cycles is the delay for the execution of math for swish. This value came up from some experiments on HLS.
 
         muls_relu = 0
@@ -120,9 +120,9 @@ class Activation3DLayer(BaseLayer3D):
         # adds = max(adds_relu, adds_sigmoid, adds_swish)
 
         bram_util = 0
-        dsps_util = (muls / self.dsp) * 100
+        dsps_util = (self.get_dsps(muls) / self.dsp) * 100
 
-        return dsps_util, bram_util, pipeline_depth
+        return dsps_util, bram_util, pipeline_depth, []
 
     def get_dp_info(self):
         dp_info = {}
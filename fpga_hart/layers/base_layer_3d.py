@@ -23,10 +23,14 @@ class BaseLayer3D:
         self.platform = platform
 
         self.word_length = self.platform.word_length
+        self.weights_word_length = self.platform.word_length
         self.clock_freq = self.platform.clock_freq
         self.bram = self.platform.bram
         self.bram_Kbytes = self.platform.bram_Kbytes
+        self.uram = self.platform.uram
+        self.uram_Kbytes = self.platform.uram_Kbytes
         self.dsp = self.platform.dsp
+        self.dsp_type = self.platform.dsp_type
         self.mem_bw = self.platform.mem_bw
         self.fpga_device = self.platform.fpga_device
         self.word_bytes = self.platform.word_bytes
@@ -38,6 +42,27 @@ class BaseLayer3D:
         self.max_BRAM_util = max_BRAM_util
         self.BRAM_CONF_WIDTH = {1: 16384, 2: 8192, 4: 4096, 9: 2048, 18: 1024, 36: 512}
         self.BRAM_CONF_DEPTH = {16384: 1, 8192: 2, 4096: 4, 2048: 9, 1024: 18, 512: 36}
+        # Widths of the (signed) multiplier ports and the number of multiplications that can share a DSP when both operands fit in a given width
+        self.DSP_CONF_WIDTH = {"DSP48E1": (25, 18), "DSP48E2": (27, 18), "DSP58": (27, 24)}
+        self.DSP_CONF_PACKING = {"DSP48E1": {}, "DSP48E2": {4: 4, 8: 2}, "DSP58": {8: 3}}
+        self.URAM_CONF_WIDTH = 72
+        self.URAM_CONF_DEPTH = 4096
+        self.uram_raw = 0
+        self.mem_arrays = []
+
+    def set_word_length(self, word_length, weights_word_length=None):
+        """
+        Sets the precision (bits) of the activations and the weights of the layer. Every BRAM, bandwidth and data size figure of the layer follows its own precision instead of the one of the platform.
+        """
+        assert word_length > 0, "Word length must be greater than zero"
+        self.word_length = word_length
+        self.weights_word_length = (
+            weights_word_length if weights_word_length is not None else word_length
+        )
+        self.word_bytes = self.word_length / 8
+        self.mem_words_per_cycle = (
+            self.mem_bandwidth / self.word_length
+        ) / self.cycles_per_sec
 
     def bram_stream_resource_model(self, depth, width):
         assert width > 0, "width must be greater than zero"
@@ -112,10 +137,88 @@ class BaseLayer3D:
         # return the ceiling
         return math.ceil(depth / bram_depth)
 
+    def uram_memory_resource_model(self, depth, width, arrays=1):
+        assert width > 0, "width must be greater than zero"
+
+        # if there is zero depth, return no URAM usage
+        if depth == 0:
+            return 0
+
+        # arrays that are accessed on the same address share the (fixed) width of the URAM
+        arrays_per_uram = max(self.URAM_CONF_WIDTH // width, 1)
+        urams_width = math.ceil(arrays / arrays_per_uram) * math.ceil(
+            width / self.URAM_CONF_WIDTH
+        )
+
+        # return the ceiling
+        return urams_width * math.ceil(depth / self.URAM_CONF_DEPTH)
+
+    def get_mem_array(self, depth, width, arrays, brams):
+        return {
+            "BRAM": brams,
+            "URAM": self.uram_memory_resource_model(depth, width, arrays=arrays),
+            "pool": "BRAM",
+        }
+
+    def allocate_uram(self, bram_raw, mem_arrays):
+        """
+        Maps the memory arrays onto URAM in order of BRAMs saved per URAM, as long as the URAM utilization stays within max_BRAM_util. bram_raw includes the arrays currently mapped onto BRAM and the mapping is recomputed from scratch, so the arrays of several layers can be re-allocated together. Returns the BRAMs and URAMs after the mapping.
+        """
+        uram_raw = 0
+        for array in mem_arrays:
+            if array["pool"] == "URAM":
+                bram_raw += array["BRAM"]
+                array["pool"] = "BRAM"
+        if self.uram == 0:
+            return bram_raw, uram_raw
+
+        uram_budget = math.floor(self.uram * self.max_BRAM_util / 100)
+        for array in sorted(
+            mem_arrays, key=lambda x: x["BRAM"] / max(x["URAM"], 1), reverse=True
+        ):
+            if uram_raw + array["URAM"] > uram_budget:
+                continue
+            array["pool"] = "URAM"
+            uram_raw += array["URAM"]
+            bram_raw -= array["BRAM"]
+        return bram_raw, uram_raw
+
     def dsp_multiplier_resource_model(
         self, multiplicand_width, multiplier_width, dsp_type="DSP48E1"
     ):
-        return math.ceil((multiplicand_width + multiplier_width) / 48)
+        """
+        DSPs needed for a single multiplication. Narrow operands are packed so that several multiplications sharing one of their operands use the same DSP, while operands wider than the ports of the DSP are split over a cascade of DSPs.
+        """
+        assert dsp_type in self.DSP_CONF_WIDTH, f"DSP type {dsp_type} is not supported"
+        for width, muls_per_dsp in sorted(self.DSP_CONF_PACKING[dsp_type].items()):
+            if max(multiplicand_width, multiplier_width) <= width:
+                return 1 / muls_per_dsp
+
+        port_a, port_b = self.DSP_CONF_WIDTH[dsp_type]
+        width_a = max(multiplicand_width, multiplier_width)
+        width_b = min(multiplicand_width, multiplier_width)
+        return math.ceil(width_a / port_a) * math.ceil(width_b / port_b)
+
+    def get_dsps(self, muls):
+        """
+        DSPs of the device used by muls parallel multiplications of activations with weights (or activations) at the precision of the layer.
+        """
+        return math.ceil(
+            muls
+            * self.dsp_multiplier_resource_model(
+                self.word_length, self.weights_word_length, dsp_type=self.dsp_type
+            )
+        )
+
+    def get_wr_latency(self, pass_cycles, wr_factor, reload_cycles, double_buffer=False):
+        """
+        Latency (cycles) of wr_factor passes over the partition, each one needing reload_cycles to bring the next weights tile on-chip. With double buffered weights the next tile is loaded while the current one is used, so only the part of the reload that exceeds a pass is exposed.
+        """
+        if double_buffer:
+            return pass_cycles * wr_factor + (wr_factor - 1) * max(
+                reload_cycles - pass_cycles, 0
+            )
+        return pass_cycles * wr_factor + (wr_factor - 1) * reload_cycles
 
     def get_dp_performance(
         self,
@@ -131,12 +234,21 @@ class BaseLayer3D:
         coarse_out=1,
         fine=1,
         coarse_inout=1,
-        wr_factor=1
+        wr_factor=1,
+        map_uram=True,
+        stream_weights=None,
+        double_buffer_weights=None,
     ):
+        # The weights buffering of the layer is used unless it is overridden by the caller
+        if stream_weights is None:
+            stream_weights = self.stream_weights
+        if double_buffer_weights is None:
+            double_buffer_weights = self.double_buffer_weights
         # mem_kb = (mem * self.word_bytes) / 1e3
         # mem_bram = math.ceil(mem_kb / self.bram_Kbytes) #* coarse_in * coarse_out
         mem_kb_total = 0
         bram_raw = 0
+        mem_arrays = []
 
         if "sw_lb_3d" in layer_fifos_arrays.keys():
             filters, channels, kd, kh, kw = kernel_shape
@@ -176,10 +288,12 @@ class BaseLayer3D:
             weights_depth = int(
                 (kd * kh * kw * channels * filters) / (fine * coarse_in * coarse_out)
             )
-            if self.double_buffer_weights:
+            if double_buffer_weights:
                 weights_depth *= 2
-            weights_bram = self.bram_memory_resource_model(weights_depth, self.word_length)
-            if weights_depth < 100:
+            weights_bram = self.bram_memory_resource_model(
+                weights_depth, self.weights_word_length
+            )
+            if weights_depth < 100 or stream_weights:
                 weights_bram = 0
             # print(f"WEIGHTS: depth={weights_depth},\tbram={weights_bram},\tcoarse_factors={fine * coarse_in * coarse_out},\ttotal_bram={weights_bram * fine * coarse_in * coarse_out}\t{sw_brams * coarse_in}\t{(fifo_accumulator_brams + array_accumulator_brams) * coarse_in * coarse_out}")
 
@@ -190,6 +304,15 @@ class BaseLayer3D:
                 * coarse_out
                 + weights_bram * fine * coarse_in * coarse_out
             )
+            if weights_bram > 0:
+                mem_arrays.append(
+                    self.get_mem_array(
+                        weights_depth,
+                        self.weights_word_length,
+                        fine * coarse_in * coarse_out,
+                        weights_bram * fine * coarse_in * coarse_out,
+                    )
+                )
         if "pool_sw_lb_3d" in layer_fifos_arrays.keys():
             filters, channels, kd, kh, kw = kernel_shape
             line_buffer_3d_brams = self.bram_stream_resource_model(
@@ -218,11 +341,20 @@ class BaseLayer3D:
 
         if "fc_array" in layer_fifos_arrays.keys():
             array_fc_brams = self.bram_memory_resource_model(
-                layer_fifos_arrays["fc_array"], self.word_length
+                layer_fifos_arrays["fc_array"], self.weights_word_length
             )
             if layer_fifos_arrays["fc_array"] < 100:
                 array_fc_brams = 0
             bram_raw += array_fc_brams * coarse_out # coarse_in
+            if array_fc_brams > 0:
+                mem_arrays.append(
+                    self.get_mem_array(
+                        layer_fifos_arrays["fc_array"],
+                        self.weights_word_length,
+                        coarse_out,
+                        array_fc_brams * coarse_out,
+                    )
+                )
 
         if "gap_array" in layer_fifos_arrays.keys():
             array_gap_brams = self.bram_memory_resource_model(
@@ -232,12 +364,23 @@ class BaseLayer3D:
                 array_gap_brams = 0
             bram_raw += array_gap_brams * coarse_inout
 
+        # The weights arrays are kept in mem_arrays so that the URAM mapping can be recomputed together with the rest of the layers of a partition. Without map_uram the figures are BRAM-only and the mapping is left to whoever sums the layers.
+        self.uram_raw = 0
+        if map_uram:
+            bram_raw, self.uram_raw = self.allocate_uram(bram_raw, mem_arrays)
+        self.mem_arrays = mem_arrays
+
         bram_util = (bram_raw / self.bram) * 100
-        dsps_util = (muls / self.dsp) * 100
-        dsp_raw = muls
+        dsp_raw = self.get_dsps(muls)
+        dsps_util = (dsp_raw / self.dsp) * 100
 
         # latency_cycles = (np.max(np.abs(ii))) * batch + depth
-        latency_cycles = ((np.max(np.abs(ii))) * batch + depth) * wr_factor + (wr_factor - 1) * np.prod(np.array(kernel_shape))
+        latency_cycles = self.get_wr_latency(
+            (np.max(np.abs(ii))) * batch + depth,
+            wr_factor,
+            np.prod(np.array(kernel_shape)),
+            double_buffer=double_buffer_weights,
+        )
         latency_sec = latency_cycles / self.cycles_per_sec
 
         thr_in = (batch * workload_matrix[0, 0]) / latency_sec  # Input words per second
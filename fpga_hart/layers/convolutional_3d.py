@@ -104,6 +104,7 @@ class Convolutional3DLayer(BaseLayer3D):
         self.total_bw_util = 0
         self.config = []
         self.wr_factor = 1
+        self.rate_weights = 0
         self.dsps_util = 0
         self.dsp_raw = 0
         self.bram_util = 0
@@ -163,6 +164,7 @@ class Convolutional3DLayer(BaseLayer3D):
         dp_info["memBwUtil"] = self.total_bw_util
         dp_info["config"] = self.config
         dp_info["wr_factor"] = self.wr_factor
+        dp_info["rateWeights"] = self.rate_weights
 
         return dp_info
 
@@ -321,6 +323,10 @@ class Convolutional3DLayer(BaseLayer3D):
                 max_parallel_adds,
                 layer_fifos_arrays,
                 0,
+                map_uram=False,
+                # The minimum utilization assumes that the weights are kept on-chip in a single buffer
+                stream_weights=False,
+                double_buffer_weights=False,
                 kernel_shape=[self.filters, self.channels, self.kd, self.kh, self.kw],
                 coarse_in=math.ceil(self.channels * f_coarseIn),
                 coarse_out=math.ceil(self.filters * f_coarseOut),
@@ -344,6 +350,10 @@ class Convolutional3DLayer(BaseLayer3D):
                 max_parallel_adds,
                 layer_fifos_arrays,
                 0,
+                map_uram=False,
+                # The minimum utilization assumes that the weights are kept on-chip in a single buffer
+                stream_weights=False,
+                double_buffer_weights=False,
                 kernel_shape=[
                     self.filters / self.groups,
                     self.channels,
@@ -356,7 +366,7 @@ class Convolutional3DLayer(BaseLayer3D):
                 fine=math.ceil(kernel_elems * f_fine),
             )
 
-        return dsps_util, bram_util, pipeline_depth
+        return dsps_util, bram_util, pipeline_depth, self.mem_arrays
 
     def get_design_point(
         self,
@@ -366,9 +376,13 @@ class Convolutional3DLayer(BaseLayer3D):
         mem_bw_in: int,
         mem_bw_out: int,
         wr_factor: int = 1,
-        ignore_bw_util: bool = False
+        ignore_bw_util: bool = False,
+        stream_weights: bool = False,
+        double_buffer_weights: bool = False,
     ) -> dict:
         self.update_layer()
+        self.stream_weights = stream_weights
+        self.double_buffer_weights = double_buffer_weights
 
         if self.depthwise:
             assert (
@@ -549,20 +563,23 @@ class Convolutional3DLayer(BaseLayer3D):
         layer_mem_bw_out = (
             abs(gamma_matrix[-1, -1]) * self.cycles_per_sec * self.word_length
         )
+        workload_matrix = self.get_workload_matrix()
+        ii_matrix = np.nan_to_num(workload_matrix / gamma_matrix)
+        _logger.debug("II:\n{}".format(ii_matrix))
+
         layer_mem_bw_weights = 0
+        rate_weights = 0
         if self.stream_weights:
+            # Streamed weights are not reused on-chip, so every multiplication of the layer consumes a new weight word
+            rate_weights = self.get_total_workload() / np.max(np.abs(ii_matrix))
             layer_mem_bw_weights = (
-                abs(conv_gamma) * self.cycles_per_sec * self.word_length * (f_fine*self.kh*self.kw*self.kd)
+                rate_weights * self.cycles_per_sec * self.weights_word_length
             )
         total_bw_util = (
             (layer_mem_bw_in + layer_mem_bw_out + layer_mem_bw_weights) / self.mem_bandwidth
         ) * 100
         assert total_bw_util <= 100 + 1e-6 or ignore_bw_util, f"Total BW utilization ({total_bw_util:.2f}) is greater than 100%"
 
-        workload_matrix = self.get_workload_matrix()
-        ii_matrix = np.nan_to_num(workload_matrix / gamma_matrix)
-        _logger.debug("II:\n{}".format(ii_matrix))
-
         if not self.depthwise:
             (
                 latency_sec,
@@ -652,6 +669,7 @@ class Convolutional3DLayer(BaseLayer3D):
             ]
             self.config = config
             self.wr_factor = wr_factor
+            self.rate_weights = rate_weights
             self.memoryKB = memKBs
             self.dsps_util = dsps_util
             self.dsp_raw = dsp_raw
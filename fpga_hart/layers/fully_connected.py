@@ -117,11 +117,12 @@ class FCLayer(BaseLayer3D):
             adds,
             layer_fifos_arrays,
             0,
+            map_uram=False,
             coarse_in=math.ceil(self.dim_in * f_coarseIn),
             coarse_out=math.ceil(self.dim_out * f_coarseOut),
         )
 
-        return dsps_util, bram_util, pipeline_depth
+        return dsps_util, bram_util, pipeline_depth, self.mem_arrays
 
     def get_num_streams(self):
         self.max_streams_in = self.dim_in
@@ -99,10 +99,11 @@ class GAP3DLayer(BaseLayer3D):
             adds,
             layer_fifos_arrays,
             0,
+            map_uram=False,
             coarse_inout=math.ceil(self.channels * f_coarse_inout),
         )
 
-        return dsps_util, bram_util, pipeline_depth
+        return dsps_util, bram_util, pipeline_depth, self.mem_arrays
 
     def get_dp_info(self):
         dp_info = {}
@@ -204,12 +204,13 @@ class Pooling3DLayer(BaseLayer3D):
             max_parallel_adds,
             layer_fifos_arrays,
             0,
+            map_uram=False,
             kernel_shape=[self.channels, self.channels, self.kd, self.kh, self.kw],
             coarse_inout=math.ceil(self.channels * f_coarse_inout),
             fine=math.ceil(kernel_elems * f_fine),
         )
 
-        return dsps_util, bram_util, pipeline_depth
+        return dsps_util, bram_util, pipeline_depth, self.mem_arrays
 
     def get_design_point(
         self,
@@ -0,0 +1,195 @@
+import math
+import re
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+
+from fpga_hart import _logger
+from fpga_hart.platform.platform import Platform
+
+
+def get_request_stream(num_requests: int, request_rate: float) -> list:
+    """
+    Arrival times (seconds) of a stream of num_requests volumes arriving with a constant request_rate (volumes/s). A request_rate of 0 means that all the requests are available at the beginning.
+    """
+    if request_rate <= 0:
+        return [0.0] * num_requests
+    return [i / request_rate for i in range(num_requests)]
+
+
+def get_repeat_positions(name: str) -> tuple:
+    """
+    Positions in the network order of the repeats of a partition named part_i+j+k (optionally followed by _splitN) along with its split index, or None if the name does not follow this convention.
+    """
+    match = re.fullmatch(r"part_(\d+(?:\+\d+)*)(?:_split(\d+))?", name)
+    if match is None:
+        return None
+    return [int(i) for i in match.group(1).split("+")], int(match.group(2) or 0)
+
+
+@dataclass
+class BatchScheduler:
+    """
+    Schedules a stream of requests over the partitions of a network that are executed one after the other on a single reconfigurable device. The requests are grouped so that every partition (and its repetitions) runs over the whole group before the device is reconfigured for the next one, with the size of each group bounded by the off-chip memory that holds the intermediate feature maps of the group.
+    """
+
+    partitions: pd.DataFrame
+    batch_size: int
+    platform: Platform
+    ddr_capacity: float
+    max_group_size: int = 0
+
+    def __post_init__(self) -> None:
+        # The latencies of the partitions are reported for the configured batch size and include the
+        # passes over the tiles of the reloaded weights, so the II is recovered from a single pass
+        self.stages = []
+        for _, row in self.partitions.iterrows():
+            wr_factor = max(int(row["Times Weights Reloading"]), 1)
+            reload_cycles = row["Weights Reload(C)"]
+            double_buffer = bool(row["Double Buffered Weights"])
+            if not double_buffer:
+                pass_cycles = (row["latency(C)"] - (wr_factor - 1) * reload_cycles) / wr_factor
+            elif reload_cycles <= row["latency(C)"] / wr_factor:
+                pass_cycles = row["latency(C)"] / wr_factor
+            else:
+                pass_cycles = row["latency(C)"] - (wr_factor - 1) * reload_cycles
+            self.stages.append(
+                {
+                    "name": row["Partition Name"],
+                    "ii": (pass_cycles - row["depth"]) / self.batch_size,
+                    "depth": row["depth"],
+                    "wr_factor": wr_factor,
+                    "reload_cycles": reload_cycles,
+                    "double_buffer": double_buffer,
+                    "times_repeated": int(row["Times Repeated"]),
+                    "fmap_size": row["dataSizeIn(MB)"] + row["dataSizeOut(MB)"],
+                }
+            )
+        assert self.stages, "There are no partitions to schedule"
+
+        # The repeats of a partition are not necessarily contiguous in the network, so each one is executed at the position of the partition it stands for. Without positions in the names the repeats are executed back-to-back in the order of the partitions
+        if all(get_repeat_positions(stage["name"]) for stage in self.stages):
+            expanded = []
+            for stage in self.stages:
+                positions, split = get_repeat_positions(stage["name"])
+                assert (
+                    len(positions) == stage["times_repeated"]
+                ), f"Partition {stage['name']} is repeated {stage['times_repeated']} times but its name holds {len(positions)} positions"
+                for position in positions:
+                    expanded.append(((position, split), dict(stage, times_repeated=1)))
+            self.stages = [stage for _, stage in sorted(expanded, key=lambda x: x[0])]
+
+        self.group_size_limit = self.get_group_size_limit()
+
+    def get_group_size_limit(self) -> int:
+        """
+        The largest group of volumes whose input and output feature maps fit in the off-chip memory for every partition.
+        """
+        max_fmap_size = max(stage["fmap_size"] for stage in self.stages)
+        group_size_limit = (
+            math.floor(self.ddr_capacity / max_fmap_size) if max_fmap_size > 0 else math.inf
+        )
+        if self.max_group_size > 0:
+            group_size_limit = min(group_size_limit, self.max_group_size)
+        if group_size_limit < 1:
+            _logger.warning(
+                f"The feature maps of a single volume ({max_fmap_size:.2f} MB) do not fit in {self.ddr_capacity} MB of off-chip memory. Scheduling one volume at a time."
+            )
+            group_size_limit = 1
+        return group_size_limit
+
+    def get_stage_latency(self, stage: dict, group_size: int) -> float:
+        """
+        Latency (seconds) of running a group of volumes through a partition, reloading its weights
+        wr_factor times for the whole group.
+        """
+        pass_cycles = stage["ii"] * group_size + stage["depth"]
+        if stage["double_buffer"]:
+            reload_cycles = max(stage["reload_cycles"] - pass_cycles, 0)
+        else:
+            reload_cycles = stage["reload_cycles"]
+        latency_cycles = (
+            pass_cycles * stage["wr_factor"] + (stage["wr_factor"] - 1) * reload_cycles
+        )
+        return stage["times_repeated"] * latency_cycles / self.platform.cycles_per_sec
+
+    def get_group_latency(self, group_size: int, loaded_partition: str = None) -> tuple:
+        """
+        Latency (seconds) and number of reconfigurations needed to run a group of volumes through all the partitions, starting from the partition that is currently loaded on the device.
+        """
+        latency = 0
+        num_reconfig = 0
+        for stage in self.stages:
+            if stage["name"] != loaded_partition:
+                latency += self.platform.reconfiguration_time
+                num_reconfig += 1
+            latency += self.get_stage_latency(stage, group_size)
+            loaded_partition = stage["name"]
+        return latency, num_reconfig
+
+    def schedule(self, arrivals: list) -> dict:
+        """
+        Greedily builds the schedule of a request stream. Whenever the device is free the next group is chosen among the sizes that can be formed from the pending and the upcoming requests, picking the one that maximizes the volumes/s of the device from the current time until the end of the group, i.e. waiting for more requests only when the amortization of the reconfigurations pays for the idle time.
+        """
+        arrivals = sorted(arrivals)
+        num_requests = len(arrivals)
+        schedule = []
+        completion = np.zeros(num_requests)
+        loaded_partition = None
+        num_reconfig = 0
+        time = 0.0
+        next_request = 0
+        group = 0
+        while next_request < num_requests:
+            time = max(time, arrivals[next_request])
+            pending = np.searchsorted(arrivals, time, side="right") - next_request
+            max_group = min(self.group_size_limit, num_requests - next_request)
+
+            best_group_size, best_rate = None, -1
+            for group_size in range(min(max(pending, 1), max_group), max_group + 1):
+                start = max(time, arrivals[next_request + group_size - 1])
+                latency, _ = self.get_group_latency(group_size, loaded_partition)
+                rate = group_size / (start + latency - time)
+                if rate > best_rate:
+                    best_group_size, best_rate = group_size, rate
+            group_size = best_group_size
+
+            time = max(time, arrivals[next_request + group_size - 1])
+            for stage in self.stages:
+                reconfigure = stage["name"] != loaded_partition
+                if reconfigure:
+                    time += self.platform.reconfiguration_time
+                    num_reconfig += 1
+                stage_latency = self.get_stage_latency(stage, group_size)
+                schedule.append(
+                    {
+                        "Group": group,
+                        "Partition": stage["name"],
+                        "Requests": [next_request, next_request + group_size - 1],
+                        "Volumes": group_size,
+                        "Reconfigure": reconfigure,
+                        "start(S)": time,
+                        "end(S)": time + stage_latency,
+                    }
+                )
+                time += stage_latency
+                loaded_partition = stage["name"]
+            completion[next_request : next_request + group_size] = time
+            next_request += group_size
+            group += 1
+
+        makespan = time - arrivals[0]
+        metrics = {
+            "Requests": num_requests,
+            "Groups": group,
+            "Max group size": min(self.group_size_limit, num_requests),
+            "Reconfigurations": num_reconfig,
+            "Makespan(S)": makespan,
+            "Volumes/s": num_requests / makespan,
+            "Average latency(S)": float(np.mean(completion - np.array(arrivals))),
+        }
+        _logger.info(
+            f"Scheduled {num_requests} requests in {group} groups with {num_reconfig} reconfigurations: {metrics['Volumes/s']:.2f} volumes/s."
+        )
+        return {"metrics": metrics, "schedule": schedule}
@@ -1,6 +1,5 @@
 import json
 import os
-import random
 import shutil
 from copy import copy, deepcopy
 from dataclasses import dataclass
@@ -20,9 +19,11 @@ from fpga_hart.layers.elemwise_3d import ElementWise3DLayer
 from fpga_hart.layers.fully_connected import FCLayer
 from fpga_hart.layers.gap_3d import GAP3DLayer
 from fpga_hart.layers.pooling_3d import Pooling3DLayer
+from fpga_hart.network.batch_scheduler import BatchScheduler, get_request_stream
 from fpga_hart.optimizer.optimizer_helper import (
     add_off_chip_connections,
     calculate_wr_factor,
+    get_combined_bram_util,
     get_minimum_resource_utilization,
     get_off_chip_mem_connections,
     get_worst_case_buffering,
@@ -32,11 +33,43 @@ from fpga_hart.partitions.partition_compose import PartitionComposer
 from fpga_hart.partitions.partition_parser import PartitionParser
 from fpga_hart.platform.platform import Platform
 from fpga_hart.utils.graph_manipulation import visualize_graph
-from fpga_hart.utils.utils import get_conv_type, get_pool_type, num_sort
+from fpga_hart.utils.utils import get_conv_type, get_pool_type
 
 plt.style.use(["science", "ieee", "grid"])
 
 
+def get_shortest_partitioning(num_layers: int, candidates: dict, partition_cost) -> tuple:
+    """
+    Shortest path over a sequence of num_layers layers, where candidates maps every partition start to its allowed ends and partition_cost(start, end) returns the cost of a partition along with its specs.
+    The cost of a path is (number of layers in invalid partitions, latency in seconds) summed over its partitions and compared lexicographically.
+    Returns the (start, end, specs) of the partitions in order along with the total cost, or (None, None) if the end of the sequence cannot be reached.
+    """
+    best_cost = {0: (0, 0.0)}
+    best_prev = {}
+    best_specs = {}
+    for start in sorted(candidates):
+        if start not in best_cost:
+            continue
+        for end in candidates[start]:
+            (invalid, latency), specs = partition_cost(start, end)
+            cost = (best_cost[start][0] + invalid, best_cost[start][1] + latency)
+            if end not in best_cost or cost < best_cost[end]:
+                best_cost[end] = cost
+                best_prev[end] = start
+                best_specs[end] = specs
+
+    if num_layers not in best_cost:
+        return None, None
+
+    partitions = []
+    end = num_layers
+    while end != 0:
+        partitions.append((best_prev[end], end, best_specs[end]))
+        end = best_prev[end]
+    partitions.reverse()
+    return partitions, best_cost[num_layers]
+
+
 @dataclass
 class NetworkParser(ModelLayerDescriptor):
     batch_size: int
@@ -57,7 +90,10 @@ class NetworkParser(ModelLayerDescriptor):
             max_DSP_util=self.config.max_dsp_util,
             max_BRAM_util=self.config.max_bram_util,
             platform=self.platform,
+            batch_size=self.batch_size,
         )
+        self.partition_composers = {self.platform.fpga_device: self.partition_composer}
+        self.partition_utilization_cache = {}
         self.partition_parser = PartitionParser(
             model_name=self.model_name,
             se_block=False,
@@ -69,7 +105,7 @@ class NetworkParser(ModelLayerDescriptor):
             enable_wandb=self.enable_wandb,
         )
 
-    def get_reconfig_points(self):
+    def get_available_reconfig_points(self):
         available_reconfig_points = [
             layer
             for layer in self.layers
@@ -87,115 +123,248 @@ class NetworkParser(ModelLayerDescriptor):
         for rp in remove_io_nodes:
             available_reconfig_points.remove(rp)
 
-        rp_idx = 0
-        while rp_idx <= self.num_reconfig_points:
-            reconfig_points = random.sample(
-                available_reconfig_points, self.num_reconfig_points
-            )
-            reconfig_points.sort(key=num_sort)
-
-            rp_idx = 0
-            layers_counter = 0
-            for layer in self.layers:
-                if (
-                    rp_idx < self.num_reconfig_points
-                    and layer == reconfig_points[rp_idx]
-                ):
-                    if (
-                        layers_counter < self.min_partition_layers
-                        or layers_counter > self.max_partition_layers
-                    ):
-                        _logger.debug(
-                            f"Reconfig point {reconfig_points[rp_idx]} number of layers {layers_counter} is not within the allowed range {self.min_partition_layers} <= num layers <= {self.max_partition_layers}. Reconfiguring..."
-                        )
-                        break
-                    else:
-                        layers_counter = 0
-                        rp_idx += 1
-                layers_counter += 1
-            if (
-                layers_counter < self.min_partition_layers
-                or layers_counter > self.max_partition_layers
-            ):
-                _logger.debug(
-                    f"Final reconfig point number of layers {layers_counter} is not within the allowed range {self.min_partition_layers} <= num layers <= {self.max_partition_layers}. Reconfiguring..."
-                )
-            else:
-                rp_idx += 1
-        return reconfig_points
-
-    def get_partitions(self):
-        reconfig_points = self.get_reconfig_points()
-        model_layers = list(self.layers.keys())
-
-        partitions = dict()
-        for i, rp in enumerate(reconfig_points):
-            partition_specs = dict()
-            current_partition = []
-            for layer in model_layers:
-                if layer == rp:
-                    break
-                current_partition.append(layer)
+        return available_reconfig_points
+
+    def get_partition_composer(self, platform=None):
+        if platform is None:
+            platform = self.platform
+        if platform.fpga_device not in self.partition_composers:
+            self.partition_composers[platform.fpga_device] = PartitionComposer(
+                max_DSP_util=self.config.max_dsp_util,
+                max_BRAM_util=self.config.max_bram_util,
+                platform=platform,
+                batch_size=self.batch_size,
+            )
+        return self.partition_composers[platform.fpga_device]
 
-            partition_name = f"part_{i}"
-            partition_specs["layers"] = current_partition
+    def get_link_words_per_cycle(self, platform):
+        return (
+            self.config.link_bandwidth * 1e9 / platform.word_length
+        ) / platform.cycles_per_sec
+
+    def get_partition_latency(
+        self, graph, wr_factor=1, platform=None, link_in=False, link_out=False
+    ):
+        """
+        Estimates the latency (in seconds) of a partition for the configured batch size, assuming that the DSPs of the device are distributed among the layers proportionally to their workload.
+        The initiation interval is bounded by either the computation or the off-chip transfers of the partition. The inputs (link_in) and outputs (link_out) of a pipeline stage are transferred over the inter-device link instead of the device memory.
+        """
+        if platform is None:
+            platform = self.platform
+        dsps = platform.dsp * self.config.max_dsp_util / 100
+        total_workload = 0
+        total_depth = 0
+        wr_kernel_shape = [1, 1, 1, 1, 1]
+        for layer in nx.topological_sort(graph):
+            hw = graph.nodes[layer]["hw"]
+            total_workload += hw.get_total_workload()
+            _, _, pipeline_depth, _, _ = get_minimum_resource_utilization(
+                hw, gap_approx=self.gap_approx
+            )
+            total_depth += pipeline_depth
+            if isinstance(hw, Convolutional3DLayer):
+                wr_kernel_shape = [hw.filters, hw.channels] + hw.kernel_shape
 
-            part_graph = self.create_graph(current_partition)
-            partition_specs["graph"] = part_graph
+        nodes_in, nodes_out = get_off_chip_mem_connections(graph)
+        data_in = sum(
+            np.prod(np.array(graph.nodes[n]["hw"].input_shape[1:])) for n in nodes_in
+        )
+        data_out = sum(
+            np.prod(np.array(graph.nodes[n]["hw"].output_shape[1:]))
+            for n in nodes_out
+        )
 
-            bram_util, dsp_util, layers_bram, branch_bram = (
-                self.get_partition_utilization(part_graph)
+        mem_data = (0 if link_in else data_in) + (0 if link_out else data_out)
+        transfer_cycles = mem_data / platform.mem_words_per_cycle
+        if link_in:
+            transfer_cycles = max(
+                transfer_cycles, data_in / self.get_link_words_per_cycle(platform)
             )
-
-            _logger.debug(
-                f"Partition {partition_name} has {len(current_partition)} layers, BRAM utilization = {bram_util:.2f} (layers BRAM = {layers_bram:.2f}, branch BRAM = {branch_bram:.2f}), DSP utilization = {dsp_util:.2f}"
+        if link_out:
+            transfer_cycles = max(
+                transfer_cycles, data_out / self.get_link_words_per_cycle(platform)
             )
-            partition_specs["valid"] = (
-                True
-                if bram_util <= self.config.initial_max_bram_util
-                and dsp_util <= self.config.max_dsp_util
-                else False
+
+        ii = max(total_workload / dsps, transfer_cycles)
+        latency_cycles = (ii * self.batch_size + total_depth) * wr_factor + (
+            wr_factor - 1
+        ) * np.prod(np.array(wr_kernel_shape))
+        return latency_cycles / platform.cycles_per_sec
+
+    def get_candidate_partitions(self, max_partition_layers, platform=None):
+        """
+        Returns the model layers along with the allowed ends of a partition for every allowed partition start (indices in the layer sequence).
+        Partitions start at an allowed reconfiguration layer and span at most max_partition_layers layers. A partition is not extended further once the layers before its last Conv (which can be weights reloaded) exceed the BRAM budget, or once the minimum DSP utilization of its layers exceeds the DSP budget.
+        """
+        if platform is None:
+            platform = self.platform
+        model_layers = list(self.layers.keys())
+        num_layers = len(model_layers)
+        available_reconfig_points = set(self.get_available_reconfig_points())
+        boundaries = [0] + [
+            i
+            for i, layer in enumerate(model_layers)
+            if i > 0 and layer in available_reconfig_points
+        ]
+        boundaries.append(num_layers)
+
+        model_graph = self.create_graph(model_layers, platform)
+        layers_bram = []
+        layers_dsp = []
+        layers_mem_arrays = []
+        for layer in model_layers:
+            bram_util, dsp_util, _, _, mem_arrays = get_minimum_resource_utilization(
+                model_graph.nodes[layer]["hw"], gap_approx=self.gap_approx
             )
-            partition_specs["weights_reloading"] = 1
+            layers_bram.append(bram_util)
+            layers_dsp.append(dsp_util)
+            layers_mem_arrays.append(mem_arrays)
+        layers_bram_prefix = np.concatenate(([0], np.cumsum(layers_bram)))
+        layers_dsp_prefix = np.concatenate(([0], np.cumsum(layers_dsp)))
+        hw = model_graph.nodes[model_layers[0]]["hw"]
+        conv_idxs = [
+            i
+            for i, layer in enumerate(model_layers)
+            if self.layers[layer]["operation"] == "Conv"
+        ]
 
-            partition_specs["total_bram"] = bram_util
-            partition_specs["total_dsp"] = dsp_util
-            partition_specs["layers_bram"] = layers_bram
-            partition_specs["branch_bram"] = branch_bram
+        candidates = {}
+        for b_idx, start in enumerate(boundaries[:-1]):
+            candidates[start] = []
+            for end in boundaries[b_idx + 1 :]:
+                if end - start > max_partition_layers:
+                    break
+                if end - start < self.min_partition_layers:
+                    continue
 
-            partitions[partition_name] = partition_specs
-            model_layers = model_layers[model_layers.index(rp) :]
+                last_conv = max(
+                    [i for i in conv_idxs if start <= i < end], default=end
+                )
+                overflow = (
+                    get_combined_bram_util(
+                        hw,
+                        layers_bram_prefix[last_conv] - layers_bram_prefix[start],
+                        sum(layers_mem_arrays[start:last_conv], []),
+                    )
+                    > self.config.initial_max_bram_util
+                    or layers_dsp_prefix[end] - layers_dsp_prefix[start]
+                    > self.config.max_dsp_util
+                )
+                if overflow and candidates[start]:
+                    break
+                candidates[start].append(end)
+                if overflow:
+                    break
 
-        partition_specs = dict()
-        if len(reconfig_points) == 0:
-            partition_name = "part_0"
-        else:
-            partition_name = f"part_{i + 1}"
-        partition_specs["layers"] = model_layers
+        return model_layers, candidates
 
-        part_graph = self.create_graph(model_layers)
-        partition_specs["graph"] = part_graph
-        bram_util, dsp_util, layers_bram, branch_bram = self.get_partition_utilization(
-            part_graph
+    def get_optimal_partitioning(self):
+        """
+        Splits the model into contiguous partitions by solving a shortest path problem over the layer sequence.
+        The cost of each partition is its estimated latency plus the device reconfiguration time, while partitions that do not fit in the device are avoided whenever possible.
+        Returns the specs of the partitions in order.
+        """
+        model_layers, candidates = self.get_candidate_partitions(
+            self.max_partition_layers
         )
+        num_layers = len(model_layers)
 
-        _logger.debug(
-            f"Partition {partition_name} has {len(current_partition)} layers, BRAM utilization = {bram_util:.2f} (layers BRAM = {layers_bram:.2f}, branch BRAM = {branch_bram:.2f}), DSP utilization = {dsp_util:.2f}"
+        def partition_cost(start, end):
+            specs = self.get_partition_specs(model_layers[start:end])
+            latency = self.get_partition_latency(
+                specs["graph"], wr_factor=max(specs["weights_reloading"], 1)
+            )
+            return (
+                0 if specs["valid"] else end - start,
+                latency + self.platform.reconfiguration_time,
+            ), specs
+
+        partitions, total_cost = get_shortest_partitioning(
+            num_layers, candidates, partition_cost
         )
-        partition_specs["valid"] = (
-            True
-            if bram_util <= self.config.initial_max_bram_util
-            and dsp_util <= self.config.max_dsp_util
-            else False
+        if partitions is None:
+            raise ValueError(
+                f"Cannot partition the model with {self.min_partition_layers} <= num layers <= {self.max_partition_layers} per partition"
+            )
+        partitions_specs = [specs for _, _, specs in partitions]
+
+        _logger.info(
+            f"Optimal partitioning into {len(partitions_specs)} partitions with estimated latency {total_cost[1]:.5f} seconds (batch size {self.batch_size}) and {total_cost[0]} layers in invalid partitions."
         )
-        partition_specs["weights_reloading"] = 1
+        return partitions_specs
+
+    def get_pipeline_partitioning(self, platforms):
+        """
+        Maps the model onto a pipeline of devices with one contiguous partition (stage) per device, following the order of the given platforms, so that the latency of the slowest stage is minimized.
+        Consecutive stages exchange their feature maps over the inter-device link, while devices at the end of the list may be left unused.
+        Returns the (specs, platform) of every stage in order.
+        """
+        num_layers = len(self.layers)
+
+        # The cost of a path is (number of layers in invalid stages, latency of the slowest stage in seconds) compared lexicographically
+        best_cost = [{0: (0, 0.0)}] + [{} for _ in platforms]
+        best_prev = [{} for _ in range(len(platforms) + 1)]
+        best_specs = [{} for _ in range(len(platforms) + 1)]
+        stages_cache = {}
+        for k, platform in enumerate(platforms):
+            model_layers, candidates = self.get_candidate_partitions(
+                num_layers, platform
+            )
+            for start, (prev_invalid, prev_latency) in best_cost[k].items():
+                for end in candidates.get(start, []):
+                    cache_key = (start, end, platform.fpga_device)
+                    if cache_key not in stages_cache:
+                        specs = self.get_partition_specs(
+                            model_layers[start:end], platform=platform
+                        )
+                        latency = self.get_partition_latency(
+                            specs["graph"],
+                            wr_factor=max(specs["weights_reloading"], 1),
+                            platform=platform,
+                            link_in=start > 0,
+                            link_out=end < num_layers,
+                        )
+                        stages_cache[cache_key] = (specs, latency)
+                    specs, latency = stages_cache[cache_key]
+                    invalid = 0 if specs["valid"] else end - start
+                    cost = (prev_invalid + invalid, max(prev_latency, latency))
+                    if end not in best_cost[k + 1] or cost < best_cost[k + 1][end]:
+                        best_cost[k + 1][end] = cost
+                        best_prev[k + 1][end] = start
+                        best_specs[k + 1][end] = (specs, platform)
+
+        num_stages = None
+        for k in range(1, len(platforms) + 1):
+            if num_layers in best_cost[k] and (
+                num_stages is None
+                or best_cost[k][num_layers] < best_cost[num_stages][num_layers]
+            ):
+                num_stages = k
+        if num_stages is None:
+            raise ValueError(
+                f"Cannot map the model onto a pipeline of {len(platforms)} devices"
+            )
 
-        partition_specs["total_bram"] = bram_util
-        partition_specs["total_dsp"] = dsp_util
-        partition_specs["layers_bram"] = layers_bram
-        partition_specs["branch_bram"] = branch_bram
+        stages = []
+        end = num_layers
+        for k in range(num_stages, 0, -1):
+            stages.append(best_specs[k][end])
+            end = best_prev[k][end]
+        stages.reverse()
 
-        partitions[partition_name] = partition_specs
+        _logger.info(
+            f"Pipeline of {num_stages} stages with estimated slowest stage latency {best_cost[num_stages][num_layers][1]:.5f} seconds (batch size {self.batch_size}) and {best_cost[num_stages][num_layers][0]} layers in invalid stages."
+        )
+        return stages
+
+    def get_partitions(self):
+        partitions = dict()
+        for i, partition_specs in enumerate(self.get_optimal_partitioning()):
+            partition_name = f"part_{i}"
+            _logger.debug(
+                f"Partition {partition_name} has {len(partition_specs['layers'])} layers, valid = {partition_specs['valid']}, WR factor = {partition_specs['weights_reloading']}"
+            )
+            partitions[partition_name] = partition_specs
 
         return partitions
 
@@ -243,14 +412,36 @@ class NetworkParser(ModelLayerDescriptor):
                 specs["valid"],
             )
 
-    def get_partition_utilization(self, graph, wr_factor=1):
+    def get_partition_utilization(self, graph, wr_factor=1, platform=None):
+        if platform is None:
+            platform = self.platform
+        # The utilization depends only on the layers of the partition and their (possibly weights reloaded) shapes
+        cache_key = (
+            tuple(
+                (layer, tuple(graph.nodes[layer]["hw"].output_shape))
+                for layer in graph.nodes
+            ),
+            wr_factor,
+            platform.fpga_device,
+        )
+        if cache_key in self.partition_utilization_cache:
+            return self.partition_utilization_cache[cache_key]
+
         total_bram_util = 0
         total_dsp_util = 0
+        mem_arrays = []
         for layer in nx.topological_sort(graph):
             # TODO: This has to change into get_resource_utilization with a config file of the hardware nodes so it can be used during optimization
-            bram_util, dsp_util, pipeline_depth, _ = get_minimum_resource_utilization(
+            (
+                bram_util,
+                dsp_util,
+                pipeline_depth,
+                _,
+                layer_mem_arrays,
+            ) = get_minimum_resource_utilization(
                 graph.nodes[layer]["hw"], gap_approx=self.gap_approx
             )
+            mem_arrays += layer_mem_arrays
             _logger.debug(
                 f"Layer {layer}: BRAM utilization = {bram_util:.2f}, DSP utilization = {dsp_util:.2f}, Pipeline depth = {pipeline_depth}"
             )
@@ -259,26 +450,31 @@ class NetworkParser(ModelLayerDescriptor):
             # if total_bram_util > self.config.initial_max_bram_util or total_dsp_util > self.config.max_dsp_util:
             #     _logger.warning(f"Partition BRAM utilization = {total_bram_util:.2f}, DSP utilization = {total_dsp_util:.2f}")
 
+        total_bram_util = get_combined_bram_util(
+            self.get_partition_composer(platform), total_bram_util, mem_arrays
+        )
+
         layers_bram_util = deepcopy(total_bram_util)
         _, min_bram_util = get_worst_case_buffering(
             deepcopy(graph),
-            self.partition_composer,
-            self.platform.mem_words_per_cycle,
-            self.platform.word_bytes,
-            self.platform.bram_Kbytes,
-            self.platform.bram,
+            self.get_partition_composer(platform),
+            platform.mem_words_per_cycle,
+            platform.word_bytes,
+            platform.bram_Kbytes,
+            platform.bram,
             self.gap_approx,
             wr_factor=wr_factor,
         )
         branch_buffering_bram_util = deepcopy(min_bram_util)
         total_bram_util += min_bram_util
 
-        return (
+        self.partition_utilization_cache[cache_key] = (
             total_bram_util,
             total_dsp_util,
             layers_bram_util,
             branch_buffering_bram_util,
         )
+        return self.partition_utilization_cache[cache_key]
 
     def update_partitions(self, partitions):
         for part in partitions.values():
@@ -448,41 +644,38 @@ class NetworkParser(ModelLayerDescriptor):
 
         return partitions, valid_part
 
-    def update_single_partition(self, partitions, name, layers, wr_factor=None):
+    def get_partition_specs(self, layers, graph=None, wr_factor=None, platform=None):
         if wr_factor is None:
-            graph_new = self.create_graph(layers)
-            wr_factor = calculate_wr_factor(
-                graph_new, self.config.initial_max_bram_util
-            )
-        else:
-            graph_new = partitions[name]["graph"]
-        if wr_factor == -1:
-            partitions[name]["layers"] = layers
-            partitions[name]["graph"] = graph_new
-            partitions[name]["valid"] = False
-            partitions[name]["weights_reloading"] = -1
-            return False
+            graph = self.create_graph(layers, platform)
+            wr_factor = calculate_wr_factor(graph, self.config.initial_max_bram_util)
 
         bram_util, dsp_util, layers_bram, branch_bram = self.get_partition_utilization(
-            graph_new, wr_factor=wr_factor
+            graph, wr_factor=max(wr_factor, 1), platform=platform
         )
         part_validity = (
             True
             if bram_util <= self.config.initial_max_bram_util
             and dsp_util <= self.config.max_dsp_util
+            and wr_factor != -1
             else False
         )
 
-        partitions[name]["layers"] = layers
-        partitions[name]["graph"] = graph_new
-        partitions[name]["valid"] = part_validity
-        partitions[name]["weights_reloading"] = wr_factor
-        partitions[name]["total_bram"] = bram_util
-        partitions[name]["total_dsp"] = dsp_util
-        partitions[name]["layers_bram"] = layers_bram
-        partitions[name]["branch_bram"] = branch_bram
+        return {
+            "layers": layers,
+            "graph": graph,
+            "valid": part_validity,
+            "weights_reloading": wr_factor,
+            "total_bram": bram_util,
+            "total_dsp": dsp_util,
+            "layers_bram": layers_bram,
+            "branch_bram": branch_bram,
+        }
 
-        return part_validity
+    def update_single_partition(self, partitions, name, layers, wr_factor=None):
+        graph = None if wr_factor is None else partitions[name]["graph"]
+        partitions[name].update(self.get_partition_specs(layers, graph, wr_factor))
+
+        return partitions[name]["valid"]
 
     def get_candidate_merge_partition(self, partitions, blacklisted_partitions):
         min_bram_util = float("inf")
@@ -511,6 +704,9 @@ class NetworkParser(ModelLayerDescriptor):
         part_wr_factor = partitions[name]["weights_reloading"]
         direction = None
 
+        if len(partitions.keys()) == 1:
+            return direction
+
         if part_number == 0:
             next_part_name = f"part_{part_number + 1}"
             next_part_bram_util = partitions[next_part_name]["total_bram"]
@@ -595,7 +791,10 @@ class NetworkParser(ModelLayerDescriptor):
                 direction = self.get_partition_to_merge(network_partitions, cm_part)
 
                 if direction is not None:
-                    network_partitions_old = deepcopy(network_partitions)
+                    # Merging only replaces the specs of the affected partitions, so a shallow copy of each one is enough to roll back
+                    network_partitions_old = {
+                        name: copy(specs) for name, specs in network_partitions.items()
+                    }
                     network_partitions, valid = self.merge_partition(
                         network_partitions,
                         cm_part,
@@ -683,7 +882,8 @@ class NetworkParser(ModelLayerDescriptor):
                 for file in os.listdir(log_results_path):
                     os.unlink(os.path.join(log_results_path, file))
 
-        batch_size = np.arange(1, 500, 1)
+        # The partition latencies and workloads are reported for the configured batch size
+        batch_size = np.arange(1, max(500, self.batch_size + 1), 1)
         lat_sec = np.sum(
             np.array([
                 (
@@ -691,6 +891,7 @@ class NetworkParser(ModelLayerDescriptor):
                         self.partition_parser.df["latency(C)"][idx]
                         - self.partition_parser.df["depth"][idx]
                     )
+                    / self.batch_size
                     * batch_size
                     + self.partition_parser.df["depth"][idx]
                 )
@@ -709,7 +910,7 @@ class NetworkParser(ModelLayerDescriptor):
             plt.savefig(os.path.join(log_results_path, "latency_vs_batch_size.png"))
         through_gops_sec = np.sum(
             np.array([
-                self.partition_parser.df["GOPs"][idx] * batch_size
+                self.partition_parser.df["GOPs"][idx] / self.batch_size * batch_size
                 for idx in range(self.partition_parser.df["GOPs"].size)
             ]),
             axis=0,
@@ -774,6 +975,7 @@ class NetworkParser(ModelLayerDescriptor):
             "Batch 30": lat_sec[29],
             "Batch 100": lat_sec[99],
             "Batch 250": lat_sec[249],
+            f"Batch {self.batch_size}": lat_sec[self.batch_size - 1],
         }
 
         self.partition_parser.model_avg_metrics["GOPs/s"] = {
@@ -781,26 +983,51 @@ class NetworkParser(ModelLayerDescriptor):
             "Batch 30": through_gops_sec[29],
             "Batch 100": through_gops_sec[99],
             "Batch 250": through_gops_sec[249],
+            f"Batch {self.batch_size}": through_gops_sec[self.batch_size - 1],
         }
         self.partition_parser.model_avg_metrics["Volumes/s"] = {
             "Batch 1": through_vols_sec[0],
             "Batch 30": through_vols_sec[29],
             "Batch 100": through_vols_sec[99],
             "Batch 250": through_vols_sec[249],
+            f"Batch {self.batch_size}": through_vols_sec[self.batch_size - 1],
         }
         self.partition_parser.model_avg_metrics["GOPs/s/DSP"] = {
             "Batch 1": gops_sec_dsp[0],
             "Batch 30": gops_sec_dsp[29],
             "Batch 100": gops_sec_dsp[99],
             "Batch 250": gops_sec_dsp[249],
+            f"Batch {self.batch_size}": gops_sec_dsp[self.batch_size - 1],
         }
         self.partition_parser.model_avg_metrics["GOPs/s/DSP/cycle"] = {
             "Batch 1": gops_sec_dsp_cycle[0],
             "Batch 30": gops_sec_dsp_cycle[29],
             "Batch 100": gops_sec_dsp_cycle[99],
             "Batch 250": gops_sec_dsp_cycle[249],
+            f"Batch {self.batch_size}": gops_sec_dsp_cycle[self.batch_size - 1],
         }
 
+        if self.config.num_requests > 0:
+            scheduler = BatchScheduler(
+                self.partition_parser.df,
+                self.batch_size,
+                self.platform,
+                self.config.ddr_capacity,
+            )
+            batch_schedule = scheduler.schedule(
+                get_request_stream(self.config.num_requests, self.config.request_rate)
+            )
+            self.partition_parser.model_avg_metrics["Schedule"] = batch_schedule[
+                "metrics"
+            ]
+            if not self.enable_wandb:
+                with open(
+                    os.path.join(log_results_path, "batch_schedule.json"), "w"
+                ) as json_file:
+                    json.dump(batch_schedule, json_file, indent=2)
+
+        self.partition_parser.report_roofline()
+
         del self.partition_parser.model_avg_metrics["latency(C)"]
         del self.partition_parser.model_avg_metrics["latency(S)"]
         del self.partition_parser.model_avg_metrics["GOPs"]
@@ -830,7 +1057,86 @@ class NetworkParser(ModelLayerDescriptor):
         # TODO: Instead of generating completely new partitions we can have a new transform that alters a bit the existing partitions by adding or removing layers from previous or next partitions.
         # TODO: I dont like the thing that layers partitions and network are not being connected somehow. It would be nice to have a way to connect them and build the network from the partitions and the partitions from the layers.
 
-    def create_graph(self, partition: list) -> nx.DiGraph:
+    def parse_pipeline(self):
+        platforms = [Platform(device) for device in self.config.pipeline_devices]
+        stages = self.get_pipeline_partitioning(platforms)
+        for i, (specs, platform) in enumerate(stages):
+            if not specs["valid"]:
+                _logger.warning(
+                    f"Stage part_{i} does not fit in device {platform.fpga_device}"
+                )
+
+        partition_graphs_path = os.path.join(
+            os.getcwd(),
+            "fpga_modeling_reports",
+            self.model_name,
+            "partition_graphs",
+        )
+        if os.path.exists(partition_graphs_path):
+            for file in os.listdir(partition_graphs_path):
+                os.unlink(os.path.join(partition_graphs_path, file))
+
+        df = self.partition_parser.df
+        stages_latency = []
+        for i, (specs, platform) in enumerate(stages):
+            part_name = f"part_{i}"
+            extra_reconfig = self.partition_parser.model_partition(
+                specs["layers"], name=part_name, platform=platform
+            )
+            if extra_reconfig > 0:
+                _logger.warning(
+                    f"Stage {part_name} needs {extra_reconfig} reconfiguration(s) of device {platform.fpga_device}"
+                )
+            stage_df = df[df["Partition Name"].str.fullmatch(rf"{part_name}(_split\d+)?")]
+
+            latency_sec = (
+                stage_df["latency(S)"].sum()
+                + extra_reconfig * platform.reconfiguration_time
+            )
+            link_bits_per_sec = self.config.link_bandwidth * 1e9
+            if i > 0:
+                link_in_sec = (
+                    stage_df["dataSizeIn(MB)"].iloc[0] * 1e6 * 8 * self.batch_size
+                ) / link_bits_per_sec
+                latency_sec = max(latency_sec, link_in_sec)
+            if i < len(stages) - 1:
+                link_out_sec = (
+                    stage_df["dataSizeOut(MB)"].iloc[-1] * 1e6 * 8 * self.batch_size
+                ) / link_bits_per_sec
+                latency_sec = max(latency_sec, link_out_sec)
+            stages_latency.append(latency_sec)
+
+        self.partition_parser.report_roofline()
+
+        bottleneck_stage = int(np.argmax(stages_latency))
+        pipeline_metrics = {
+            "Batch size": self.batch_size,
+            "Devices": [platform.fpga_device for _, platform in stages],
+            "Stages latency(S)": stages_latency,
+            "Bottleneck stage": f"part_{bottleneck_stage}",
+            "latency(S)": sum(stages_latency),
+            "Volumes/s": self.batch_size / stages_latency[bottleneck_stage],
+            "GOPs/s": df["GOPs"].sum() / stages_latency[bottleneck_stage],
+        }
+        _logger.info(
+            f"Pipeline throughput {pipeline_metrics['Volumes/s']:.2f} volumes/s on {len(stages)} devices, bottleneck stage: {pipeline_metrics['Bottleneck stage']}."
+        )
+
+        if self.enable_wandb:
+            wandb.log(pipeline_metrics)
+            wandb.log({"Partition Results": wandb.Table(dataframe=df)})
+        else:
+            with open(self.partition_parser.partition_model_file, "r") as fp:
+                dictObj = json.load(fp)
+
+            dictObj["metrics"] = pipeline_metrics
+
+            with open(self.partition_parser.partition_model_file, "w") as json_file:
+                json.dump(dictObj, json_file, indent=2)
+
+    def create_graph(self, partition: list, platform: Platform = None) -> nx.DiGraph:
+        if platform is None:
+            platform = self.platform
         graph = nx.DiGraph()
         # _logger.info("*" * 40)
         for layer in partition:
@@ -840,7 +1146,7 @@ class NetworkParser(ModelLayerDescriptor):
                     self.config.max_dsp_util,
                     self.config.max_bram_util,
                     self.layers[layer],
-                    self.platform,
+                    platform,
                 )
                 layer_type = self.layers[layer]["operation"]
             elif self.layers[layer]["operation"] == "Conv":
@@ -848,7 +1154,7 @@ class NetworkParser(ModelLayerDescriptor):
                     self.config.max_dsp_util,
                     self.config.max_bram_util,
                     self.layers[layer],
-                    self.platform,
+                    platform,
                 )
                 layer_type = self.layers[layer]["operation"]
             elif (
@@ -859,7 +1165,7 @@ class NetworkParser(ModelLayerDescriptor):
                     self.config.max_dsp_util,
                     self.config.max_bram_util,
                     self.layers[layer],
-                    self.platform,
+                    platform,
                 )
                 layer_type = "Pooling"
             elif (
@@ -871,7 +1177,7 @@ class NetworkParser(ModelLayerDescriptor):
                     self.config.max_dsp_util,
                     self.config.max_bram_util,
                     self.layers[layer],
-                    self.platform,
+                    platform,
                 )
                 layer_type = "Activation"
             elif (
@@ -882,7 +1188,7 @@ class NetworkParser(ModelLayerDescriptor):
                     self.config.max_dsp_util,
                     self.config.max_bram_util,
                     self.layers[layer],
-                    self.platform,
+                    platform,
                 )
                 layer_type = "ElementWise"
             elif (
@@ -894,7 +1200,7 @@ class NetworkParser(ModelLayerDescriptor):
                     self.config.max_dsp_util,
                     self.config.max_bram_util,
                     self.layers[layer],
-                    self.platform,
+                    platform,
                 )
             elif self.layers[layer]["operation"] == "BatchNormalization":
                 layer_type = self.layers[layer]["operation"]
@@ -902,7 +1208,7 @@ class NetworkParser(ModelLayerDescriptor):
                     self.config.max_dsp_util,
                     self.config.max_bram_util,
                     self.layers[layer],
-                    self.platform,
+                    platform,
                 )
             else:
                 assert False, "{} operation in layer {} is not supported".format(
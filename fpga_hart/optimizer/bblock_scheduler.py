@@ -0,0 +1,105 @@
+import networkx as nx
+
+from fpga_hart import _logger
+
+
+def get_fused_groups(graph: nx.DiGraph, blocks: dict) -> list:
+    """
+    Groups the nodes of the graph into chains of building blocks that are cascaded
+    on-chip: a Conv followed by an Activation and/or an ElementWise layer that is the
+    single consumer of its output. Every block appears at most once in a group.
+    Returns the groups in topological order, each one as a list of nodes.
+    """
+    fusable_tails = ["Activation", "ElementWise"]
+    grouped = set()
+    groups = []
+    for node in nx.topological_sort(graph):
+        if node in grouped:
+            continue
+        group = [node]
+        grouped.add(node)
+        while blocks[node].is_conv and graph.out_degree(group[-1]) == 1:
+            succ = list(graph.successors(group[-1]))[0]
+            if (
+                succ in grouped
+                or blocks[succ].operation not in fusable_tails
+                or blocks[succ] in [blocks[n] for n in group]
+            ):
+                break
+            group.append(succ)
+            grouped.add(succ)
+        groups.append(group)
+    return groups
+
+
+def get_group_graph(graph: nx.DiGraph, groups: list) -> nx.DiGraph:
+    """
+    Graph of the fused groups, named after their first node.
+    """
+    group_of = {node: group[0] for group in groups for node in group}
+    group_graph = nx.DiGraph()
+    group_graph.add_nodes_from(group[0] for group in groups)
+    for u, v in graph.edges:
+        if group_of[u] != group_of[v]:
+            group_graph.add_edge(group_of[u], group_of[v])
+    return group_graph
+
+
+def get_upward_rank(graph: nx.DiGraph, tasks: dict) -> dict:
+    """
+    Length (seconds) of the longest path from each node to the end of the graph,
+    including the node itself.
+    """
+    rank = {}
+    for node in reversed(list(nx.topological_sort(graph))):
+        rank[node] = tasks[node]["latency"] + max(
+            [rank[succ] for succ in graph.successors(node)], default=0
+        )
+    return rank
+
+
+def list_schedule(graph: nx.DiGraph, tasks: dict) -> tuple:
+    """
+    Executes the nodes of the graph on the building blocks of the design, where each
+    task holds its blocks, its latency (seconds) and its memory bandwidth utilization (%).
+    Independent nodes run concurrently on different blocks and share the memory bandwidth.
+    Returns the makespan and the start and end times of every node.
+    """
+    rank = get_upward_rank(graph, tasks)
+    missing_preds = {node: graph.in_degree(node) for node in graph.nodes}
+    ready = [node for node in graph.nodes if missing_preds[node] == 0]
+    busy_blocks = set()
+    remaining = {}
+    times = {}
+    time = 0.0
+    while ready or remaining:
+        for node in sorted(ready, key=lambda n: rank[n], reverse=True):
+            if busy_blocks.intersection(tasks[node]["blocks"]):
+                continue
+            busy_blocks.update(tasks[node]["blocks"])
+            remaining[node] = tasks[node]["latency"]
+            times[node] = {"start": time}
+            ready.remove(node)
+        assert remaining, "No node can be scheduled. Graph inconsistency."
+
+        # The active nodes progress with the share of the memory bandwidth they get
+        slowdown = max(sum(tasks[node]["bw"] for node in remaining) / 100, 1)
+        step = min(remaining.values()) * slowdown
+        time += step
+        for node in list(remaining):
+            remaining[node] -= step / slowdown
+            if remaining[node] > 1e-12 * max(tasks[node]["latency"], 1):
+                continue
+            del remaining[node]
+            times[node]["end"] = time
+            busy_blocks.difference_update(tasks[node]["blocks"])
+            for succ in graph.successors(node):
+                missing_preds[succ] -= 1
+                if missing_preds[succ] == 0:
+                    ready.append(succ)
+
+    makespan = max([t["end"] for t in times.values()], default=0)
+    _logger.debug(
+        f"Scheduled {len(times)} nodes with a makespan of {makespan:.5f} s ({sum(t['latency'] for t in tasks.values()):.5f} s when executed serially)"
+    )
+    return makespan, times
@@ -0,0 +1,50 @@
+from dataclasses import dataclass
+
+import numpy as np
+
+
+@dataclass(frozen=True)
+class BuildingBlock:
+    """
+    Hardware building block of the latency driven design. Convolutional and pooling blocks are described by the kernel they are sized for and the padding and stride they support, while the rest of the blocks are described by their operation only. Blocks are immutable and hashable, so they are used directly as keys of the lookup table, the blocks configuration and the performance cache.
+    """
+
+    operation: str
+    kernel: tuple = ()
+    padding: tuple = ()
+    stride: tuple = ()
+    depthwise: bool = False
+    pointwise: bool = False
+
+    @classmethod
+    def from_layer(cls, layer_type: str, hw) -> "BuildingBlock":
+        if layer_type in ["Conv", "Pooling"]:
+            return cls(
+                operation=layer_type,
+                kernel=tuple(hw.kernel_shape),
+                padding=tuple(hw.padding),
+                stride=tuple(hw.stride),
+                depthwise=layer_type == "Conv" and hw.depthwise,
+                pointwise=layer_type == "Conv" and np.prod(hw.kernel_shape) == 1,
+            )
+        return cls(operation=layer_type)
+
+    @property
+    def is_conv(self) -> bool:
+        return self.operation == "Conv"
+
+    @property
+    def is_pool(self) -> bool:
+        return self.operation == "Pooling"
+
+    @property
+    def is_windowed(self) -> bool:
+        return self.is_conv or self.is_pool
+
+    def __str__(self) -> str:
+        if not self.is_windowed:
+            return self.operation
+        name = "Pooling"
+        if self.is_conv:
+            name = "Conv3D" + ("Dw" if self.depthwise else "") + ("Pw" if self.pointwise else "")
+        return f"{name}k{''.join(map(str, self.kernel))}p{''.join(map(str, self.padding))}s{''.join(map(str, self.stride))}"
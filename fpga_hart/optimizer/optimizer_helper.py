@@ -1,5 +1,5 @@
 import math
-from copy import deepcopy
+from copy import copy, deepcopy
 
 import networkx as nx
 import numpy as np
@@ -10,6 +10,7 @@ from fpga_hart.layers.convolutional_3d import Convolutional3DLayer
 from fpga_hart.layers.elemwise_3d import ElementWise3DLayer
 from fpga_hart.layers.fully_connected import FCLayer
 from fpga_hart.layers.gap_3d import GAP3DLayer
+from fpga_hart.layers.memory_interface import MemoryNode
 from fpga_hart.layers.pooling_3d import Pooling3DLayer
 from fpga_hart.utils import utils
 from fpga_hart.utils.graph_manipulation import (
@@ -25,39 +26,39 @@ def get_minimum_resource_utilization(hw_layer, gap_approx=False):
         coarsein_min = 1 / np.int32(hw_layer.channels)
         coarseout_min = 1 / np.int32(hw_layer.filters)
         fine_min = 1 / np.prod(np.array(hw_layer.kernel_shape))
-        dsp_util, bram_util, pipeline_depth = hw_layer.get_resource_util(
+        dsp_util, bram_util, pipeline_depth, mem_arrays = hw_layer.get_resource_util(
             f_fine=fine_min, f_coarseIn=coarsein_min, f_coarseOut=coarseout_min
         )
     elif isinstance(hw_layer, Pooling3DLayer):
         initial_filters = deepcopy(hw_layer.channels)
         coarseinout_min = 1 / np.int32(hw_layer.channels)
         fine_min = 1 / np.prod(np.array(hw_layer.kernel_shape))
-        dsp_util, bram_util, pipeline_depth = hw_layer.get_resource_util(
+        dsp_util, bram_util, pipeline_depth, mem_arrays = hw_layer.get_resource_util(
             f_fine=fine_min, f_coarse_inout=coarseinout_min
         )
     elif isinstance(hw_layer, Activation3DLayer):
         initial_filters = deepcopy(hw_layer.filters)
         coarseinout_min = 1 / np.int32(hw_layer.channels)
-        dsp_util, bram_util, pipeline_depth = hw_layer.get_resource_util(
+        dsp_util, bram_util, pipeline_depth, mem_arrays = hw_layer.get_resource_util(
             f_coarse_inout=coarseinout_min, supported_ops=[hw_layer.op_type]
         )
     elif isinstance(hw_layer, ElementWise3DLayer):
         initial_filters = deepcopy(hw_layer.filters)
         coarseinout_min = 1 / np.int32(hw_layer.channels_1)
-        dsp_util, bram_util, pipeline_depth = hw_layer.get_resource_util(
+        dsp_util, bram_util, pipeline_depth, mem_arrays = hw_layer.get_resource_util(
             f_coarse_inout=coarseinout_min, supported_ops=[hw_layer.op_type]
         )
     elif isinstance(hw_layer, FCLayer):
         initial_filters = deepcopy(hw_layer.dim_out)
         coarsein_min = 1 / np.int32(hw_layer.dim_in)
         coarseout_min = 1 / np.int32(hw_layer.dim_out)
-        dsp_util, bram_util, pipeline_depth = hw_layer.get_resource_util(
+        dsp_util, bram_util, pipeline_depth, mem_arrays = hw_layer.get_resource_util(
             f_coarseIn=coarsein_min, f_coarseOut=coarseout_min
         )
     elif isinstance(hw_layer, GAP3DLayer):
         initial_filters = deepcopy(hw_layer.filters)
         coarseinout_min = 1 / np.int32(hw_layer.channels)
-        dsp_util, bram_util, pipeline_depth = hw_layer.get_resource_util(
+        dsp_util, bram_util, pipeline_depth, mem_arrays = hw_layer.get_resource_util(
             f_coarse_inout=coarseinout_min, supported_ops=[], gap_approx=gap_approx
         )
     else:
@@ -65,7 +66,19 @@ def get_minimum_resource_utilization(hw_layer, gap_approx=False):
 
     # if not (isinstance(hw_layer, Convolutional3DLayer) or isinstance(hw_layer, Pooling3DLayer)):
     #     return 0, dsp_util, initial_filters
-    return bram_util, dsp_util, pipeline_depth, initial_filters
+    return bram_util, dsp_util, pipeline_depth, initial_filters, mem_arrays
+
+
+def get_combined_bram_util(hw, bram_util, mem_arrays):
+    """
+    BRAM utilization (%) of a group of layers whose BRAM-only utilization adds
+    up to bram_util, once the memory arrays of all of them are mapped together
+    onto the URAMs of the device. hw is any layer of the group.
+    """
+    bram_raw, _ = hw.allocate_uram(
+        bram_util * hw.bram / 100, [dict(array) for array in mem_arrays]
+    )
+    return (bram_raw / hw.bram) * 100
 
 
 def get_extra_mem_connections(graph, node_list):
@@ -83,9 +96,10 @@ def get_extra_mem_connections(graph, node_list):
     return extra_inputs, extra_outputs
 
 
-def update_nodes_shapes(graph, wr_f, old_filters, wr_layers):
+def get_wr_nodes_shapes(graph, wr_f, old_filters, wr_layers):
     new_filters = math.floor(old_filters / wr_f)
 
+    wr_shapes = {}
     for layer in nx.topological_sort(graph):
         if layer in wr_layers:
             hw = graph.nodes[layer]["hw"]
@@ -99,34 +113,169 @@ def update_nodes_shapes(graph, wr_f, old_filters, wr_layers):
                 new_shape_in_1[1] = new_shape_out[1]
                 new_shape_in_2 = deepcopy(hw.input_shape_2)
                 new_shape_in_2[1] = new_shape_out[1]
-                hw.update_shapes(new_shape_in_1, new_shape_in_2, new_shape_out)
+                wr_shapes[layer] = [new_shape_in_1, new_shape_in_2, new_shape_out]
             elif isinstance(hw, Convolutional3DLayer):
-                hw.update_shapes(hw.input_shape, new_shape_out)
+                wr_shapes[layer] = [deepcopy(hw.input_shape), new_shape_out]
             else:
                 new_shape_in = deepcopy(hw.input_shape)
                 new_shape_in[1] = new_shape_out[1]
-                hw.update_shapes(new_shape_in, new_shape_out)
+                wr_shapes[layer] = [new_shape_in, new_shape_out]
+    return wr_shapes
 
 
-def calculate_wr_factor(graph, max_BRAM_util):
-    weights_reloading = 1
+def update_nodes_shapes(graph, wr_f, old_filters, wr_layers):
+    for layer, shapes in get_wr_nodes_shapes(
+        graph, wr_f, old_filters, wr_layers
+    ).items():
+        graph.nodes[layer]["hw"].update_shapes(*shapes)
+
+
+def get_wr_factor(graph, layer, wr_layers, max_BRAM_util, base_bram_util=0, base_mem_arrays=None):
+    """
+    Find the minimum weights reloading factor (among the divisors of the layer's filters) for which the layer fits in the device along with the layers before it, whose BRAM-only utilization is base_bram_util and memory arrays are base_mem_arrays.
+    The minimum BRAM utilization of the layer is monotonically decreasing with the weights reloading factor, hence a binary search is performed on a copy of the layer without mutating the graph.
+    Returns the weights reloading factor along with the resulting shapes of the wr_layers or (-1, None) if no factor can be found.
+    """
+    if base_mem_arrays is None:
+        base_mem_arrays = []
+    hw = graph.nodes[layer]["hw"]
+    initial_filters = hw.filters
+    hw_wr = copy(hw)
+
+    def fits(wr_f):
+        wr_shapes = get_wr_nodes_shapes(graph, wr_f, initial_filters, [layer])
+        hw_wr.update_shapes(*wr_shapes[layer])
+        bram_util, _, _, _, mem_arrays = get_minimum_resource_utilization(hw_wr)
+        return (
+            get_combined_bram_util(
+                hw_wr, base_bram_util + bram_util, base_mem_arrays + mem_arrays
+            )
+            < max_BRAM_util
+        )
+
+    wr_factors = utils.get_factors(initial_filters)[1:]
+    low, high = 0, len(wr_factors)
+    while low < high:
+        mid = (low + high) // 2
+        if fits(wr_factors[mid]):
+            high = mid
+        else:
+            low = mid + 1
+    if low == len(wr_factors):
+        return -1, None
 
+    weights_reloading = wr_factors[low]
+    return weights_reloading, get_wr_nodes_shapes(
+        graph, weights_reloading, initial_filters, wr_layers
+    )
+
+
+def get_word_length_feasible(node, op_type, word_lengths, min_word_length):
+    """
+    Candidate word lengths of a layer that satisfy the minimum precision given by the user for the node itself or for its type of layer.
+    """
+    min_wl = min_word_length.get(node, min_word_length.get(op_type, 0))
+    feasible = [wl for wl in word_lengths if wl >= min_wl]
+    assert (
+        feasible
+    ), f"None of the word lengths {word_lengths} satisfies the minimum precision ({min_wl} bits) of {node}"
+    return feasible
+
+
+def get_word_lengths(config):
+    """
+    (activations, weights) word lengths of the nodes of a partition configuration that have their own precision.
+    """
+    return {
+        node: (c["word_length"], c.get("weights_word_length", c["word_length"]))
+        for node, c in config.items()
+        if "word_length" in c
+    }
+
+
+def get_stream_weights_nodes(config):
+    """
+    Nodes of a partition configuration that stream their weights from the off-chip memory, in the order their memory bandwidth shares are assigned.
+    """
+    return [node for node, c in config.items() if c.get("stream_weights", False)]
+
+
+def get_wr_layers(graph):
     wr_layers = []
     for layer in reversed(list(nx.topological_sort(graph))):
+        if graph.nodes[layer]["type"] in ["mem_in", "mem_out"]:
+            continue
         wr_layers.append(layer)
         if graph.nodes[layer]["type"] == "Conv":
             break
-    wr_layers = wr_layers[::-1]
+    return wr_layers[::-1]
+
+
+def get_wr_feasible(graph, wr_layers, wr_factor=1):
+    """
+    Returns the weights reloading factors that can be explored for a graph whose wr_layers are already reshaped for wr_factor, along with the original number of filters.
+    Factors smaller than wr_factor are excluded since they do not fit in the device.
+    """
+    if not wr_layers or graph.nodes[wr_layers[0]]["type"] != "Conv":
+        return [1], None
+    hw = graph.nodes[wr_layers[0]]["hw"]
+    initial_filters = hw.filters * wr_factor
+    if hw.depthwise:
+        return [wr_factor], initial_filters
+    return [
+        f for f in utils.get_factors(initial_filters) if f >= wr_factor
+    ], initial_filters
+
+
+def get_wr_graph(graph, wr_f, old_filters, wr_layers):
+    """
+    Returns a shallow copy of the graph where the hw of the wr_layers (and of the memory nodes connected to them) is replaced by copies reshaped for the wr_f weights reloading factor.
+    The original graph and its hw objects are left untouched.
+    """
+    wr_graph = graph.copy()
+    wr_shapes = get_wr_nodes_shapes(graph, wr_f, old_filters, wr_layers)
+    for layer, shapes in wr_shapes.items():
+        hw = copy(graph.nodes[layer]["hw"])
+        hw.update_shapes(*shapes)
+        wr_graph.nodes[layer]["hw"] = hw
+
+    for node in graph.nodes:
+        hw = graph.nodes[node]["hw"]
+        if not isinstance(hw, MemoryNode):
+            continue
+        if graph.nodes[node]["type"] == "mem_out":
+            pred = list(graph.predecessors(node))[0]
+            if pred in wr_shapes:
+                hw = copy(hw)
+                hw.input_shape = deepcopy(wr_shapes[pred][-1])
+                wr_graph.nodes[node]["hw"] = hw
+        else:
+            succ = list(graph.successors(node))[0]
+            if succ in wr_shapes and succ != wr_layers[0]:
+                hw = copy(hw)
+                hw.output_shape = deepcopy(hw.output_shape)
+                hw.output_shape[1] = wr_shapes[succ][-1][1]
+                wr_graph.nodes[node]["hw"] = hw
+    return wr_graph
+
+
+def calculate_wr_factor(graph, max_BRAM_util):
+    weights_reloading = 1
+
+    wr_layers = get_wr_layers(graph)
 
     total_bram_util = 0
+    total_mem_arrays = []
     for layer in nx.topological_sort(graph):
         if layer == wr_layers[0]:
             break
         hw = graph.nodes[layer]["hw"]
-        bram_util, _, _, _ = get_minimum_resource_utilization(hw)
+        bram_util, _, _, _, mem_arrays = get_minimum_resource_utilization(hw)
         total_bram_util += bram_util
+        total_mem_arrays += mem_arrays
 
-    if total_bram_util > max_BRAM_util:
+    hw = graph.nodes[wr_layers[0]]["hw"]
+    if get_combined_bram_util(hw, total_bram_util, total_mem_arrays) > max_BRAM_util:
         _logger.warning(
             f"Partition does not fit in the device even after weights reloading with layers: {list(nx.topological_sort(graph))}"
         )
@@ -134,27 +283,31 @@ def calculate_wr_factor(graph, max_BRAM_util):
 
     for layer in wr_layers:
         hw = graph.nodes[layer]["hw"]
-        bram_util, _, _, _ = get_minimum_resource_utilization(hw)
-        if (total_bram_util + bram_util) > max_BRAM_util:
-            initial_filters = deepcopy(hw.filters)
-            for f in range(1, initial_filters):
-                update_nodes_shapes(
-                    graph=graph,
-                    wr_f=f,
-                    old_filters=initial_filters,
-                    wr_layers=wr_layers,
-                )
-                bram_util_wr, _, _, _ = get_minimum_resource_utilization(hw)
-                if (total_bram_util + bram_util_wr) < max_BRAM_util:
-                    weights_reloading = f if initial_filters % f == 0 else (f + 1)
-                    break
-            if weights_reloading == 1:
+        bram_util, _, _, _, mem_arrays = get_minimum_resource_utilization(hw)
+        if (
+            get_combined_bram_util(
+                hw, total_bram_util + bram_util, total_mem_arrays + mem_arrays
+            )
+            > max_BRAM_util
+        ):
+            weights_reloading, wr_shapes = get_wr_factor(
+                graph,
+                layer,
+                wr_layers,
+                max_BRAM_util,
+                base_bram_util=total_bram_util,
+                base_mem_arrays=total_mem_arrays,
+            )
+            if weights_reloading == -1:
                 _logger.warning(
                     f"Layer {layer} does not fit in the device even after weights reloading"
                 )
                 return -1
+            for wr_layer, shapes in wr_shapes.items():
+                graph.nodes[wr_layer]["hw"].update_shapes(*shapes)
         else:
             total_bram_util += bram_util
+            total_mem_arrays += mem_arrays
     return weights_reloading
 
 
@@ -323,3 +476,36 @@ def get_worst_case_buffering(
     #     return branch_buffer_new, 100
 
     return branch_buffer_new, bram_util
+
+
+def get_branch_buffering_utilization(
+    graph,
+    partition_composer,
+    mem_words_per_cycle,
+    word_bytes,
+    bram_type,
+    brams_total,
+    gap_approx,
+    wr_factor=1,
+):
+    """
+    Worst case BRAM utilization of each branch buffer of the graph keyed by its (start, end) nodes.
+    """
+    partition_composer.preliminary_branch_depth = {}
+    get_worst_case_buffering(
+        deepcopy(graph),
+        partition_composer,
+        mem_words_per_cycle,
+        word_bytes,
+        bram_type,
+        brams_total,
+        gap_approx,
+        wr_factor=wr_factor,
+    )
+
+    branch_bram_util = {}
+    for v in partition_composer.preliminary_branch_depth.values():
+        branch_bram_util[(v["start"], v["end"])] = (
+            (v["depth"] * word_bytes / (bram_type * 1024)) / brams_total
+        ) * 100
+    return branch_bram_util
@@ -31,6 +31,7 @@ class SimulatedAnnealing:
         gap_approx=False,
         cnn_model_name="",
         enable_wandb=False,
+        model_weights=None,
     ):
         # _logger.setLevel(level=logging.DEBUG)
         self.cnn_model_name = cnn_model_name
@@ -66,15 +67,27 @@ class SimulatedAnnealing:
         self.param_changes = 0
         self.freeze_param = False
 
+        # Performance of the building blocks per (block configuration, layer signature) in latency mode
+        self.bblock_performance_cache = {}
+
+        # Share of the requests of every model whose layers are in the graph (latency mode). Nodes without a model belong to cnn_model_name
+        self.model_weights = model_weights if model_weights else {cnn_model_name: 1.0}
+        self.model_nodes = {
+            model: {n for n in graph.nodes if graph.nodes[n].get("model", cnn_model_name) == model}
+            for model in self.model_weights
+        }
+
         self.partition_composer = PartitionComposer(
             max_DSP_util=self.config.max_dsp_util,
             max_BRAM_util=self.config.max_bram_util,
             platform=self.platform,
+            batch_size=self.config.batch_size,
         )
 
     from fpga_hart.optimizer.simulated_annealing.sa_latency import (
         generate_building_blocks,
         generate_building_blocks_config,
+        get_bblock_performance,
         get_cost_latency,
         run_optimizer_latency,
         validate_building_blocks_setup,
@@ -5,6 +5,7 @@ import os
 import random
 import time
 from copy import deepcopy
+from dataclasses import replace
 
 import numpy as np
 
@@ -16,9 +17,20 @@ from fpga_hart.layers.elemwise_3d import ElementWise3DLayer
 from fpga_hart.layers.fully_connected import FCLayer
 from fpga_hart.layers.gap_3d import GAP3DLayer
 from fpga_hart.layers.pooling_3d import Pooling3DLayer
+from fpga_hart.optimizer.building_block import BuildingBlock
+from fpga_hart.optimizer.bblock_scheduler import (
+    get_fused_groups,
+    get_group_graph,
+    list_schedule,
+)
+from fpga_hart.optimizer.optimizer_helper import get_combined_bram_util
 from fpga_hart.utils import utils
 from fpga_hart.utils.graph_manipulation import get_nodes_sorted
-from fpga_hart.utils.shapes import get_random_arbitrary_shape, get_random_shape
+from fpga_hart.utils.shapes import (
+    get_random_arbitrary_shape,
+    get_random_shape,
+    get_tiling,
+)
 
 
 def run_optimizer_latency(self, alignedfactors: bool) -> None:
@@ -123,20 +135,24 @@ def run_optimizer_latency(self, alignedfactors: bool) -> None:
         )
 
     print(f"{current_temp:.5e}\t{prev_cost:.5e}\n")
-    final_config = deepcopy(prev_state)
+    final_config = {str(bb): deepcopy(prev_state[bb]) for bb in prev_state}
     final_DSP_util = 0
-    final_BRAM_util = 0
+    final_BRAM_util = get_bblocks_bram_util(prev_state)
     final_avg_MemBw_util = 0
     for key in final_config:
         final_config[key].pop("hw")
+        final_config[key].pop("mem_arrays")
         final_DSP_util += final_config[key]["DSP_util"]
-        final_BRAM_util += final_config[key]["BRAM_util"]
         final_avg_MemBw_util += final_config[key]["MemBw_util"]
 
     final_avg_MemBw_util = final_avg_MemBw_util / len(final_config)
     print(
         f"DSP Utilization: {final_DSP_util:.3f} - BRAM Utilization: {final_BRAM_util:.3f} - MemBw Utilization: {final_avg_MemBw_util:.3f}"
     )
+    if len(self.model_weights) > 1:
+        for model, weight in self.model_weights.items():
+            model_latency = max(prev_scheduling[n]["End"] for n in self.model_nodes[model])
+            print(f"{model} (request share {weight:.3f}): Latency {model_latency:.5e}")
     if self.enable_wandb:
         artifact = wandb.Artifact("config", type="json")
         with artifact.new_file("config.json") as f:
@@ -164,7 +180,7 @@ def run_optimizer_latency(self, alignedfactors: bool) -> None:
         ) as f:
             json.dump(prev_scheduling, f, indent=2)
 
-def validate_building_blocks_setup(self, bblocks: list) -> bool:
+def validate_building_blocks_setup(self, bblocks: list, lookuptable: dict) -> bool:
     """
     Validate the building blocks setup by producing a valid scedulilng of the building blocks that
     can execute the complete network graph.
@@ -173,12 +189,12 @@ def validate_building_blocks_setup(self, bblocks: list) -> bool:
     nodes = get_nodes_sorted(self.graph)
     _logger.info(msg=f"Validating building blocks setup... {bblocks}")
     for n in nodes:
-        bb = self.graph.nodes[n]["hw_type"]
-        if any(bb in block for block in bblocks):
+        bb = lookuptable.get(self.graph.nodes[n]["hw_type"])
+        if bb in bblocks:
             continue
         else:
             _logger.critical(
-                msg=f"Hardware building block {bb} not found in existing building blocks list"
+                msg=f"Hardware building block for {self.graph.nodes[n]['hw_type']} not found in existing building blocks list"
             )
             return False
 
@@ -193,38 +209,29 @@ def generate_building_blocks(self) -> list:
     """
     types = {}
     for n in self.graph.nodes:
-        if self.graph.nodes[n]["hw_type"] not in types:
-            if "Conv" in self.graph.nodes[n]["hw_type"] or "Pooling" in self.graph.nodes[n]["hw_type"]:
-                types[self.graph.nodes[n]["hw_type"]] = {
-                    "Padding": [self.graph.nodes[n]["hw"].padding],
-                    "Stride": [self.graph.nodes[n]["hw"].stride],
-                }
-            else:
-                types[self.graph.nodes[n]["hw_type"]] = {}
+        hw_type = self.graph.nodes[n]["hw_type"]
+        bb = BuildingBlock.from_layer(self.graph.nodes[n]["type"], self.graph.nodes[n]["hw"])
+        if hw_type not in types:
+            types[hw_type] = {"block": bb, "Padding": [bb.padding], "Stride": [bb.stride]}
         else:
-            if "Conv" in self.graph.nodes[n]["hw_type"] or "Pooling" in self.graph.nodes[n]["hw_type"]:
-                types[self.graph.nodes[n]["hw_type"]]["Padding"].append(
-                    self.graph.nodes[n]["hw"].padding
-                )
-                types[self.graph.nodes[n]["hw_type"]]["Stride"].append(
-                    self.graph.nodes[n]["hw"].stride
-                )
+            types[hw_type]["Padding"].append(bb.padding)
+            types[hw_type]["Stride"].append(bb.stride)
 
-    bblocks = []
+    bblocks = {}
     for t in types:
-        if "Conv" in t or "Pooling" in t:
-            final_padding = np.max(np.array(types[t]["Padding"]), axis=0).tolist()
-            final_stride = np.min(np.array(types[t]["Stride"]), axis=0).tolist()
-            bblocks.append(
-                f"{t}p{''.join([str(elem) for elem in final_padding])}s{''.join([str(elem) for elem in final_stride])}"
+        bb = types[t]["block"]
+        if bb.is_windowed:
+            bb = replace(
+                bb,
+                padding=tuple(np.max(np.array(types[t]["Padding"]), axis=0).tolist()),
+                stride=tuple(np.min(np.array(types[t]["Stride"]), axis=0).tolist()),
             )
-        else:
-            bblocks.append(t)
+        bblocks[t] = bb
 
     bblocks, lookuptable = utils.combine_building_blocks(bblocks)
 
     # assert self.validate_building_blocks_setup(
-    #     bblocks
+    #     bblocks, lookuptable
     # ), "Invalid building blocks setup. Cannot find a valid scheduling."
 
     return bblocks, lookuptable
@@ -244,13 +251,13 @@ def generate_building_blocks_config(
     Returns:
         dict: bb_setup
     """
-    if "Activation" in bblocks:
+    if any(bb.operation == "Activation" for bb in bblocks):
         activations_list = []
         for n in self.graph.nodes:
             if self.graph.nodes[n]["hw_type"] == "Activation":
                 if self.graph.nodes[n]['hw'].op_type not in activations_list:
                     activations_list.append(self.graph.nodes[n]['hw'].op_type)
-    if "ElementWise" in bblocks:
+    if any(bb.operation == "ElementWise" for bb in bblocks):
         elementwise_list = []
         for n in self.graph.nodes:
             if self.graph.nodes[n]["hw_type"] == "ElementWise":
@@ -259,6 +266,7 @@ def generate_building_blocks_config(
 
     total_dsp = 0
     total_bram = 0
+    total_mem_arrays = []
     if (not initialization) and (not previous_config == None) and (bblocks == list(previous_config.keys())):
         bb_setup = deepcopy(previous_config)
         bb_choice = [bb for bb in bblocks]
@@ -266,17 +274,20 @@ def generate_building_blocks_config(
         for b in bb_setup:
             total_dsp += bb_setup[b]["DSP_util"]
             total_bram += bb_setup[b]["BRAM_util"]
+            total_mem_arrays += bb_setup[b]["mem_arrays"]
     else:
         bb_setup = dict()
 
-    for bb in random.shuffle(bblocks):
+    random.shuffle(bblocks)
+    for bb in bblocks:
         if not bb in bb_setup.keys():
             bb_setup[bb] = dict()
 
         dsp_util, bram_util = 100, 100
         stop_counter = 0
-        while dsp_util > (self.config.max_dsp_util - total_dsp) or bram_util > (
-            self.config.max_bram_util - total_bram
+        while (
+            dsp_util > (self.config.max_dsp_util - total_dsp)
+            or bram_util > self.config.max_bram_util
         ):
             if self.use_arbitrary_shape:
                 shape_in, shape_out = get_random_arbitrary_shape(
@@ -286,7 +297,7 @@ def generate_building_blocks_config(
                 shape_in, shape_out = get_random_shape(
                     self.graph, bb, lookuptable, previous_config=previous_config, chan_dist_thresh=self.chan_dist_thresh, depth_dist_thresh=self.depth_dist_thresh,height_dist_thresh=self.height_dist_thresh
                 )
-            if bb != "Gemm":
+            if bb.operation != "Gemm":
                 _, channels_in_dim, depth_in_dim, height_in_dim, width_in_dim = shape_in
                 (
                     _,
@@ -312,32 +323,32 @@ def generate_building_blocks_config(
                 width_out_dim,
             )
 
-            if "Conv" in bb:
+            if bb.is_conv:
                 bb_setup[bb]["hw"] = Convolutional3DLayer(
                     self.config.max_dsp_util, self.config.max_bram_util, bb_descriptor, self.platform
                 )
-            if "Pooling" in bb:
+            elif bb.is_pool:
                 bb_setup[bb]["hw"] = Pooling3DLayer(
                     self.config.max_dsp_util, self.config.max_bram_util, bb_descriptor, self.platform
                 )
-            elif bb == "Activation":
+            elif bb.operation == "Activation":
                 bb_setup[bb]["hw"] = Activation3DLayer(
                     self.config.max_dsp_util, self.config.max_bram_util, bb_descriptor, self.platform
                 )
-            elif bb == "GlobalAveragePool":
+            elif bb.operation == "GlobalAveragePool":
                 bb_setup[bb]["hw"] = GAP3DLayer(
                     self.config.max_dsp_util, self.config.max_bram_util, bb_descriptor, self.platform
                 )
-            elif bb == "ElementWise":
+            elif bb.operation == "ElementWise":
                 bb_setup[bb]["hw"] = ElementWise3DLayer(
                     self.config.max_dsp_util, self.config.max_bram_util, bb_descriptor, self.platform
                 )
-            elif bb == "Gemm":
+            elif bb.operation == "Gemm":
                 bb_setup[bb]["hw"] = FCLayer(
                     self.config.max_dsp_util, self.config.max_bram_util, bb_descriptor, self.platform
                 )
 
-            if "Conv" in bb:
+            if bb.is_conv:
                 if alignedfactors:
                     coarse_in = (
                         random.choice(utils.get_factors(channels_in_dim))
@@ -360,15 +371,15 @@ def generate_building_blocks_config(
                         )
                         / channels_out_dim
                     )
-                if "Conv3DDw" in bb:
+                if bb.depthwise:
                     coarse_out = coarse_in
                 assert coarse_in > 0 and coarse_in <= 1, "Invalid coarse in."
                 assert coarse_out > 0 and coarse_out <= 1, "Invalid coarse out."
                 # TODO: Add fine factor random generation for Conv3D ops
-                dsp_util, bram_util, _ = bb_setup[bb]["hw"].get_resource_util(
+                dsp_util, block_bram_util, _, mem_arrays = bb_setup[bb]["hw"].get_resource_util(
                     f_fine=1, f_coarseIn=coarse_in, f_coarseOut=coarse_out
                 )
-            elif "Pooling" in bb:
+            elif bb.is_pool:
                 if alignedfactors:
                     coarse_inout = (
                         random.choice(utils.get_factors(channels_in_dim))
@@ -383,10 +394,10 @@ def generate_building_blocks_config(
                     )
                 assert coarse_inout > 0 and coarse_inout <= 1, "Invalid coarse factor."
                 # TODO: Add fine factor random generation for Pooling3D ops
-                dsp_util, bram_util, _ = bb_setup[bb]["hw"].get_resource_util(
+                dsp_util, block_bram_util, _, mem_arrays = bb_setup[bb]["hw"].get_resource_util(
                     f_fine=1, f_coarse_inout=coarse_inout
                 )
-            elif bb in ["Activation", "GlobalAveragePool", "ElementWise"]:
+            elif bb.operation in ["Activation", "GlobalAveragePool", "ElementWise"]:
                 if alignedfactors:
                     coarse_inout = (
                         random.choice(utils.get_factors(channels_in_dim))
@@ -401,19 +412,19 @@ def generate_building_blocks_config(
                     )
                 assert coarse_inout > 0 and coarse_inout <= 1, "Invalid coarse factor."
 
-                if bb == "GlobalAveragePool":
-                    dsp_util, bram_util, _ = bb_setup[bb]["hw"].get_resource_util(
+                if bb.operation == "GlobalAveragePool":
+                    dsp_util, block_bram_util, _, mem_arrays = bb_setup[bb]["hw"].get_resource_util(
                         f_coarse_inout=coarse_inout, supported_ops=[], gap_approx=self.gap_approx
                     )
                 else:
-                    if bb == "Activation":
+                    if bb.operation == "Activation":
                         supported_ops = deepcopy(activations_list)
-                    elif bb == "ElementWise":
+                    elif bb.operation == "ElementWise":
                         supported_ops = deepcopy(elementwise_list)
-                    dsp_util, bram_util, _ = bb_setup[bb]["hw"].get_resource_util(
+                    dsp_util, block_bram_util, _, mem_arrays = bb_setup[bb]["hw"].get_resource_util(
                         f_coarse_inout=coarse_inout, supported_ops=supported_ops
                     )
-            elif bb == "Gemm":
+            elif bb.operation == "Gemm":
                 if alignedfactors:
                     coarse_in = (
                         random.choice(utils.get_factors(channels_in_dim))
@@ -438,9 +449,14 @@ def generate_building_blocks_config(
                     )
                 assert coarse_in > 0 and coarse_in <= 1, "Invalid coarse in."
                 assert coarse_out > 0 and coarse_out <= 1, "Invalid coarse out."
-                dsp_util, bram_util, _ = bb_setup[bb]["hw"].get_resource_util(
+                dsp_util, block_bram_util, _, mem_arrays = bb_setup[bb]["hw"].get_resource_util(
                     f_coarseIn=coarse_in, f_coarseOut=coarse_out
                 )
+            bram_util = get_combined_bram_util(
+                bb_setup[bb]["hw"],
+                total_bram + block_bram_util,
+                total_mem_arrays + mem_arrays,
+            )
             stop_counter += 1
             if stop_counter > 100:
                 _logger.debug(
@@ -449,7 +465,7 @@ def generate_building_blocks_config(
                 return None
 
         mem_bw = bb_setup[bb]["hw"].mem_words_per_cycle
-        if "ElementWise" in bb:
+        if bb.operation == "ElementWise":
             bw_in, bw_out = self.get_mem_bw_feasible(n_in=2, n_out=1)
             bw_in_1 = bw_in[0] * mem_bw
             bw_in_2 = bw_in[1] * mem_bw
@@ -462,30 +478,30 @@ def generate_building_blocks_config(
             bw_out = bw_out[0] * mem_bw
             bb_setup[bb]["bw_in"] = [bw_in]
             bb_setup[bb]["bw_out"] = [bw_out]
-        if "Conv" in bb:
+        if bb.is_conv:
             layer_config = utils.generate_layer_config(bb_setup[bb]["hw"], [1, coarse_in, coarse_out])
             bb_setup[bb]["config"] = layer_config
             bb_setup[bb]["f_coarseIn"] = coarse_in
             bb_setup[bb]["interleaving_in"] = math.ceil(1 / coarse_in)
             bb_setup[bb]["f_coarseOut"] = coarse_out
             bb_setup[bb]["interleaving_out"] = math.ceil(1 / coarse_out)
-        elif "Pooling" in bb:
+        elif bb.is_pool:
             layer_config = utils.generate_layer_config(bb_setup[bb]["hw"], [1, coarse_inout])
             bb_setup[bb]["config"] = layer_config
             bb_setup[bb]["coarse_inout"] = coarse_inout
             bb_setup[bb]["coarse_factor"] = math.ceil(coarse_inout * channels_in_dim)
             bb_setup[bb]["interleaving_inout"] = math.ceil(1 / coarse_inout)
-        elif bb in ["Activation", "GlobalAveragePool", "ElementWise"]:
+        elif bb.operation in ["Activation", "GlobalAveragePool", "ElementWise"]:
             layer_config = utils.generate_layer_config(bb_setup[bb]["hw"], [coarse_inout])
-            if bb == "Activation":
+            if bb.operation == "Activation":
                 layer_config['supported_ops'] = deepcopy(activations_list)
-            elif bb == "ElementWise":
+            elif bb.operation == "ElementWise":
                 layer_config['supported_ops'] = deepcopy(elementwise_list)
             bb_setup[bb]["config"] = layer_config
             bb_setup[bb]["coarse_inout"] = coarse_inout
             bb_setup[bb]["coarse_factor"] = math.ceil(coarse_inout * channels_in_dim)
             bb_setup[bb]["interleaving_inout"] = math.ceil(1 / coarse_inout)
-        elif bb == "Gemm":
+        elif bb.operation == "Gemm":
             layer_config = utils.generate_layer_config(bb_setup[bb]["hw"], [coarse_in, coarse_out])
             bb_setup[bb]["config"] = layer_config
             bb_setup[bb]["coarse_in"] = coarse_in
@@ -494,39 +510,172 @@ def generate_building_blocks_config(
             bb_setup[bb]["interleaving_out"] = math.ceil(1 / coarse_out)
 
         bb_setup[bb]["DSP_util"] = dsp_util
-        bb_setup[bb]["BRAM_util"] = bram_util
+        bb_setup[bb]["BRAM_util"] = block_bram_util
+        bb_setup[bb]["mem_arrays"] = mem_arrays
         total_dsp += dsp_util
-        total_bram += bram_util
+        total_bram += block_bram_util
+        total_mem_arrays += mem_arrays
 
     return bb_setup
 
+def get_bblocks_bram_util(bblocks_config: dict) -> float:
+    """
+    BRAM utilization (%) of the building blocks of the design, with their memory
+    arrays mapped onto URAM together.
+    """
+    blocks = list(bblocks_config.values())
+    return get_combined_bram_util(
+        blocks[0]["hw"],
+        sum(block["BRAM_util"] for block in blocks),
+        sum((block["mem_arrays"] for block in blocks), []),
+    )
+
+def get_bblock_signature(bb_type: BuildingBlock, bblock: dict, hw) -> tuple:
+    """
+    Key of the performance of a building block configuration when executing a layer,
+    made of the block and layer parameters that the performance model depends on.
+    """
+    bb_hw = bblock["hw"]
+    if bb_type.is_conv:
+        bb_factors = (bblock["f_coarseIn"], bblock["f_coarseOut"])
+        layer_signature = (tuple(hw.padding), tuple(hw.stride))
+    elif bb_type.is_pool:
+        bb_factors = (bblock["coarse_inout"],)
+        layer_signature = (tuple(hw.padding), tuple(hw.stride))
+    elif bb_type.operation == "Activation":
+        bb_factors = (bblock["coarse_inout"],)
+        layer_signature = (hw.op_type,)
+    elif bb_type.operation == "ElementWise":
+        bb_factors = (bblock["coarse_inout"],)
+        layer_signature = (
+            hw.op_type,
+            tuple(hw.input_shape_2[2:]) if np.prod(hw.input_shape_2[2:]) == 1 else None,
+        )
+    elif bb_type.operation == "Gemm":
+        bb_factors = (bblock["coarse_in"], bblock["coarse_out"])
+        layer_signature = ()
+    else:
+        bb_factors = (bblock["coarse_inout"],)
+        layer_signature = ()
+    return (
+        bb_type,
+        tuple(bb_hw.input_shape),
+        tuple(bb_hw.output_shape),
+        tuple(getattr(bb_hw, "kernel_shape", [])),
+        bb_factors,
+        tuple(bblock["bw_in"]),
+        tuple(bblock["bw_out"]),
+    ) + layer_signature
+
+
+def get_bblock_performance(self, bb_type: BuildingBlock, bblock: dict, hw) -> dict:
+    """
+    Performance of a building block when executing a layer, memoized across the
+    iterations of the optimizer. A miss is evaluated on a copy of the block.
+    """
+    key = get_bblock_signature(bb_type, bblock, hw)
+    if key in self.bblock_performance_cache:
+        return self.bblock_performance_cache[key]
+
+    bb_hw = deepcopy(bblock["hw"])
+    if bb_type.is_conv:
+        bb_hw.padding = hw.padding
+        bb_hw.stride = hw.stride
+        performance_modeling = bb_hw.get_design_point(
+            f_fine=1,
+            f_coarseIn=bblock["f_coarseIn"],
+            f_coarseOut=bblock["f_coarseOut"],
+            mem_bw_in=bblock["bw_in"][0],
+            mem_bw_out=bblock["bw_out"][0],
+        )
+    elif bb_type.is_pool:
+        bb_hw.padding = hw.padding
+        bb_hw.stride = hw.stride
+        performance_modeling = bb_hw.get_design_point(
+            f_fine=1,
+            f_coarse_inout=bblock["coarse_inout"],
+            mem_bw_in=bblock["bw_in"][0],
+            mem_bw_out=bblock["bw_out"][0],
+        )
+    elif bb_type.operation == "Activation":
+        bb_hw.op_type = hw.op_type
+        performance_modeling = bb_hw.get_design_point(
+            coarse_inout=bblock["coarse_inout"],
+            mem_bw_in=bblock["bw_in"][0],
+            mem_bw_out=bblock["bw_out"][0],
+        )
+    elif bb_type.operation == "GlobalAveragePool":
+        performance_modeling = bb_hw.get_design_point(
+            coarse_inout=bblock["coarse_inout"],
+            mem_bw_in=bblock["bw_in"][0],
+            mem_bw_out=bblock["bw_out"][0],
+        )
+    elif bb_type.operation == "ElementWise":
+        bb_hw.op_type = hw.op_type
+        if np.prod(hw.input_shape_2[2:]) == 1:
+            bb_hw.input_shape_2[2:] = hw.input_shape_2[2:]
+        performance_modeling = bb_hw.get_design_point(
+            coarse_inout=bblock["coarse_inout"],
+            mem_bw_in_1=bblock["bw_in"][0],
+            mem_bw_in_2=bblock["bw_in"][1],
+            mem_bw_out=bblock["bw_out"][0],
+        )
+    elif bb_type.operation == "Gemm":
+        performance_modeling = bb_hw.get_design_point(
+            coarse_in=bblock["coarse_in"],
+            coarse_out=bblock["coarse_out"],
+            mem_bw_in=bblock["bw_in"][0],
+            mem_bw_out=bblock["bw_out"][0],
+        )
+
+    self.bblock_performance_cache[key] = {
+        "latency(S)": performance_modeling["latency(S)"],
+        "latency(C)": performance_modeling["latency(C)"],
+        "depth": performance_modeling["depth"],
+        "memBwUtil": performance_modeling["memBwUtil"],
+    }
+    return self.bblock_performance_cache[key]
+
+
 def get_cost_latency(self, bblocks_config: dict, lookuptable: dict) -> float:
     if bblocks_config is None:
         return None, None, None, None, None
-    cost = 0.0
     avg_BW = 0.0
     scheduling = {}
+    tasks = {}
+    node_blocks = {}
+    ddr_traffic = {}
     for node in self.graph.nodes:
         bb_type = lookuptable[self.graph.nodes[node]["hw_type"]]
         hw = self.graph.nodes[node]["hw"]
 
+        bblock = bblocks_config[bb_type]
+        node_blocks[node] = bb_type
         if len(hw.input_shape) < 5:
-            depth_calls = 1
-            height_calls = 1
-            width_calls = 1
+            tiling = None
         else:
-            # TODO: Search how to deal with cases where the output dimensions are also altered? Like in convolutional layers with stride > 1.
-            depth_calls = math.ceil(
-                hw.input_shape[2] / bblocks_config[bb_type]["config"]["depth_in"]
-            )
-            height_calls = math.ceil(
-                hw.input_shape[3] / bblocks_config[bb_type]["config"]["height_in"]
-            )
-            width_calls = math.ceil(
-                hw.input_shape[4] / bblocks_config[bb_type]["config"]["width_in"]
-            )
+            # Only strided convolutions and poolings produce tiles smaller than their input
+            block_shape = [
+                bblock["config"]["depth_in"],
+                bblock["config"]["height_in"],
+                bblock["config"]["width_in"],
+            ]
+            if bb_type.is_windowed:
+                tiling = get_tiling(
+                    hw.input_shape[2:],
+                    hw.output_shape[2:],
+                    block_shape,
+                    hw.kernel_shape,
+                    hw.stride,
+                    hw.padding,
+                )
+            else:
+                tiling = get_tiling(hw.input_shape[2:], hw.input_shape[2:], block_shape)
+        depth_calls, height_calls, width_calls = (
+            tiling["tiles"] if tiling else [1, 1, 1]
+        )
 
-        if "Conv" in bb_type or "Gemm" in bb_type:
+        if bb_type.is_conv or bb_type.operation == "Gemm":
             in_calls = math.ceil(
                 hw.input_shape[1]
                 / (
@@ -541,7 +690,7 @@ def get_cost_latency(self, bblocks_config: dict, lookuptable: dict) -> float:
                     * bblocks_config[bb_type]["interleaving_out"]
                 )
             )
-            if bb_type == "Gemm":
+            if bb_type.operation == "Gemm":
                 total_block_calls = (
                     in_calls * out_calls * depth_calls * height_calls * width_calls
                 )
@@ -561,119 +710,146 @@ def get_cost_latency(self, bblocks_config: dict, lookuptable: dict) -> float:
                 inout_calls * depth_calls * height_calls * width_calls
             )
 
-        # TODO: Update the shapes of the bblocks_config[bb_type]["hw"] to account for the overlapping regions because of feature map tilling
-        if "Conv" in bb_type:
-            bblock_padding = deepcopy(bblocks_config[bb_type]["hw"].padding)
-            bblock_stride = deepcopy(bblocks_config[bb_type]["hw"].stride)
-
-            bblocks_config[bb_type]["hw"].padding = hw.padding
-            bblocks_config[bb_type]["hw"].stride = hw.stride
-            performance_modeling = bblocks_config[bb_type]["hw"].get_design_point(
-                f_fine=1,
-                f_coarseIn=bblocks_config[bb_type]["f_coarseIn"],
-                f_coarseOut=bblocks_config[bb_type]["f_coarseOut"],
-                mem_bw_in=bblocks_config[bb_type]["bw_in"][0],
-                mem_bw_out=bblocks_config[bb_type]["bw_out"][0],
-            )
-            bblocks_config[bb_type]["hw"].padding = bblock_padding
-            bblocks_config[bb_type]["hw"].stride = bblock_stride
-        elif "Pooling" in bb_type:
-            bblock_padding = deepcopy(bblocks_config[bb_type]["hw"].padding)
-            bblock_stride = deepcopy(bblocks_config[bb_type]["hw"].stride)
-
-            bblocks_config[bb_type]["hw"].padding = hw.padding
-            bblocks_config[bb_type]["hw"].stride = hw.stride
-            performance_modeling = bblocks_config[bb_type]["hw"].get_design_point(
-                f_fine=1,
-                f_coarse_inout=bblocks_config[bb_type]["coarse_inout"],
-                mem_bw_in=bblocks_config[bb_type]["bw_in"][0],
-                mem_bw_out=bblocks_config[bb_type]["bw_out"][0],
-            )
-            bblocks_config[bb_type]["hw"].padding = bblock_padding
-            bblocks_config[bb_type]["hw"].stride = bblock_stride
-        elif bb_type == "Activation":
-            bblocks_config[bb_type]["hw"].op_type = hw.op_type
-            performance_modeling = bblocks_config[bb_type]["hw"].get_design_point(
-                coarse_inout=bblocks_config[bb_type]["coarse_inout"],
-                mem_bw_in=bblocks_config[bb_type]["bw_in"][0],
-                mem_bw_out=bblocks_config[bb_type]["bw_out"][0],
-            )
-            bblocks_config[bb_type]["hw"].op_type = "Activation"
-        elif bb_type == "GlobalAveragePool":
-            performance_modeling = bblocks_config[bb_type]["hw"].get_design_point(
-                coarse_inout=bblocks_config[bb_type]["coarse_inout"],
-                mem_bw_in=bblocks_config[bb_type]["bw_in"][0],
-                mem_bw_out=bblocks_config[bb_type]["bw_out"][0],
-            )
-        elif bb_type == "ElementWise":
-            bblocks_config[bb_type]["hw"].op_type = hw.op_type
-            bblock_input_shape_2 = deepcopy(
-                bblocks_config[bb_type]["hw"].input_shape_2
-            )
-
-            layer_input_shape_2 = hw.input_shape_2
-            if np.prod(layer_input_shape_2[2:]) == 1:
-                bblocks_config[bb_type]["hw"].input_shape_2[
-                    2:
-                ] = layer_input_shape_2[2:]
-
-            performance_modeling = bblocks_config[bb_type]["hw"].get_design_point(
-                coarse_inout=bblocks_config[bb_type]["coarse_inout"],
-                mem_bw_in_1=bblocks_config[bb_type]["bw_in"][0],
-                mem_bw_in_2=bblocks_config[bb_type]["bw_in"][1],
-                mem_bw_out=bblocks_config[bb_type]["bw_out"][0],
-            )
-            bblocks_config[bb_type]["hw"].op_type = "ElementWise"
-            bblocks_config[bb_type]["hw"].input_shape_2 = bblock_input_shape_2
-        elif bb_type == "Gemm":
-            performance_modeling = bblocks_config[bb_type]["hw"].get_design_point(
-                coarse_in=bblocks_config[bb_type]["coarse_in"],
-                coarse_out=bblocks_config[bb_type]["coarse_out"],
-                mem_bw_in=bblocks_config[bb_type]["bw_in"][0],
-                mem_bw_out=bblocks_config[bb_type]["bw_out"][0],
-            )
-
-        # TODO: Revert back the shapes of the bblocks_config[bb_type]["hw"]
+        performance_modeling = self.get_bblock_performance(
+            bb_type, bblocks_config[bb_type], hw
+        )
 
         bblocks_config[bb_type]["MemBw_util"] = float(performance_modeling["memBwUtil"])
 
-        latency = performance_modeling["latency(S)"] * math.ceil(total_block_calls)
+        if tiling is None:
+            latency = performance_modeling["latency(S)"] * math.ceil(total_block_calls)
+        else:
+            # The block computes over the elements read for every tile (halos
+            # included) and pays its pipeline depth once per tile
+            if bb_type.is_conv:
+                channel_calls = in_calls * out_calls
+                channels_in = math.ceil(hw.input_shape[1] / in_calls)
+                channels_out = math.ceil(hw.output_shape[1] / out_calls)
+            else:
+                channel_calls = inout_calls
+                channels_in = math.ceil(hw.input_shape[1] / inout_calls)
+                channels_out = channels_in
+            ii = performance_modeling["latency(C)"] - performance_modeling["depth"]
+            compute_cycles = channel_calls * (
+                ii * tiling["reads"] / np.prod(block_shape)
+                + tiling["num_tiles"] * performance_modeling["depth"]
+            )
+            reads = [channel_calls * tiling["reads"] * channels_in]
+            if bb_type.operation == "ElementWise":
+                # A broadcasted dimension of the second input is fetched once per tile
+                reads.append(
+                    channel_calls
+                    * channels_in
+                    * np.prod(
+                        [
+                            dim if dim > 1 else tiles
+                            for dim, tiles in zip(hw.input_shape_red[2:], tiling["tiles"])
+                        ]
+                    )
+                )
+            ddr_traffic[node] = {
+                "compute": compute_cycles,
+                "reads": reads,
+                "writes": channel_calls * np.prod(hw.output_shape[2:]) * channels_out,
+                "bw_in": bblock["bw_in"],
+                "bw_out": bblock["bw_out"],
+            }
+            ddr_words = sum(ddr_traffic[node]["reads"]) + ddr_traffic[node]["writes"]
+            ddr_cycles = ddr_words / (sum(bblock["bw_in"]) + sum(bblock["bw_out"]))
+            latency = max(compute_cycles, ddr_cycles) / self.platform.cycles_per_sec
         avg_BW += performance_modeling["memBwUtil"]
         assert math.ceil(total_block_calls) > 0, "Zero calls aborting..."
         scheduling[node] = {
-            "Block Type": bb_type,
+            "Block Type": str(bb_type),
             "Shape In": hw.input_shape,
-            "Shape In 2": hw.input_shape_red if bb_type == "ElementWise" else [],
+            "Shape In 2": hw.input_shape_red if bb_type.operation == "ElementWise" else [],
             "Shape Out": hw.output_shape,
             "Tiling Channels": in_calls
-            if "Conv" in bb_type or "Gemm" in bb_type
+            if bb_type.is_conv or bb_type.operation == "Gemm"
             else inout_calls,
             "Tiling Filters": out_calls
-            if "Conv" in bb_type or "Gemm" in bb_type
+            if bb_type.is_conv or bb_type.operation == "Gemm"
             else 1,
             "Tiling Depth": depth_calls,
             "Tiling Height": height_calls,
             "Tiling Width": width_calls,
+            "Tile In": tiling["tile_in"] if tiling else [],
+            "Tile Out": tiling["tile_out"] if tiling else [],
+            "Redundant Reads": tiling["redundant_reads"] if tiling else 0,
             "Latency": latency,
             "Base Latency": performance_modeling["latency(S)"],
             "Read From": list(self.graph.predecessors(node)),
             "Write To": list(self.graph.successors(node)),
             "Store To Mem": (True if self.graph.out_degree(node) > 1 else False),
             "Load From Mem": (True if self.graph.in_degree(node) > 1 else False),
-            "Kernel Shape": hw.kernel_shape if "Conv" in bb_type else [],
-            "Stride": hw.stride if "Conv" in bb_type else [],
-            "Padding": hw.padding if "Conv" in bb_type else [],
-            "Broadcast": hw.broadcasting if bb_type == "ElementWise" else False,
+            "Kernel Shape": hw.kernel_shape if bb_type.is_conv else [],
+            "Stride": hw.stride if bb_type.is_conv else [],
+            "Padding": hw.padding if bb_type.is_conv else [],
+            "Broadcast": hw.broadcasting if bb_type.operation == "ElementWise" else False,
             "Op Type": hw.op_type
-            if bb_type in ["Activation", "ElementWise"]
+            if bb_type.operation in ["Activation", "ElementWise"]
             else "None",
         }
-        cost += latency
+        tasks[node] = {
+            "blocks": [bb_type],
+            "latency": latency,
+            "bw": performance_modeling["memBwUtil"],
+        }
+
+    # Fused blocks run concurrently and only the ends of the chain use the off-chip memory,
+    # so a group is as slow as its slowest block or its off-chip traffic
+    if self.config.get("layer_fusion", True):
+        groups = get_fused_groups(self.graph, node_blocks)
+    else:
+        groups = [[node] for node in self.graph.nodes]
+    group_tasks = {}
+    for group in groups:
+        if len(group) > 1 and all(node in ddr_traffic for node in group):
+            # The second inputs of the inner ElementWise blocks are read off-chip as well
+            first, last = ddr_traffic[group[0]], ddr_traffic[group[-1]]
+            ddr_words = sum(first["reads"]) + last["writes"]
+            ddr_bw = sum(first["bw_in"]) + sum(last["bw_out"])
+            for node in group[1:]:
+                ddr_words += sum(ddr_traffic[node]["reads"][1:])
+                ddr_bw += sum(ddr_traffic[node]["bw_in"][1:])
+            cycles = max(
+                max(ddr_traffic[node]["compute"] for node in group), ddr_words / ddr_bw
+            )
+            group_tasks[group[0]] = {
+                "blocks": [node_blocks[node] for node in group],
+                "latency": cycles / self.platform.cycles_per_sec,
+                "bw": 100 * ddr_words / cycles / self.platform.mem_words_per_cycle,
+            }
+        else:
+            group_tasks[group[0]] = {
+                "blocks": [node_blocks[node] for node in group],
+                "latency": max(tasks[node]["latency"] for node in group),
+                "bw": max(tasks[node]["bw"] for node in group),
+            }
+        for node in group:
+            scheduling[node]["Fused Group"] = group[0]
+            scheduling[node]["On-chip Input"] = node != group[0]
+            scheduling[node]["On-chip Output"] = node != group[-1]
+
+    # The latency of a model is the makespan of its graph over the building blocks,
+    # weighted by the share of the requests it serves
+    cost = 0
+    times = {}
+    for model, weight in self.model_weights.items():
+        model_groups = [group for group in groups if group[0] in self.model_nodes[model]]
+        makespan, model_times = list_schedule(
+            get_group_graph(self.graph.subgraph(self.model_nodes[model]), model_groups),
+            {group[0]: group_tasks[group[0]] for group in model_groups},
+        )
+        cost += weight * makespan
+        times |= model_times
+    for node in scheduling:
+        scheduling[node]["Start"] = times[scheduling[node]["Fused Group"]]["start"]
+        scheduling[node]["End"] = times[scheduling[node]["Fused Group"]]["end"]
 
     avg_BW = avg_BW / len(self.graph.nodes)
     final_DSP = 0
-    final_BRAM = 0
+    final_BRAM = get_bblocks_bram_util(bblocks_config)
     for bb in bblocks_config:
         final_DSP += bblocks_config[bb]["DSP_util"]
-        final_BRAM += bblocks_config[bb]["BRAM_util"]
     return cost, scheduling, final_DSP, final_BRAM, avg_BW
\ No newline at end of file
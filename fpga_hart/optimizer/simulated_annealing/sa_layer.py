@@ -3,7 +3,6 @@ import copy
 import math
 import random
 import time
-from copy import deepcopy
 
 import numpy as np
 
@@ -16,6 +15,11 @@ from fpga_hart.layers.fully_connected import FCLayer
 from fpga_hart.layers.gap_3d import GAP3DLayer
 from fpga_hart.layers.pooling_3d import Pooling3DLayer
 from fpga_hart.layers.squeeze_excitation import SqueezeExcitationLayer
+from fpga_hart.optimizer.optimizer_helper import (
+    get_combined_bram_util,
+    get_minimum_resource_utilization,
+    get_wr_factor,
+)
 from fpga_hart.utils import utils
 
 
@@ -46,31 +50,17 @@ def run_optimizer_layer(self, layer):
     hw = self.graph.nodes[layer]["hw"]
     wr_factor = 1
     if isinstance(hw, Convolutional3DLayer):
-        initial_filters = deepcopy(hw.filters)
-        coarsein_min = 1 / np.int32(hw.channels)
-        coarseout_min = 1 / np.int32(hw.filters)
-        fine_min = 1 / np.prod(np.array(hw.kernel_shape))
-        _, bram_util, _ = hw.get_resource_util(f_fine = fine_min,
-                                        f_coarseIn = coarsein_min,
-                                        f_coarseOut= coarseout_min)
+        bram_util, _, _, _, mem_arrays = get_minimum_resource_utilization(hw)
+        bram_util = get_combined_bram_util(hw, bram_util, mem_arrays)
         print("Initial BRAM utilization: ", bram_util)
         if bram_util > self.config.max_bram_util:
             _logger.warning(f"Layer's ({layer}) minimum BRAM utilization is above the device's maximum on chip memory resources.\nSplit the layer execution into multiple instances (weights reloading).")
-            for f in utils.get_factors(initial_filters)[1:]:
-                new_out_shape = deepcopy(hw.output_shape)
-                new_out_shape[1] = int(initial_filters/f)
-                hw.update_shapes(hw.input_shape, new_out_shape)
-                coarsein_min = 1 / np.int32(hw.channels)
-                coarseout_min = 1 / np.int32(hw.filters)
-                fine_min = 1 / np.prod(np.array(hw.kernel_shape))
-                _, bram_util, _ = hw.get_resource_util(f_fine = fine_min,
-                                                f_coarseIn = coarsein_min,
-                                                f_coarseOut= coarseout_min)
-                if bram_util < self.config.max_bram_util:
-                    wr_factor = f
-                    break
-            if wr_factor == 1:
+            wr_factor, wr_shapes = get_wr_factor(
+                self.graph, layer, [layer], self.config.max_bram_util
+            )
+            if wr_factor == -1:
                 return None
+            hw.update_shapes(*wr_shapes[layer])
 
     config, cost, dp_info, mem_bw = self.initialize_optimizer_layer(layer, wr_factor=wr_factor)
     if config == None:
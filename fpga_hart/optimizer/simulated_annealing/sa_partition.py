@@ -22,17 +22,23 @@ from fpga_hart.layers.pooling_3d import Pooling3DLayer
 from fpga_hart.layers.squeeze_excitation import SqueezeExcitationLayer
 from fpga_hart.optimizer.optimizer_helper import (
     calculate_wr_factor,
+    get_branch_buffering_utilization,
     get_extra_mem_connections,
+    get_combined_bram_util,
     get_minimum_resource_utilization,
     get_off_chip_mem_connections,
-    get_worst_case_buffering,
+    get_stream_weights_nodes,
+    get_word_length_feasible,
+    get_word_lengths,
+    get_wr_feasible,
+    get_wr_graph,
+    get_wr_layers,
 )
 from fpga_hart.utils import utils
 from fpga_hart.utils.graph_manipulation import (
     add_off_chip_connections,
     get_input_nodes,
     get_output_nodes,
-    get_split_points,
     split_graph,
     visualize_graph,
 )
@@ -49,195 +55,123 @@ def check_partition_fitting(
     bram_type,
     brams_total,
     mem_words_per_cycle,
-    result=[],
+    result=None,
     original_graph=None,
     gap_approx=False,
     force_split=False,
 ):
+    if result is None:
+        result = []
     if original_graph is None:
-        original_graph = deepcopy(graph)
-    sort_order = list(nx.topological_sort(original_graph))
-
-    _, min_bram_util = get_worst_case_buffering(
-        deepcopy(graph),
+        original_graph = graph
+    sort_order = list(nx.topological_sort(graph))
+    node_idx = {n: i for i, n in enumerate(sort_order)}
+
+    nodes_bram_util = []
+    nodes_mem_arrays = []
+    for n in sort_order:
+        bram_util, _, _, _, mem_arrays = get_minimum_resource_utilization(
+            graph.nodes[n]["hw"]
+        )
+        nodes_bram_util.append(bram_util)
+        nodes_mem_arrays.append(mem_arrays)
+    nodes_bram_prefix = np.cumsum([0] + nodes_bram_util)
+    hw = graph.nodes[sort_order[0]]["hw"]
+
+    # The worst case branch buffering is estimated once for the whole graph and each buffer is accounted only in the sub-partitions that contain both of its ends
+    branches_bram_util = {}
+    for (start, end), bram_util in get_branch_buffering_utilization(
+        graph,
         partition_composer,
         mem_words_per_cycle,
         word_bytes,
         bram_type,
         brams_total,
         gap_approx,
-    )
-    if min_bram_util > max_BRAM_util or force_split:
-        for sp in reversed(get_split_points(graph)):
-            ancestors = list(nx.ancestors(graph, sp))
-            ancestors.sort(key=lambda val: sort_order.index(val))
-            subgraph_nodes = deepcopy(ancestors)
-            subgraph_nodes.append(sp)
-
-            # TODO: I dont like this, but it works. It should be improved since it is a workaround
-            if len(subgraph_nodes) == 1 and "Conv" not in subgraph_nodes[0]:
-                descendants = list(nx.descendants(graph, sp))
-                descendants.sort(key=lambda val: sort_order.index(val))
-                convs_added = 0
-                for d in descendants:
-                    if "Conv" in d and graph.in_degree[d] <= 1:
-                        if convs_added >= 1:
-                            break
-                        subgraph_nodes.append(d)
-                        convs_added += 1
-                    else:
-                        subgraph_nodes.append(d)
-
-            graph_1 = graph.subgraph(subgraph_nodes).copy()
-            graph_2 = graph.copy()
-            graph_2.remove_nodes_from(graph_1.nodes())
-
-            _, min_bram_util = get_worst_case_buffering(
-                deepcopy(graph_2),
-                partition_composer,
-                mem_words_per_cycle,
-                word_bytes,
-                bram_type,
-                brams_total,
-                gap_approx,
+    ).items():
+        if start in node_idx:
+            start_idx = node_idx[start]
+        else:
+            start_idx = min(
+                [node_idx[n] for n in graph.predecessors(end)] + [node_idx[end]]
             )
+        branches_bram_util.setdefault(node_idx[end], []).append(
+            (start_idx, bram_util)
+        )
 
-            if min_bram_util <= max_BRAM_util:
-                extra_inputs, extra_outputs = get_extra_mem_connections(
-                    original_graph, subgraph_nodes
-                )
-                weights_reloading = calculate_wr_factor(graph_1, max_BRAM_util)
-                result.append([graph_1, extra_inputs, extra_outputs, weights_reloading])
-
-                if len(graph_2.nodes()) > 0:
-                    self.check_partition_fitting(
-                        graph_2,
-                        partition_composer,
-                        max_BRAM_util,
-                        word_bytes,
-                        bram_type,
-                        brams_total,
-                        mem_words_per_cycle,
-                        result,
-                        original_graph,
-                        gap_approx=gap_approx,
+    def get_segment_bram_util(start, end):
+        bram_util = get_combined_bram_util(
+            hw,
+            nodes_bram_prefix[end] - nodes_bram_prefix[start],
+            sum(nodes_mem_arrays[start:end], []),
+        )
+        for end_idx in range(start, end):
+            for start_idx, branch_bram_util in branches_bram_util.get(end_idx, []):
+                if start_idx >= start:
+                    bram_util += branch_bram_util
+        return bram_util
+
+    heavy_nodes = set(
+        i
+        for i, n in enumerate(sort_order)
+        if graph.nodes[n]["type"] in ["Conv", "GlobalAveragePool"]
+    )
+    next_heavy = [len(sort_order)] * len(sort_order)
+    for i in reversed(range(len(sort_order) - 1)):
+        next_heavy[i] = i + 1 if i + 1 in heavy_nodes else next_heavy[i + 1]
+
+    cut_points = []
+    start = 0
+    last_heavy = -1
+    for i in range(len(sort_order)):
+        if i < start:
+            continue
+        segment_bram_util = get_segment_bram_util(start, i + 1)
+
+        if segment_bram_util > max_BRAM_util:
+            # Split right before the current layer if the sub-partition already has a Conv or GAP layer, otherwise extend it up to the next one
+            cut = i if start <= last_heavy < i else next_heavy[i]
+            if cut == len(sort_order):
+                # There is no Conv or GAP layer left, so the tail is split right before the current layer
+                if i == start:
+                    raise ValueError(
+                        f"Graph {graph.nodes()} does not fit in the device even after partitioning based on branch buffering"
                     )
-                break
-        if min_bram_util > max_BRAM_util:
+                cut = i
+            cut_points.append(cut)
+            start = cut
+        if i in heavy_nodes:
+            last_heavy = i
+
+    if force_split and not cut_points:
+        if len(sort_order) == 1:
             raise ValueError(
                 f"Graph {graph.nodes()} does not fit in the device even after partitioning based on branch buffering"
             )
-    else:
-        for layer in nx.topological_sort(graph):
-            hw = graph.nodes[layer]["hw"]
-            bram_util, _, _, _ = get_minimum_resource_utilization(hw)
-
-            min_bram_util += bram_util
-            if min_bram_util > max_BRAM_util:
-                ancestors = list(nx.ancestors(graph, layer))
-                ancestors.sort(key=lambda val: sort_order.index(val))
-                descendants = list(nx.descendants(graph, layer))
-                descendants.sort(key=lambda val: sort_order.index(val))
-
-                extra_inputs = []
-                extra_outputs = []
-                if ancestors:
-                    subgraph_nodes = deepcopy(ancestors)
-
-                    append_current = True
-                    for ancestor in subgraph_nodes:
-                        if "GlobalAveragePool" in ancestor or "Conv" in ancestor:
-                            append_current = False
-                            break
-
-                    if append_current:
-                        subgraph_nodes.append(layer)
-
-                        for descendant in descendants:
-                            if (
-                                "GlobalAveragePool" in descendant
-                                or "Conv" in descendant
-                            ):
-                                break
-                            if "Add" in descendant or "Mul" in descendant:
-                                split_points = get_split_points(graph)
-                                if not split_points:
-                                    subgraph_nodes.append(descendant)
-                                else:
-                                    # TODO: Check to which split point the descendant is connected and check only that
-                                    if len(split_points) > 1:
-                                        raise ValueError(
-                                            "More than one split point found. Not supported yet."
-                                        )
-                                    if not list(
-                                        nx.all_simple_paths(
-                                            graph, split_points[0], descendant
-                                        )
-                                    ):
-                                        subgraph_nodes.append(descendant)
-                                        break
-
-                    extra_inputs, extra_outputs = get_extra_mem_connections(
-                        original_graph, subgraph_nodes
-                    )
-                    graph_1 = graph.subgraph(subgraph_nodes).copy()
-                    weights_reloading = calculate_wr_factor(graph_1, max_BRAM_util)
-                    result.append([
-                        graph_1,
-                        extra_inputs,
-                        extra_outputs,
-                        weights_reloading,
-                    ])
-                else:
-                    subgraph_nodes = [layer]
-
-                    for descendant in descendants:
-                        if "GlobalAveragePool" in descendant or "Conv" in descendant:
-                            break
-                        subgraph_nodes.append(descendant)
+        half_bram_util = nodes_bram_prefix[-1] / 2
+        candidates = [i for i in heavy_nodes if i > 0]
+        if not candidates:
+            candidates = list(range(1, len(sort_order)))
+        cut_points.append(
+            min(candidates, key=lambda i: abs(nodes_bram_prefix[i] - half_bram_util))
+        )
 
-                    extra_inputs, extra_outputs = get_extra_mem_connections(
-                        original_graph, subgraph_nodes
-                    )
-                    graph_1 = graph.subgraph(subgraph_nodes).copy()
-                    weights_reloading = calculate_wr_factor(graph_1, max_BRAM_util)
-                    result.append([
-                        graph_1,
-                        extra_inputs,
-                        extra_outputs,
-                        weights_reloading,
-                    ])
-
-                graph_2 = graph.copy()
-                graph_2.remove_nodes_from(graph_1.nodes())
-                if len(graph_2.nodes()) > 0:
-                    self.check_partition_fitting(
-                        graph_2,
-                        partition_composer,
-                        max_BRAM_util,
-                        word_bytes,
-                        bram_type,
-                        brams_total,
-                        mem_words_per_cycle,
-                        result,
-                        original_graph,
-                        gap_approx=gap_approx,
-                    )
-                break
-        if min_bram_util <= max_BRAM_util:
-            extra_inputs, extra_outputs = get_extra_mem_connections(
-                original_graph, graph.nodes()
-            )
-            weights_reloading = calculate_wr_factor(graph, max_BRAM_util)
-            result.append([graph, extra_inputs, extra_outputs, weights_reloading])
-
-    result_split = []
-    for i, r in enumerate(result):
-        curr_graph, extra_inputs, extra_outputs, weights_reloading = r
-        curr_graph = deepcopy(curr_graph)
-        nodes_in, nodes_out = get_off_chip_mem_connections(curr_graph)
+    sub_partitions = []
+    for start, end in zip([0] + cut_points, cut_points + [len(sort_order)]):
+        subgraph_nodes = sort_order[start:end]
+        extra_inputs, extra_outputs = get_extra_mem_connections(
+            original_graph, subgraph_nodes
+        )
+        graph_1 = graph.subgraph(subgraph_nodes).copy()
+        weights_reloading = calculate_wr_factor(graph_1, max_BRAM_util)
+        sub_partitions.append([graph_1, extra_inputs, extra_outputs, weights_reloading])
+
+    for sub_partition in sub_partitions:
+        curr_graph, extra_inputs, extra_outputs, weights_reloading = sub_partition
+        curr_graph_mem = deepcopy(curr_graph)
+        nodes_in, nodes_out = get_off_chip_mem_connections(curr_graph_mem)
         read_points, write_points = add_off_chip_connections(
-            curr_graph, nodes_in, nodes_out, gap_approx=gap_approx
+            curr_graph_mem, nodes_in, nodes_out, gap_approx=gap_approx
         )
 
         (
@@ -247,7 +181,7 @@ def check_partition_fitting(
             _,
             _,
         ) = self.initialize_optimizer_partition(
-            graph=curr_graph,
+            graph=curr_graph_mem,
             read_points=read_points,
             write_points=write_points,
             wr_factor=weights_reloading,
@@ -258,24 +192,21 @@ def check_partition_fitting(
             _logger.warning(
                 "Initial design point can not be found, splitting the graph further"
             )
-            result_split.append(i)
-
-    for i in result_split:
-        curr_graph, _, _, _ = result[i]
-        del result[i]
-        self.check_partition_fitting(
-            curr_graph,
-            partition_composer,
-            max_BRAM_util,
-            word_bytes,
-            bram_type,
-            brams_total,
-            mem_words_per_cycle,
-            result,
-            original_graph,
-            gap_approx=gap_approx,
-            force_split=True,
-        )
+            self.check_partition_fitting(
+                curr_graph,
+                partition_composer,
+                max_BRAM_util,
+                word_bytes,
+                bram_type,
+                brams_total,
+                mem_words_per_cycle,
+                result,
+                original_graph,
+                gap_approx=gap_approx,
+                force_split=True,
+            )
+        else:
+            result.append(sub_partition)
 
     return result
 
@@ -285,7 +216,9 @@ def initialize_optimizer_partition(
 ):
     self.freeze_param = True
 
-    config, mem_bw, _, _ = self.generate_random_config_partition(target_graph=graph)
+    config, mem_bw, _, _ = self.generate_random_config_partition(
+        target_graph=graph, wr_factor=wr_factor
+    )
     cost, dp_info = self.get_cost_partition(
         config,
         mem_bw,
@@ -302,7 +235,7 @@ def initialize_optimizer_partition(
             x = float(time.time() - start_time)
             perc = 1 / (1 + math.exp(-0.1 * (x - 45)))
             config, mem_bw, _, _ = self.generate_random_config_partition(
-                target_graph=graph, keep_percentage=perc
+                target_graph=graph, keep_percentage=perc, wr_factor=wr_factor
             )
             cost, dp_info = self.get_cost_partition(
                 config,
@@ -430,6 +363,7 @@ def run_optimizer_partition(self):
                         prev_state=prev_state,
                         slowest_nodes=slowest_nodes,
                         target_graph=graph,
+                        wr_factor=weights_reloading,
                     )
                     new_cost, new_dp_info = self.get_cost_partition(
                         new_state,
@@ -498,13 +432,14 @@ def run_optimizer_partition(self):
 
         mem_bw_list.append(best_solution_mem)
         dp_info_list.append(best_solution_dp)
-        wr_list.append(weights_reloading)
+        # The design point is evaluated on the graph reshaped for its own weights reloading factor (get_cost_partition), which is the one it reports
+        wr_list.append(best_solution_dp["wr_factor"])
 
         print(
             f"\n\n{Fore.LIGHTBLUE_EX}Latency: {best_latency}{Fore.WHITE}\nFinal Memory IN {list(np.array(best_solution_mem[0]) * self.platform.mem_words_per_cycle)}, Memory OUT {list(np.array(best_solution_mem[1]) * self.platform.mem_words_per_cycle)}"
         )
         print(
-            "Latency(C)={}, Latency(S)={:.6f}, GOP/s={:.2f}, volumes/s={:.2f}, DSP(%)={}({:.2f}), BRAM(%)={}({:.2f}), rateIn={}, RateOut={}, Depth={}({}), Muls={}, Adds={}, Mem(W)={}, Mem(KB)={}, MemBoundIn={}, MemBoundOut={}".format(  # \nPartition Configuration: {}
+            "Latency(C)={}, Latency(S)={:.6f}, GOP/s={:.2f}, volumes/s={:.2f}, DSP(%)={}({:.2f}), BRAM(%)={}({:.2f}), URAM(%)={}({:.2f}), rateIn={}, RateOut={}, Depth={}({}), Muls={}, Adds={}, Mem(W)={}, Mem(KB)={}, MemBoundIn={}, MemBoundOut={}".format(  # \nPartition Configuration: {}
                 best_solution_dp["latency(C)"],
                 best_solution_dp["latency(S)"],
                 best_solution_dp["GOP/s"],
@@ -513,6 +448,8 @@ def run_optimizer_partition(self):
                 best_solution_dp["DSP"],
                 best_solution_dp["BRAM_RAW"],
                 best_solution_dp["BRAM"],
+                best_solution_dp["URAM_RAW"],
+                best_solution_dp["URAM"],
                 best_solution_dp["rateIn"],
                 best_solution_dp["rateOut"],
                 best_solution_dp["depth"],
@@ -558,12 +495,26 @@ def get_cost_partition(
     else:
         branch_mem = branch_mem_update
 
+    wr_layers = get_wr_layers(graph)
+    if wr_layers and "wr_factor" in config.get(wr_layers[0], {}):
+        wr_choice = config[wr_layers[0]]["wr_factor"]
+        if wr_choice != wr_factor:
+            _, wr_filters = get_wr_feasible(graph, wr_layers, wr_factor)
+            graph = get_wr_graph(graph, wr_choice, wr_filters, wr_layers)
+        wr_factor = wr_choice
+
     comb_config = {}
     for k, v in config.items():
         if v["op_type"] == "GlobalAveragePool":
             comb_config[k] = [v["coarse_inout"]]
         elif v["op_type"] == "Conv":
-            comb_config[k] = [v["fine"], v["coarse_in"], v["coarse_out"]]
+            comb_config[k] = [
+                v["fine"],
+                v["coarse_in"],
+                v["coarse_out"],
+                v.get("stream_weights", False),
+                v.get("double_buffer_weights", False),
+            ]
         elif v["op_type"] == "Pooling":
             comb_config[k] = [v["fine"], v["coarse_inout"]]
         elif v["op_type"] == "Activation":
@@ -577,16 +528,23 @@ def get_cost_partition(
         else:
             assert False, "Not supported layer"
 
+    mem_bw_out = mem_bw[1][: len(write_points)]
+    mem_bw_weights = dict(
+        zip(get_stream_weights_nodes(config), mem_bw[1][len(write_points) :])
+    )
+
     dp_info = self.partition_composer.get_design_point(
         graph.copy(),
         comb_config,
         mem_bw[0],
-        mem_bw[1],
+        mem_bw_out,
         read_points,
         write_points,
         gap_approx=self.gap_approx,
         branch_mem=branch_mem,
         wr_factor=wr_factor,
+        mem_bw_weights=mem_bw_weights,
+        word_lengths=get_word_lengths(config),
     )
     if dp_info["config"]:
         return dp_info["latency(S)"], dp_info
@@ -604,12 +562,17 @@ def generate_random_config_partition(
     param_perc=0.3,
     n_in=1,
     n_out=1,
+    wr_factor=1,
 ):
     if target_graph is None:
         graph = self.graph.copy()
     else:
         graph = target_graph
 
+    wr_layers = get_wr_layers(graph)
+    wr_feasible, wr_filters = get_wr_feasible(graph, wr_layers, wr_factor)
+    wr_node = wr_layers[0] if wr_filters is not None else None
+
     # if neighbours:
     #     if not self.freeze_param:
     #         self.param_changes += 1
@@ -642,10 +605,16 @@ def generate_random_config_partition(
     else:
         config = {}
 
+    # Candidate precisions of the layers. If none are given every layer uses the word length of the platform
+    word_lengths = self.config.get("word_lengths", [])
+    min_word_length = self.config.get("min_word_length", {})
+
+    wr_changed = False
     # keep_percentage = 0.95
     for node in config_nodes:
         if slowest_nodes is not None and node not in slowest_nodes:
             continue
+        apply_transform = None
 
         op_type = graph.nodes[node]["type"]
         hw = graph.nodes[node]["hw"]
@@ -670,6 +639,12 @@ def generate_random_config_partition(
             channels = hw.channels
             filters = hw.filters
             kernel_size = hw.kernel_shape
+            if node == wr_node:
+                wr_choice = random.choice(wr_feasible)
+                if slowest_nodes and node in config.keys():
+                    filters = wr_filters // config[node]["wr_factor"]
+                else:
+                    filters = wr_filters // wr_choice
             coarse_in_feasible = utils.get_factors(
                 channels, keep_percentage=keep_percentage
             )
@@ -692,6 +667,25 @@ def generate_random_config_partition(
                     config[node][apply_transform] = coarse_out_factor
                 elif apply_transform == "fine":
                     config[node][apply_transform] = fine_factor
+                elif apply_transform == "stream_weights":
+                    config[node][apply_transform] = not config[node][apply_transform]
+                elif apply_transform == "double_buffer_weights":
+                    config[node][apply_transform] = (
+                        config[node]["wr_factor"] > 1
+                        and not config[node][apply_transform]
+                    )
+                elif apply_transform == "wr_factor":
+                    filters = wr_filters // wr_choice
+                    coarse_out_feasible = utils.get_factors(
+                        filters, keep_percentage=keep_percentage
+                    )
+                    config[node][apply_transform] = wr_choice
+                    config[node]["coarse_out"] = (
+                        random.choice(coarse_out_feasible) / filters
+                    )
+                    if wr_choice == 1:
+                        config[node]["double_buffer_weights"] = False
+                    wr_changed = True
             else:
                 config[node] = {
                     "op_type": op_type,
@@ -699,6 +693,14 @@ def generate_random_config_partition(
                     "coarse_in": coarse_in_factor,
                     "coarse_out": coarse_out_factor,
                 }
+                if node == wr_node:
+                    config[node]["wr_factor"] = wr_choice
+                    wr_changed = wr_choice != wr_factor
+                    # Double buffering the reloaded weights hides their loading behind the computation at the cost of twice their BRAM. Without reloading there is nothing to hide
+                    config[node]["double_buffer_weights"] = wr_choice > 1 and random.choice([False, True])
+                else:
+                    # Weights of the rest of the Conv layers can be streamed from the off-chip memory instead of being stored on-chip
+                    config[node]["stream_weights"] = random.choice([False, True])
         elif isinstance(hw, Pooling3DLayer):
             channels = hw.channels
             kernel_size = hw.kernel_shape
@@ -805,10 +807,41 @@ def generate_random_config_partition(
         else:
             assert False, "Not supported layer"
 
+        if word_lengths:
+            wl_feasible = get_word_length_feasible(
+                node, op_type, word_lengths, min_word_length
+            )
+            if "word_length" not in config[node]:
+                config[node]["word_length"] = random.choice(wl_feasible)
+                if isinstance(hw, (Convolutional3DLayer, FCLayer)):
+                    config[node]["weights_word_length"] = random.choice(wl_feasible)
+            elif apply_transform in ["word_length", "weights_word_length"]:
+                config[node][apply_transform] = random.choice(wl_feasible)
+
+    # The layers after the weights reloaded Conv process one pass of its filters at a time, so their coarse factors have to be drawn for the channels of the chosen weights reloading factor instead of the ones of the graph
+    if wr_node is not None and wr_node in config:
+        wr_config = config[wr_node]["wr_factor"]
+        wr_channels = wr_filters // wr_config
+        for node in wr_layers[1:]:
+            if "coarse_inout" not in config.get(node, {}):
+                continue
+            redrawn = slowest_nodes is None or node in slowest_nodes
+            if wr_changed or (redrawn and wr_config != wr_factor):
+                config[node]["coarse_inout"] = (
+                    random.choice(
+                        utils.get_factors(wr_channels, keep_percentage=keep_percentage)
+                    )
+                    / wr_channels
+                )
+
     num_in_nodes = len(get_input_nodes(graph))
     num_out_nodes = len(get_output_nodes(graph))
+    # Every node that streams its weights gets a share of the memory bandwidth after the output ports
+    num_stream_nodes = len(get_stream_weights_nodes(config))
     mem_config_in, mem_config_out = self.get_mem_bw_feasible(
-        n_in=num_in_nodes, n_out=num_out_nodes, gap_approx=self.gap_approx
+        n_in=num_in_nodes,
+        n_out=num_out_nodes + num_stream_nodes,
+        gap_approx=self.gap_approx,
     )
 
     return config, [mem_config_in, mem_config_out], self.param_changes, param_perc
@@ -35,10 +35,14 @@ class ModelLayerDescriptor(OnnxModelParser):
             se_module = deque(maxlen=6)
         swish_module = deque(maxlen=2)
 
+        # The Flatten layers are dropped and their consumers read the tensor that they flatten
+        flatten_aliases = {}
         for k in self.torch_layers.keys():
 
             name = k
             if "Flatten" in name:
+                input_id = self.torch_layers[k]["input_id"][0]
+                flatten_aliases[self.torch_layers[k]["output_id"]] = flatten_aliases.get(input_id, input_id)
                 continue
             operation = self.torch_layers[k]["operation"]
             input_shape = [self.torch_layers[k]["input"][0]]
@@ -46,24 +50,7 @@ class ModelLayerDescriptor(OnnxModelParser):
             if operation in ["Relu", "Sigmoid", "Elu", "HardSigmoid", "LeakyRelu", "PRelu", "Selu", "Tanh", "Celu", "HardSwish", "Softmax"] and len(input_shape[0]) == 2 and len(output_shape) == 2:
                 input_shape[0] = input_shape[0] + [1, 1, 1]
                 output_shape = output_shape + [1, 1, 1]
-            input_node = [self.torch_layers[k]["input_id"][0]]
-            if self.model_name == "x3d_m":
-                if name == "Gemm_401":
-                    input_node = [self.torch_layers["GlobalAveragePool_391"]["output_id"]]
-            if self.model_name == "slowonly":
-                if name == "Gemm_181":
-                    input_node = [self.torch_layers["GlobalAveragePool_172"]["output_id"]]
-            if self.model_name == "r2plus1d_18":
-                if name == "Gemm_89":
-                    input_node = [self.torch_layers["GlobalAveragePool_80"]["output_id"]]
-            if self.model_name == "r2plus1d_34":
-                if name == "Gemm_161":
-                    input_node = [self.torch_layers["GlobalAveragePool_152"]["output_id"]]
-            if self.model_name == "c3d":
-                if name == "Gemm_32":
-                    input_node = [self.torch_layers["Relu_25"]["output_id"]]
-                if name == "Gemm_22":
-                    input_node = [self.torch_layers["MaxPool_20"]["output_id"]]
+            input_node = [flatten_aliases.get(self.torch_layers[k]["input_id"][0], self.torch_layers[k]["input_id"][0])]
             output_node = self.torch_layers[k]["output_id"]
 
             self.layers[name] = {
@@ -117,8 +104,8 @@ class ModelLayerDescriptor(OnnxModelParser):
 
             if operation == "Add" or operation == "Mul" or operation == "MatMul":
                 self.layers[name]["shape_in"].append(self.torch_layers[k]["input"][1])
-                self.layers[name]["node_in"].append(self.torch_layers[k]["input_id"][1])
-                if self.model_name == "x3d_m" and operation == "MatMul":
+                self.layers[name]["node_in"].append(flatten_aliases.get(self.torch_layers[k]["input_id"][1], self.torch_layers[k]["input_id"][1]))
+                if operation == "MatMul":
                     self.layers[name]["kernel"] = self.torch_layers[k]["kernel"]
 
             swish_module.append([operation, name])
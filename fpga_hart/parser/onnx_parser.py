@@ -91,6 +91,45 @@ def filter_value_info_per_node(model):
     model.graph.value_info.extend(new_value_info)
     return model
 
+@dataclass
+class OnnxWeightStore:
+    """
+    Read-only access to the initializers of a model whose tensors are stored as ONNX external data. Each initializer is memory mapped from the external data file the first time it is requested and kept as a view afterwards, so that the weights are paged in from the disk only when they are actually read and are never copied, while the (small) tensors kept inside the model are returned as views of their raw data.
+    """
+
+    model: onnx.ModelProto
+    base_dir: str
+
+    def __post_init__(self) -> None:
+        self.initializers = {init.name: init for init in self.model.graph.initializer}
+        self.arrays = {}
+
+    def __contains__(self, name: str) -> bool:
+        return name in self.initializers
+
+    def __getitem__(self, name: str) -> np.ndarray:
+        if name not in self.arrays:
+            self.arrays[name] = self.load_tensor(self.initializers[name])
+        return self.arrays[name]
+
+    def load_tensor(self, tensor: onnx.TensorProto) -> np.ndarray:
+        # The raw data of the tensors are always stored in little endian
+        dtype = np.dtype(onnx.helper.tensor_dtype_to_np_dtype(tensor.data_type)).newbyteorder("<")
+        shape = tuple(tensor.dims)
+        if onnx.external_data_helper.uses_external_data(tensor):
+            info = onnx.external_data_helper.ExternalDataInfo(tensor)
+            return np.memmap(
+                os.path.join(self.base_dir, info.location),
+                dtype=dtype,
+                mode="r",
+                offset=info.offset or 0,
+                shape=shape,
+            )
+        if tensor.HasField("raw_data"):
+            return np.frombuffer(tensor.raw_data, dtype=dtype).reshape(shape)
+        return onnx.numpy_helper.to_array(tensor)
+
+
 @dataclass
 class OnnxModelParser:
     model_name: str
@@ -99,6 +138,7 @@ class OnnxModelParser:
         # _logger.setLevel(level=logging.INFO)
         self.model_path = os.path.join(os.getcwd(), "models", self.model_name + ".onnx")
         self.optimized_model_path = os.path.join(os.getcwd(), "models", self.model_name + "_optimized.onnx")
+        self.optimized_data_path = os.path.join(os.getcwd(), "models", self.model_name + "_optimized.data")
         self.torch_layers = {}
         self.init_onnx_model()
 
@@ -138,10 +178,19 @@ class OnnxModelParser:
         onnx.checker.check_model(self.onnx_model)
 
         self.onnx_model.graph.value_info.append(self.onnx_model.graph.output[0])
+        # The external data are appended to an existing file, so the previous run's data are removed first
+        if os.path.exists(self.optimized_data_path):
+            os.remove(self.optimized_data_path)
+        # Saving the weights as external data also drops them from the in-memory model, which keeps only the graph structure from now on
         onnx.save(
             self.onnx_model,
             self.optimized_model_path,
+            save_as_external_data=True,
+            all_tensors_to_one_file=True,
+            location=os.path.basename(self.optimized_data_path),
+            size_threshold=1024,
         )
+        self.weights = OnnxWeightStore(self.onnx_model, os.path.dirname(self.optimized_model_path))
         self.num_onnx_nodes = len(self.onnx_model.graph.node)
         self.get_config()
         self.parse_layers()
@@ -155,13 +204,9 @@ class OnnxModelParser:
         weight = None
         bias = None
 
-        weight_initializer = node.input[1]
-        weight_initializer_idx = [i for i, n in enumerate(self.onnx_model.graph.initializer) if n.name == weight_initializer][0]
-        weight = onnx.numpy_helper.to_array(self.onnx_model.graph.initializer[weight_initializer_idx])
-        bias_initializer = node.input[2] if len(node.input) > 2 else None
-        if bias_initializer is not None:
-            bias_initializer_idx = [i for i, n in enumerate(self.onnx_model.graph.initializer) if n.name == bias_initializer][0]
-            bias = onnx.numpy_helper.to_array(self.onnx_model.graph.initializer[bias_initializer_idx])
+        weight = self.weights[node.input[1]]
+        if len(node.input) > 2:
+            bias = self.weights[node.input[2]]
 
         return weight, bias
 
@@ -176,7 +221,13 @@ class OnnxModelParser:
     def onnx_forward(self, x: dict) -> Tuple[list, list]:
         assert len(self.initial_model_inputs) == 1, "Only one input supported in the onnx model"
 
-        ort_sess = ort.InferenceSession(self.onnx_model.SerializeToString())
+        # The serialized model holds only the graph, the weights are read from its external data file
+        sess_options = ort.SessionOptions()
+        sess_options.add_session_config_entry(
+            "session.model_external_initializers_file_folder_path",
+            os.path.dirname(self.optimized_model_path),
+        )
+        ort_sess = ort.InferenceSession(self.onnx_model.SerializeToString(), sess_options)
         output_nodes_names = [self.get_node_from_tensor_output(out.name).name for out in ort_sess.get_outputs()]
 
         outputs = ort_sess.run(None, x)
@@ -215,7 +266,7 @@ class OnnxModelParser:
         for tensor in node.input:
             if tensor in self.initial_model_inputs:
                 continue
-            if not tensor in [ninit.name for ninit in self.onnx_model.graph.initializer]:
+            if not tensor in self.weights:
                 prev_nodes.append(self.get_node_from_tensor_output(tensor))
         return prev_nodes
 
@@ -223,7 +274,7 @@ class OnnxModelParser:
         next_nodes = []
         node = [n for n in self.onnx_model.graph.node if n.name == node_name][0]
         for tensor in node.output:
-            if not tensor in [ninit.name for ninit in self.onnx_model.graph.initializer]:
+            if not tensor in self.weights:
                 next_nodes.append(self.get_node_from_tensor_input(tensor))
         return next_nodes
 
@@ -277,25 +328,11 @@ class OnnxModelParser:
         # assert len(self.onnx_model.graph.input) == 1, "Model has multiple inputs or the initializers are duplicated to inputs as well. Aborting..."
 
         layers_outputs = {}
+        # Outputs of the unsupported nodes (e.g. Reshape, Squeeze, Dropout) that only forward the tensor of a supported layer
+        tensor_aliases = {}
         isFirstLayer = True
         for n, v in zip(self.onnx_model.graph.node, self.onnx_model.graph.value_info):
             if n.op_type in self.supported_operations:
-                if self.model_name == "x3d_m":
-                    if n.name == "Gemm_401":
-                        layers_outputs[n.input[0]] = [1, 432]
-                if self.model_name == "slowonly":
-                    if n.name == "Gemm_181":
-                        layers_outputs[n.input[0]] = [1, 2048]
-                if self.model_name == "r2plus1d_18":
-                    if n.name == "Gemm_89":
-                        layers_outputs[n.input[0]] = [1, 512]
-                if self.model_name == "r2plus1d_34":
-                    if n.name == "Gemm_161":
-                        layers_outputs[n.input[0]] = [1, 512]
-                if self.model_name == "c3d":
-                    if n.name == "Gemm_32":
-                        layers_outputs[n.input[0]] = [1, 4096]
-
                 layer_input_ids = []
                 layer_input_shapes = []
                 dilation = []
@@ -415,8 +452,7 @@ class OnnxModelParser:
                     layer_input_shapes.append(layers_outputs[n.input[0]])
                     layer_input_shapes.append(layers_outputs[n.input[1]])
 
-                    if self.model_name == "x3d_m" or self.model_name == "x3d_m_seq":
-                        kernel = layers_outputs[n.input[1]]
+                    kernel = layers_outputs[n.input[1]]
 
                 elif (
                     n.op_type == "Relu"
@@ -434,7 +470,7 @@ class OnnxModelParser:
                     layer_input_ids.append(n.input[0])
                     layer_input_shapes.append(layers_outputs[n.input[0]])
 
-                elif n.op_type == "Resize":
+                elif n.op_type == "Resize" or n.op_type == "Flatten":
                     layer_input_ids.append(n.input[0])
                     layer_input_shapes.append(layers_outputs[n.input[0]])
 
@@ -446,7 +482,7 @@ class OnnxModelParser:
                 self.torch_layers[n.name] = {
                     "operation": n.op_type,
                     "input": layer_input_shapes,
-                    "input_id": layer_input_ids,
+                    "input_id": [tensor_aliases.get(i, i) for i in layer_input_ids],
                     "output": out_shape,
                     "output_id": n.output[0],
                     "kernel": kernel,
@@ -470,6 +506,13 @@ class OnnxModelParser:
                         n.name, n.op_type
                     )
                 )
+                if n.input and n.input[0] in layers_outputs:
+                    layers_outputs[n.output[0]] = [
+                        dim.dim_value for dim in v.type.tensor_type.shape.dim
+                    ]
+                    tensor_aliases[n.output[0]] = tensor_aliases.get(
+                        n.input[0], n.input[0]
+                    )
                 self.num_onnx_nodes -= 1
 
     def get_model_initializer(
@@ -478,7 +521,7 @@ class OnnxModelParser:
         for node in self.onnx_model.graph.initializer:
             if node.name == name:  # exact match
                 if to_tensor:
-                    return onnx.numpy_helper.to_array(node)
+                    return self.weights[name]
                 else:
                     return node
 
@@ -24,8 +24,10 @@ DEBUG = False
 
 
 class PartitionComposer(BaseLayer3D):
-    def __init__(self, max_DSP_util, max_BRAM_util, platform):
+    def __init__(self, max_DSP_util, max_BRAM_util, platform, batch_size=1):
         super().__init__(max_DSP_util=max_DSP_util, max_BRAM_util=max_BRAM_util, platform=platform)
+        assert batch_size >= 1, "Batch size must be at least 1."
+        self.batch_size = batch_size
         self.preliminary_branch_depth = {}
 
     def update_layer(self):
@@ -47,12 +49,18 @@ class PartitionComposer(BaseLayer3D):
         self.dsps_raw = 0
         self.bram_util = 0
         self.bram_raw = 0
+        self.uram_util = 0
+        self.uram_raw = 0
         self.latency_sec = 0
         self.latency_cycles = 0
         self.throughput_ops = 0
         self.throughput_vols = 0
         self.total_ops = 0
+        self.wr_factor = 1
+        self.wr_reload_cycles = 0
+        self.wr_double_buffer = False
         self.max_latency_nodes = None
+        self.layers_info = {}
 
     def get_total_workload(self, graph, wr_factor=1):
         total_wl = 0
@@ -84,6 +92,8 @@ class PartitionComposer(BaseLayer3D):
         dp_info["DSP_RAW"] = self.dsps_raw
         dp_info["BRAM"] = self.bram_util
         dp_info["BRAM_RAW"] = self.bram_raw
+        dp_info["URAM"] = self.uram_util
+        dp_info["URAM_RAW"] = self.uram_raw
         dp_info["rateIn"] = self.full_rate_in
         dp_info["rateOut"] = self.full_rate_out
         dp_info["depth"] = self.depth
@@ -92,16 +102,60 @@ class PartitionComposer(BaseLayer3D):
         dp_info["adds"] = self.max_parallel_adds
         dp_info["memWords"] = self.memory
         dp_info["memKBs"] = self.memoryKB
-        dp_info["dataSizeIn"] = (self.data_size_in * self.word_bytes) / 1e6
-        dp_info["dataSizeOut"] = (self.data_size_out * self.word_bytes) / 1e6
+        # The data sizes of the partition are kept in bytes since every layer may use its own precision
+        dp_info["dataSizeIn"] = self.data_size_in / 1e6
+        dp_info["dataSizeOut"] = self.data_size_out / 1e6
         dp_info["memBoundedIn"] = self.mem_bd_in
         dp_info["memBoundedOut"] = self.mem_bd_out
         dp_info["slowestNodes"] = self.max_latency_nodes
+        dp_info["layersInfo"] = self.layers_info
+        dp_info["wr_factor"] = self.wr_factor
+        dp_info["reloadCycles"] = self.wr_reload_cycles
+        dp_info["doubleBufferWeights"] = self.wr_double_buffer
         dp_info["config"] = self.config
         dp_info["structure"] = self.structure
 
         return dp_info
 
+    @staticmethod
+    def get_branch_paths(graph, in_point, end_point):
+        """
+        Single pass over the topological order of the nodes between in_point and end_point.
+        Returns the number of paths together with the shortest and longest (in terms of accumulated depth) paths.
+        Ties are resolved in the same order as nx.all_simple_paths enumerates the paths.
+        """
+        branch_nodes = (nx.descendants(graph, in_point) & nx.ancestors(graph, end_point)) | {in_point}
+        num_paths = {end_point: 1}
+        shortest = {}
+        longest = {}
+        for node in reversed(list(nx.topological_sort(graph.subgraph(branch_nodes)))):
+            num_paths[node] = 0
+            for succ in graph.successors(node):
+                if succ not in num_paths:
+                    continue
+                num_paths[node] += num_paths[succ]
+                if succ == end_point:
+                    succ_min, succ_max = 0, 0
+                else:
+                    succ_min = graph.nodes[succ]["hw"].depth + shortest[succ][0]
+                    succ_max = graph.nodes[succ]["hw"].depth + longest[succ][0]
+                if node not in shortest or succ_min < shortest[node][0]:
+                    shortest[node] = (succ_min, succ)
+                if node not in longest or succ_max > longest[node][0]:
+                    longest[node] = (succ_max, succ)
+
+        def build_path(pointers):
+            path = [in_point]
+            while path[-1] != end_point:
+                path.append(pointers[path[-1]][1])
+            return path
+
+        return (
+            num_paths[in_point],
+            (shortest[in_point][0], build_path(shortest)),
+            (longest[in_point][0], build_path(longest)),
+        )
+
     @staticmethod
     def calculate_branch_buffering(graph):
         branch_buffering = {}
@@ -110,58 +164,35 @@ class PartitionComposer(BaseLayer3D):
             return branch_buffering
         unconnected_branches = {}
         for (in_point, end_point) in branch_edges:
-            num_paths = len(
-                list(nx.all_simple_paths(graph, source=in_point, target=end_point))
+            (
+                num_paths,
+                (shortest_depth, shortest_path),
+                (longest_depth, longest_path),
+            ) = PartitionComposer.get_branch_paths(graph, in_point, end_point)
+            final_depth = (
+                min(
+                    abs(longest_depth - shortest_depth),
+                    np.prod(graph.nodes[end_point]["hw"].input_shape),
+                )
+                + 2
             )
-            paths = []
-            depths = []
-            for path in nx.all_simple_paths(graph, source=in_point, target=end_point):
-                depth_branch = 0
-                split_node = path[0]
-                merge_node = path[-1]
-                assert (
-                    in_point == split_node and end_point == merge_node
-                ), "Branch edges are wrongly defined"
-                for p in path[1:-1]:
-                    depth_branch += graph.nodes[p]["hw"].depth
-                depths.append(depth_branch)
-                paths.append(path)
 
             if num_paths > 2:
-                longest_idx = np.argmax(depths)
-                shortest_idx = np.argmin(depths)
-                final_depth = (
-                    min(
-                        abs(depths[longest_idx] - depths[shortest_idx]),
-                        np.product(graph.nodes[end_point]["hw"].input_shape),
-                    )
-                    + 2
-                )
-                branch_buffering[f"{in_point}_{end_point}"] = {"start": in_point, "end": end_point, "conn": paths[shortest_idx][-2], "depth": int(final_depth)}
+                branch_buffering[f"{in_point}_{end_point}"] = {"start": in_point, "end": end_point, "conn": shortest_path[-2], "depth": int(final_depth)}
             elif num_paths == 2:
-                longest_idx = np.argmax(depths)
-                shortest_idx = np.argmin(depths)
-                final_depth = (
-                    min(
-                        abs(depths[longest_idx] - depths[shortest_idx]),
-                        np.product(graph.nodes[end_point]["hw"].input_shape),
-                    )
-                    + 2
-                )
-                assert paths[0][-1] == paths[1][-1], "Paths should end at the same node"
-                if paths[0][0] == paths[1][0] and 'Mem_in' not in paths[0][0]:
-                    branch_buffering[f"{in_point}_{end_point}"] = {"start": in_point, "end": end_point, "conn": paths[shortest_idx][-2], "depth": int(final_depth)}
+                if 'Mem_in' not in in_point:
+                    branch_buffering[f"{in_point}_{end_point}"] = {"start": in_point, "end": end_point, "conn": shortest_path[-2], "depth": int(final_depth)}
                 else:
-                    unconnected_branches[f"{in_point}_{end_point}"] = {"start": in_point, "end": end_point, "conn": paths[longest_idx][-2], "depth": depths[longest_idx], "path": paths[longest_idx]}
+                    unconnected_branches[f"{in_point}_{end_point}"] = {"start": in_point, "end": end_point, "conn": longest_path[-2], "depth": longest_depth, "path": longest_path}
             else:
                 final_depth = (
                     min(
-                        abs(depths[0]),
-                        np.product(graph.nodes[end_point]["hw"].input_shape),
+                        abs(longest_depth),
+                        np.prod(graph.nodes[end_point]["hw"].input_shape),
                     )
                     + 2
                 )
-                unconnected_branches[f"{in_point}_{end_point}"] = {"start": in_point, "end": end_point, "conn": paths[0][-2], "depth": final_depth, "path": paths[0]}
+                unconnected_branches[f"{in_point}_{end_point}"] = {"start": in_point, "end": end_point, "conn": longest_path[-2], "depth": final_depth, "path": longest_path}
 
         if unconnected_branches:
             remove_keys = []
@@ -216,6 +247,8 @@ class PartitionComposer(BaseLayer3D):
         gap_approx=False,
         branch_mem=0,
         wr_factor: int = 1,
+        mem_bw_weights: dict = None,
+        word_lengths: dict = None,
     ):
         assert len(mem_bw_in) == len(
             read_mem_points
@@ -225,15 +258,27 @@ class PartitionComposer(BaseLayer3D):
         ), "Output memory break points and memory configuration does not match."
 
         assert wr_factor >= 1, "Weights reloading factor must be at least 1."
+        if mem_bw_weights is None:
+            mem_bw_weights = {}
+        if word_lengths is None:
+            word_lengths = {}
 
         self.update_layer()
 
+        # Every layer works with its own (activations, weights) precision, the one of the platform unless given otherwise
+        for node in graph.nodes:
+            if graph.nodes[node]["type"] not in ("mem_in", "mem_out"):
+                graph.nodes[node]["hw"].set_word_length(
+                    *word_lengths.get(node, (self.word_length, self.word_length))
+                )
+
+        # The memory bandwidth shares are converted to words per cycle with the precision of the layer each port is connected to
         off_chip_mem_in = deque()
         off_chip_mem_out = deque()
         for i in range(len(mem_bw_in)):
-            off_chip_mem_in.appendleft(mem_bw_in[i] * self.mem_words_per_cycle)
+            off_chip_mem_in.appendleft(mem_bw_in[i])
         for i in range(len(mem_bw_out)):
-            off_chip_mem_out.appendleft(mem_bw_out[i] * self.mem_words_per_cycle)
+            off_chip_mem_out.appendleft(mem_bw_out[i])
 
         num_layers = graph.number_of_nodes()
 
@@ -256,15 +301,19 @@ class PartitionComposer(BaseLayer3D):
 
         total_muls = 0
         total_adds = 0
+        total_dsps = 0
 
         layer_fifos_arrays = {
             "branch_buffering": 0,
+            "mem_arrays": [],
         }
 
         total_depth = 0
         total_brams = 0
         config = {}
         layers_ii = []
+        layers_info = {}
+        wr_scale = 1
         for n, node in enumerate(nx.topological_sort(graph)):
             if DEBUG:
                 print("*" * 50)
@@ -278,7 +327,10 @@ class PartitionComposer(BaseLayer3D):
                 assert (
                     node not in comb.keys()
                 ), f"Memory IN node: {node} cannot have configuration."
-                gamma_matrix[n, n] = off_chip_mem_in.pop()
+                gamma_matrix[n, n] = (
+                    off_chip_mem_in.pop()
+                    * graph.nodes[list(graph.successors(node))[0]]["hw"].mem_words_per_cycle
+                )
                 graph.nodes[node]["prod_rate"] = gamma_matrix[n, n]
                 continue
 
@@ -286,7 +338,10 @@ class PartitionComposer(BaseLayer3D):
                 assert (
                     node not in comb.keys()
                 ), f"Memory OUT node: {node} cannot have configuration."
-                gamma_matrix[graph_idx[node_predecessors[0]], n] = -off_chip_mem_out.pop()
+                gamma_matrix[graph_idx[node_predecessors[0]], n] = (
+                    -off_chip_mem_out.pop()
+                    * graph.nodes[node_predecessors[0]]["hw"].mem_words_per_cycle
+                )
                 curr_layer_rate = gamma_matrix[graph_idx[node_predecessors[0]], n]
                 graph.nodes[node]["cons_rate"] = gamma_matrix[graph_idx[node_predecessors[0]], n]
                 continue
@@ -331,6 +386,8 @@ class PartitionComposer(BaseLayer3D):
                     mem_bw_in=curr_layer_rate,
                     mem_bw_out=curr_layer_rate,
                     ignore_bw_util=True,
+                    stream_weights=len(c) > 3 and bool(c[3]),
+                    double_buffer_weights=len(c) > 4 and bool(c[4]),
                 )
                 config[node] = utils.generate_layer_config(hw, c, wr_factor=wr_factor)
             elif isinstance(hw, Pooling3DLayer):
@@ -418,7 +475,7 @@ class PartitionComposer(BaseLayer3D):
                         mem_kb = (dp_info["memWords"] * self.word_bytes) / 1e3
                         mem_bram = math.ceil(mem_kb / self.bram_Kbytes)
                         curr_bram_util = (mem_bram / self.bram) * 100
-                        curr_dsps_util = (dp_info["muls"] / self.dsp) * 100
+                        curr_dsps_util = (dp_info["DSP_RAW"] / self.dsp) * 100
                         print(
                             f"{node}: Discarding design point. DSPS={curr_dsps_util}, BRAM={curr_bram_util}"
                         )
@@ -469,7 +526,7 @@ class PartitionComposer(BaseLayer3D):
                         mem_kb = (dp_info["memWords"] * self.word_bytes) / 1e3
                         mem_bram = math.ceil(mem_kb / self.bram_Kbytes)
                         curr_bram_util = (mem_bram / self.bram) * 100
-                        curr_dsps_util = (dp_info["muls"] / self.dsp) * 100
+                        curr_dsps_util = (dp_info["DSP_RAW"] / self.dsp) * 100
                         print(
                             f"{node}: Discarding design point. DSPS={curr_dsps_util}, BRAM={curr_bram_util}"
                         )
@@ -497,6 +554,21 @@ class PartitionComposer(BaseLayer3D):
                     dp_info["memBoundedIn"][0],
                     dp_info["memBoundedOut"][0],
                 )
+                if isinstance(hw, Convolutional3DLayer) and dp_info["rateWeights"] > 0:
+                    # The streamed weights share the off-chip memory bandwidth with the feature map ports. If their share cannot sustain the rate of the layer, the layer is slowed down accordingly
+                    weights_bw = (
+                        mem_bw_weights.get(node, 0)
+                        * (self.mem_bandwidth / hw.weights_word_length)
+                        / self.cycles_per_sec
+                    )
+                    if weights_bw == 0:
+                        self.update_layer()
+                        return self.get_dp_info()
+                    throttle = dp_info["rateWeights"] / weights_bw
+                    if throttle > 1:
+                        latency_cycles = (latency_cycles - depth) * throttle + depth
+                        full_rate_in /= throttle
+                        full_rate_out /= throttle
                 cp = graph_idx[node_predecessors[0]]
                 gamma_matrix[cp, n] = -full_rate_in
                 gamma_matrix[n, n] = full_rate_out
@@ -505,16 +577,52 @@ class PartitionComposer(BaseLayer3D):
 
             layers_ii.append(latency_cycles - depth)
 
+            # Per volume figures of the layer. With weights reloading the whole partition is streamed wr_factor times, while only the layers from the reloaded Conv onwards produce new results on each pass
+            if wr_factor > 1 and isinstance(hw, Convolutional3DLayer):
+                wr_scale = wr_factor
+            layers_info[node] = {
+                "type": op_type,
+                "II": int(latency_cycles - depth),
+                "depth": int(depth),
+                "DSPs": int(dp_info["DSP_RAW"]),
+                "muls": int(muls),
+                "ops": int(hw.get_total_workload() * wr_scale),
+                "wordsIn": int(
+                    sum(
+                        np.prod(np.array(graph.nodes[pn]["hw"].output_shape[1:]))
+                        for pn in node_predecessors
+                    )
+                    * wr_factor
+                ),
+                "wordsOut": int(np.prod(np.array(hw.output_shape[1:])) * wr_factor),
+                "wordsWeights": int(
+                    np.prod(np.array([hw.filters, hw.channels // hw.groups] + hw.kernel_shape))
+                    if isinstance(hw, Convolutional3DLayer)
+                    else 0
+                ),
+                "wordBytes": hw.word_bytes,
+                "weightsWordBytes": hw.weights_word_length / 8,
+                "offChip": any(
+                    graph.nodes[nn]["type"] in ("mem_in", "mem_out")
+                    for nn in node_predecessors + list(graph.successors(node))
+                ),
+                "memBounded": bool(
+                    np.any(dp_info["memBoundedIn"]) or np.any(dp_info["memBoundedOut"])
+                ),
+            }
+
             total_muls += muls
             total_adds += adds
+            total_dsps += dp_info["DSP_RAW"]
             total_brams += bram_raw
+            layer_fifos_arrays["mem_arrays"] += [dict(array) for array in hw.mem_arrays]
             total_depth += depth
             curr_bram_util = (total_brams / self.bram) * 100
-            curr_dsps_util = (total_muls / self.dsp) * 100
+            curr_dsps_util = (total_dsps / self.dsp) * 100
 
             if DEBUG:
                 print(
-                    f"{node} - Latency(C)={latency_cycles}, Latency(C)-Depth={latency_cycles-depth}, DSPs={muls}, BRAM={bram_raw}, Depth={depth}, Total Depth={total_depth}, Total DSPs={total_muls}, Total BRAM={total_brams}, BRAM Util={curr_bram_util}, DSP Util={curr_dsps_util}"
+                    f"{node} - Latency(C)={latency_cycles}, Latency(C)-Depth={latency_cycles-depth}, DSPs={muls}, BRAM={bram_raw}, Depth={depth}, Total Depth={total_depth}, Total DSPs={total_dsps}, Total BRAM={total_brams}, BRAM Util={curr_bram_util}, DSP Util={curr_dsps_util}"
                 )
 
             # if (
@@ -569,7 +677,12 @@ class PartitionComposer(BaseLayer3D):
                     mem_bounded_in.append(False)
                     gamma_matrix_balanced[n, n] = abs(gamma_matrix_balanced[n, nn])
                 rates_in.append(gamma_matrix_balanced[n, n])
-                shapes_in.append(graph.nodes[node]["hw"].output_shape)
+                shapes_in.append(
+                    (
+                        graph.nodes[node]["hw"].output_shape,
+                        graph.nodes[list(graph.successors(node))[0]]["hw"].word_bytes,
+                    )
+                )
                 mem_conns_in.append([n, n])
             if graph.nodes[node]["type"] == "mem_out":
                 pn = graph_idx[list(graph.predecessors(node))[0]]
@@ -586,7 +699,12 @@ class PartitionComposer(BaseLayer3D):
                     mem_bounded_out.append(False)
                     gamma_matrix_balanced[pn, n] = -gamma_matrix_balanced[pn, pn]
                 rates_out.append(abs(gamma_matrix_balanced[pn, n]))
-                shapes_out.append(graph.nodes[node]["hw"].input_shape)
+                shapes_out.append(
+                    (
+                        graph.nodes[node]["hw"].input_shape,
+                        graph.nodes[list(graph.predecessors(node))[0]]["hw"].word_bytes,
+                    )
+                )
                 mem_conns_out.append([pn, n])
 
         if DEBUG:
@@ -598,7 +716,8 @@ class PartitionComposer(BaseLayer3D):
         if DEBUG:
             print("II:\n{}".format(ii_matrix))
 
-        batch_size = 1
+        batch_size = self.batch_size
+        reload_cycles, double_buffer = self.get_wr_reload(graph, wr_factor)
         (
             latency_sec,
             latency_cycles,
@@ -609,12 +728,14 @@ class PartitionComposer(BaseLayer3D):
             bram_util,
             bram_raw,
             memKBs,
+            uram_util,
+            uram_raw,
         ) = self.get_performance(
             workload_matrix,
             ii_matrix,
             mem_conns_in,
             mem_conns_out,
-            total_muls,
+            total_dsps,
             total_adds,
             layer_fifos_arrays,
             total_brams,
@@ -624,6 +745,8 @@ class PartitionComposer(BaseLayer3D):
             batch=batch_size,
             per_layer_ii=layers_ii,
             wr_factor=wr_factor,
+            reload_cycles=reload_cycles,
+            double_buffer=double_buffer,
         )
         slowest_nodes_idxs = np.array(layers_ii).argsort()[::-1][:n].tolist()[:3]
         slowest_nodes_names = [graph_layers[n] for n in slowest_nodes_idxs[:3]]
@@ -653,12 +776,18 @@ class PartitionComposer(BaseLayer3D):
             self.branch_depth = layer_fifos_arrays["branch_buffering"]
             self.mem_bd_in = mem_bounded_in
             self.mem_bd_out = mem_bounded_out
-            self.data_size_in = sum(map(lambda x: np.prod(np.array(x[1:])), shapes_in))
+            self.data_size_in = sum(
+                map(lambda x: np.prod(np.array(x[0][1:])) * x[1], shapes_in)
+            )
             self.data_size_out = sum(
-                map(lambda x: np.prod(np.array(x[1:])), shapes_out)
+                map(lambda x: np.prod(np.array(x[0][1:])) * x[1], shapes_out)
             )
 
             self.total_ops = total_ops
+            self.wr_factor = wr_factor
+            self.wr_reload_cycles = reload_cycles
+            self.wr_double_buffer = double_buffer
+            self.layers_info = layers_info
             self.config = config
             self.structure = graph_manipulation.get_graph_structure(graph, config)
             self.memoryKB = memKBs
@@ -666,6 +795,8 @@ class PartitionComposer(BaseLayer3D):
             self.dsps_raw = dsps_raw
             self.bram_util = bram_util
             self.bram_raw = bram_raw
+            self.uram_util = uram_util
+            self.uram_raw = uram_raw
             self.latency_sec = latency_sec
             self.latency_cycles = int(latency_cycles)
             self.throughput_ops = throughput_ops
@@ -726,13 +857,31 @@ class PartitionComposer(BaseLayer3D):
 
         return workload_matrix
 
+    def get_wr_reload(self, graph, wr_factor):
+        """
+        Cycles needed to reload a tile of the weights of the partition and
+        whether the reloaded weights are double buffered.
+        """
+        if wr_factor <= 1:
+            return 0, False
+        conv_nodes_count = 0
+        for node in nx.topological_sort(graph):
+            hw = graph.nodes[node]["hw"]
+            if isinstance(hw, Convolutional3DLayer):
+                wr_kernel_shape = [hw.filters, hw.channels] + hw.kernel_shape
+                double_buffer = hw.double_buffer_weights
+                conv_nodes_count += 1
+        if conv_nodes_count > 1:
+            _logger.warning(f"Partition with weights reloading having more than 1 Conv layers. Currently {conv_nodes_count}.")
+        return int(np.prod(np.array(wr_kernel_shape))), double_buffer
+
     def get_performance(
         self,
         workload_matrix,
         ii,
         mem_conns_in,
         mem_conns_out,
-        muls,
+        dsps,
         adds,
         layer_fifos_arrays,
         layer_brams,
@@ -741,41 +890,53 @@ class PartitionComposer(BaseLayer3D):
         config,
         batch=1,
         per_layer_ii=None,
-        wr_factor=1
+        wr_factor=1,
+        reload_cycles=0,
+        double_buffer=False,
     ):
-        if wr_factor > 1:
-            conv_nodes_count = 0
-            for n, node in enumerate(nx.topological_sort(graph)):
-                hw = graph.nodes[node]["hw"]
-                if isinstance(hw, Convolutional3DLayer):
-                    wr_kernel_shape = [hw.filters, hw.channels] + hw.kernel_shape
-                    conv_nodes_count += 1
-            if conv_nodes_count > 1:
-                _logger.warning(f"Partition with weights reloading having more than 1 Conv layers. Currently {conv_nodes_count}.")
-        else:
-            wr_kernel_shape = [1, 1, 1, 1, 1]
-
         mem_kb_total = 0
         bram_raw_out = layer_brams
+        mem_arrays = layer_fifos_arrays.get("mem_arrays", [])
 
         if "branch_buffering" in layer_fifos_arrays:
             for _, v in layer_fifos_arrays["branch_buffering"].items():
                 merge_node = v["end"]
                 curr_depth = v["depth"]
+                branch_word_length = graph.nodes[merge_node]["hw"].word_length
                 # depth_per_fifo = math.ceil(curr_depth/config[merge_node]['coarse_factor'])
-                bram_raw_out += (
-                    self.bram_stream_resource_model(curr_depth, self.word_length)
+                branch_brams = (
+                    self.bram_stream_resource_model(curr_depth, branch_word_length)
                     * config[merge_node]["coarse_factor"]
                 )
+                bram_raw_out += branch_brams
+                if branch_brams > 0:
+                    mem_arrays.append(
+                        self.get_mem_array(
+                            curr_depth,
+                            branch_word_length,
+                            config[merge_node]["coarse_factor"],
+                            branch_brams,
+                        )
+                    )
+
+        # The weights arrays of all the layers and the branch buffers compete for the URAMs of the device
+        bram_raw_out, uram_raw_out = self.allocate_uram(bram_raw_out, mem_arrays)
 
         bram_util = (bram_raw_out / self.bram) * 100
-        dsps_util = (muls / self.dsp) * 100
-        dsps_raw_out = muls
+        uram_util = (uram_raw_out / self.uram) * 100 if self.uram > 0 else 0
+        dsps_util = (dsps / self.dsp) * 100
+        dsps_raw_out = dsps
 
         if per_layer_ii is not None:
-            latency_cycles = int(max(per_layer_ii)) * batch + depth * wr_factor + (wr_factor - 1) * np.prod(np.array(wr_kernel_shape))
+            pass_cycles = int(max(per_layer_ii)) * batch + depth
         else:
-            latency_cycles = int(np.max(np.abs(ii))) * batch + depth * wr_factor + (wr_factor - 1) * np.prod(np.array(wr_kernel_shape))
+            pass_cycles = int(np.max(np.abs(ii))) * batch + depth
+        latency_cycles = self.get_wr_latency(
+            pass_cycles,
+            wr_factor,
+            reload_cycles,
+            double_buffer=double_buffer,
+        )
         latency_sec = latency_cycles / self.cycles_per_sec
         if DEBUG:
             print(
@@ -806,4 +967,6 @@ class PartitionComposer(BaseLayer3D):
             bram_util,
             bram_raw_out,
             mem_kb_total,
+            uram_util,
+            uram_raw_out,
         )
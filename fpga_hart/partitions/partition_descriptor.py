@@ -1,5 +1,6 @@
+import json
 import os
-from collections import Counter, deque
+from collections import Counter
 
 import networkx as nx
 import scienceplots
@@ -13,192 +14,80 @@ from fpga_hart.utils.graph_manipulation import (get_nodes_sorted,
 
 plt.style.use(["science", "ieee", "grid"])
 
+def get_layer_segments(layers: dict) -> list:
+    """
+    Splits the layers, in topological order, at every point where the output of the last layer is the only feature map that the rest of the graph still needs, i.e. where the graph can be cut with a single off-chip transfer. A segment of more than one layer holds branches that merge inside it, such as a residual block. Runs in linear time over the layers and their connections.
+    """
+    names = list(layers)
+    producer = {layers[name]["node_out"]: i for i, name in enumerate(names)}
+    last_use = list(range(len(names)))
+    for i, name in enumerate(names):
+        for node_in in layers[name]["node_in"]:
+            if node_in in producer:
+                last_use[producer[node_in]] = max(last_use[producer[node_in]], i)
+
+    segments = []
+    start = 0
+    live_until = -1
+    for i in range(len(names)):
+        if live_until <= i:
+            segments.append(names[start : i + 1])
+            start = i + 1
+        live_until = max(live_until, last_use[i])
+    if start < len(names):
+        segments.append(names[start:])
+    return segments
+
+
 def create_partitions(self, layers: dict) -> list:
+    """
+    Discovers the candidate partitions of any model from the structure of its graph. Every segment with branches (e.g. a residual block) closes a partition together with the sequential layers that precede it, and the sequential layers after the last one form the final partition, so that a model without branches is kept as a single partition.
+    """
     final_layers = []
+    partition = []
+    for segment in get_layer_segments(layers):
+        partition += segment
+        if len(segment) > 1:
+            final_layers.append(partition)
+            partition = []
+    if partition:
+        final_layers.append(partition)
+    _logger.info(f"Found {len(final_layers)} partitions in {len(layers)} layers")
+    return final_layers
+
+
+def get_partition_signature(self, partition: list) -> str:
+    """
+    Hash of a partition that holds the operation, the shapes and the parameters of its layers along with their connections inside the partition, so that repetitions of the same block get the same signature regardless of the names of their layers.
+    """
+    position = {self.layers[layer]["node_out"]: i for i, layer in enumerate(partition)}
+    signature = []
+    for layer in partition:
+        description = self.layers[layer]
+        signature.append(
+            [description["operation"], description["shape_in"], description["shape_out"], description["branching"]]
+            + [description.get(key) for key in ["kernel", "bias", "padding", "stride", "groups", "dilation"]]
+            + [[position.get(node_in, -1) for node_in in description["node_in"]]]
+        )
+    return json.dumps(signature)
+
 
-    if self.model_name == "x3d_m":
-        if not self.se_block:
-            layer_type_1 = [
-                "Relu",
-                "Conv",
-                "Relu",
-                "Conv",
-                "GlobalAveragePool",
-                "Conv",
-                "Relu",
-                "Conv",
-                "Sigmoid",
-                "Mul",
-                "Swish",
-                "Conv",
-                "Conv",
-                "Add",
-            ]
-            layer_type_2 = [
-                "Relu",
-                "Conv",
-                "Relu",
-                "Conv",
-                "GlobalAveragePool",
-                "Conv",
-                "Relu",
-                "Conv",
-                "Sigmoid",
-                "Mul",
-                "Swish",
-                "Conv",
-                "Add",
-            ]
-            layer_type_3 = ["Relu", "Conv", "Relu", "Conv", "Swish", "Conv", "Add"]
-            layer_type_4 = [
-                "Conv",
-                "Conv",
-                "Relu",
-                "Conv",
-                "Relu",
-                "Conv",
-                "GlobalAveragePool",
-                "Conv",
-                "Relu",
-                "Conv",
-                "Sigmoid",
-                "Mul",
-                "Swish",
-                "Conv",
-                "Conv",
-                "Add",
-            ]
-            layer_type_5 = [
-                "Relu",
-                "Conv",
-                "Relu",
-                "GlobalAveragePool",
-                "Gemm",
-                "Relu",
-                "Gemm",
-            ]
-            layer_queue = deque(maxlen=16)
-            layer_queue_operations = deque(maxlen=16)
-            for k in layers.keys():
-                layer_queue_operations.append(layers[k]["operation"])
-                layer_queue.append(k)
-                if list(layer_queue_operations) == layer_type_4:
-                    final_layers.append(list(layer_queue))
-                elif list(layer_queue_operations)[2:] == layer_type_1:
-                    final_layers.append(list(layer_queue)[2:])
-                elif list(layer_queue_operations)[3:] == layer_type_2:
-                    final_layers.append(list(layer_queue)[3:])
-                elif list(layer_queue_operations)[9:] == layer_type_3:
-                    final_layers.append(list(layer_queue)[9:])
-                elif list(layer_queue_operations)[9:] == layer_type_5:
-                    final_layers.append(list(layer_queue)[9:])
+def get_repeated_partitions(self, partitions: list) -> dict:
+    """
+    Groups the partitions with the same signature, so that every distinct block is optimized once.
+    Returns the index of the first occurrence of every distinct partition along with the indices of its repetitions.
+    """
+    first_occurrence = {}
+    repeated = {}
+    for i, partition in enumerate(partitions):
+        signature = self.get_partition_signature(partition)
+        if signature in first_occurrence:
+            repeated[first_occurrence[signature]].append(i)
         else:
-            layer_type_1 = [
-                "Relu",
-                "Conv",
-                "Relu",
-                "Conv",
-                "SqueezeExcitation",
-                "Swish",
-                "Conv",
-                "Conv",
-                "Add",
-            ]
-            layer_type_2 = [
-                "Relu",
-                "Conv",
-                "Relu",
-                "Conv",
-                "SqueezeExcitation",
-                "Swish",
-                "Conv",
-                "Add",
-            ]
-            layer_type_3 = ["Relu", "Conv", "Relu", "Conv", "Swish", "Conv", "Add"]
-            layer_type_4 = ["Conv", "Conv"]
-            layer_type_5 = [
-                "Relu",
-                "Conv",
-                "Relu",
-                "GlobalAveragePool",
-                "Gemm",
-                "Relu",
-                "Gemm",
-            ]
-            layer_queue = deque(maxlen=9)
-            layer_queue_operations = deque(maxlen=9)
-            for k in layers.keys():
-                layer_queue_operations.append(layers[k]["operation"])
-                layer_queue.append(k)
-                if list(layer_queue_operations) == layer_type_1:
-                    final_layers.append(list(layer_queue))
-                if list(layer_queue_operations)[:-1] == layer_type_2:
-                    final_layers.append(list(layer_queue)[:-1])
-                if list(layer_queue_operations)[:-2] == layer_type_3:
-                    final_layers.append(list(layer_queue)[:-2])
-                if (
-                    list(layer_queue_operations)[:-7] == layer_type_4
-                    and "Conv_0" in list(layer_queue)[:-7]
-                ):
-                    final_layers.append(list(layer_queue)[:-7])
-                if list(layer_queue_operations)[2:] == layer_type_5:
-                    final_layers.append(list(layer_queue)[2:])
-        return final_layers
-    elif self.model_name == "i3d":
-        layer_type_1 = ["Conv", "Relu", "Conv", "Relu", "Conv", "Conv", "Add"]
-        layer_type_2 = ["Relu", "Conv", "Relu", "Conv", "Relu", "Conv", "Add"]
-        layer_queue = deque(maxlen=7)
-        layer_queue_operations = deque(maxlen=7)
-        for k in layers.keys():
-            layer_queue_operations.append(layers[k]["operation"])
-            layer_queue.append(k)
-            if list(layer_queue_operations) == layer_type_1:
-                final_layers.append(list(layer_queue))
-            if list(layer_queue_operations) == layer_type_2:
-                final_layers.append(list(layer_queue))
-        return final_layers
-    elif self.model_name == "c3d":
-        layers_list = list(layers.keys())
-        final_layers.append(layers_list)
-        return final_layers
-    elif "r2plus1d" in self.model_name:
-        layer_type_1 = ["Conv", "Relu", "Conv", "Relu", "MaxPool", "Conv", "Relu", "Conv", "Relu", "Conv", "Relu", "Conv", "Add"]
-        layer_type_2 = ["Relu", "Conv", "Relu", "Conv", "Relu", "Conv", "Relu", "Conv", "Add"]
-        layer_type_3 = ["Relu", "Conv", "Relu", "Conv", "Relu", "Conv", "Relu", "Conv", "Conv", "Add"]
-        layer_type_4 = ["Relu", "GlobalAveragePool", "Gemm"]
-        layer_queue = deque(maxlen=13)
-        layer_queue_operations = deque(maxlen=13)
-        for k in layers.keys():
-            layer_queue_operations.append(layers[k]["operation"])
-            layer_queue.append(k)
-            if list(layer_queue_operations) == layer_type_1:
-                final_layers.append(list(layer_queue))
-            elif list(layer_queue_operations)[4:] == layer_type_2:
-                final_layers.append(list(layer_queue)[4:])
-            elif list(layer_queue_operations)[3:] == layer_type_3:
-                final_layers.append(list(layer_queue)[3:])
-            elif list(layer_queue_operations)[10:] == layer_type_4:
-                final_layers.append(list(layer_queue)[10:])
-        return final_layers
-    elif self.model_name == "slowonly":
-        layer_type_1 = ["Conv", "Relu", "MaxPool", "Conv", "Relu", "Conv", "Relu", "Conv", "Conv", "Add"]
-        layer_type_2 = ["Relu", "Conv", "Relu", "Conv", "Relu", "Conv", "Add"]
-        layer_type_3 = ["Relu", "Conv", "Relu", "Conv", "Relu", "Conv", "Conv", "Add"]
-        layer_type_4 = ["Relu", "GlobalAveragePool", "Gemm"]
-        layer_queue = deque(maxlen=10)
-        layer_queue_operations = deque(maxlen=10)
-        for k in layers.keys():
-            layer_queue_operations.append(layers[k]["operation"])
-            layer_queue.append(k)
-            if list(layer_queue_operations) == layer_type_1:
-                final_layers.append(list(layer_queue))
-            elif list(layer_queue_operations)[3:] == layer_type_2:
-                final_layers.append(list(layer_queue)[3:])
-            elif list(layer_queue_operations)[2:] == layer_type_3:
-                final_layers.append(list(layer_queue)[2:])
-            elif list(layer_queue_operations)[7:] == layer_type_4:
-                final_layers.append(list(layer_queue)[7:])
-        return final_layers
+            first_occurrence[signature] = i
+            repeated[i] = []
+    _logger.info(f"Found {len(repeated)} distinct partitions out of {len(partitions)}")
+    return repeated
 
 def update_hw_pe(self, graph: nx.DiGraph, groupping: int = 1) -> None:
     nodes = get_nodes_sorted(graph)
@@ -320,3 +209,32 @@ def latency_driven_design(
         enable_wandb=self.enable_wandb,
     )
     optimizer.run_solver(mode="latency", alignedfactors=self.config.alignedfactors)
+
+def multi_model_latency_driven_design(partition_parsers: list, request_mix: list) -> None:
+    """
+    Try to find a single set of hardware building blocks, and their configuration, that serves several models from the same bitstream.
+    The graphs of the models are merged, with their nodes prefixed by the model name, so that the building blocks are generated over the layers of all of them, and the optimizer minimizes the latency of the models weighted by their share of the request mix.
+    """
+    assert len(partition_parsers) == len(request_mix), "Every model needs its share of the requests"
+    assert sum(request_mix) > 0, "The request mix is empty"
+    model_names = [parser.model_name for parser in partition_parsers]
+    assert len(set(model_names)) == len(model_names), "Duplicate models in the request mix"
+
+    graphs = []
+    model_weights = {}
+    for parser, weight in zip(partition_parsers, request_mix):
+        graph = parser.create_graph(list(parser.layers))
+        nx.set_node_attributes(graph, parser.model_name, "model")
+        graphs.append(graph)
+        model_weights[parser.model_name] = weight / sum(request_mix)
+    graph = nx.union_all(graphs, rename=[f"{model_name}/" for model_name in model_names])
+
+    optimizer = SimulatedAnnealing(
+        graph,
+        config=partition_parsers[0].config,
+        platform=partition_parsers[0].platform,
+        cnn_model_name="+".join(model_names),
+        enable_wandb=partition_parsers[0].enable_wandb,
+        model_weights=model_weights,
+    )
+    optimizer.run_solver(mode="latency", alignedfactors=partition_parsers[0].config.alignedfactors)
@@ -23,6 +23,7 @@ from fpga_hart.layers.pooling_3d import Pooling3DLayer
 from fpga_hart.layers.squeeze_excitation import SqueezeExcitationLayer
 from fpga_hart.optimizer.simulated_annealing.sa import SimulatedAnnealing
 from fpga_hart.parser.model_descriptor import ModelLayerDescriptor
+from fpga_hart.partitions import roofline
 from fpga_hart.platform.platform import Platform
 from fpga_hart.utils import utils
 from fpga_hart.utils.graph_manipulation import visualize_graph
@@ -39,7 +40,12 @@ class PartitionParser(ModelLayerDescriptor):
     config: DotMap
     enable_wandb: bool
 
-    from fpga_hart.partitions.partition_descriptor import create_partitions
+    from fpga_hart.partitions.partition_descriptor import (
+        create_partitions,
+        get_partition_signature,
+        get_repeated_partitions,
+        latency_driven_design,
+    )
 
     def __post_init__(self) -> None:
         ModelLayerDescriptor.__post_init__(self)  # Initialize the parent class
@@ -53,6 +59,8 @@ class PartitionParser(ModelLayerDescriptor):
             "Times Repeated",
             "Num Splits",
             "Times Weights Reloading",
+            "Weights Reload(C)",
+            "Double Buffered Weights",
             "latency(C)",
             "latency(S)",
             "GOP/s",
@@ -62,14 +70,18 @@ class PartitionParser(ModelLayerDescriptor):
             "DSPs",
             "BRAM %",
             "BRAMs",
+            "URAM %",
+            "URAMs",
             "depth",
             "branch_depth",
             "dataSizeIn(MB)",
             "dataSizeOut(MB)",
+            "Device",
         ]
         self.df = pd.DataFrame(columns=columns)
 
         self.model_avg_metrics = {}
+        self.roofline = {}
 
         if not os.path.exists(
             os.path.join(os.getcwd(), "fpga_modeling_reports", self.model_name)
@@ -193,7 +205,9 @@ class PartitionParser(ModelLayerDescriptor):
                 new_groups = self.layers[layer]["groups"] // channels_reduction_rate
                 self.layers[layer]["groups"] = new_groups
 
-    def create_graph(self, partition: list) -> nx.DiGraph:
+    def create_graph(self, partition: list, platform: Platform = None) -> nx.DiGraph:
+        if platform is None:
+            platform = self.platform
         graph = nx.DiGraph()
         _logger.info("*" * 40)
         for layer in partition:
@@ -205,7 +219,7 @@ class PartitionParser(ModelLayerDescriptor):
                     self.config.max_dsp_util,
                     self.config.max_bram_util,
                     self.layers[layer],
-                    self.platform,
+                    platform,
                 )
                 layer_type = self.layers[layer]["operation"]
             elif self.layers[layer]["operation"] == "Conv":
@@ -213,7 +227,7 @@ class PartitionParser(ModelLayerDescriptor):
                     self.config.max_dsp_util,
                     self.config.max_bram_util,
                     self.layers[layer],
-                    self.platform,
+                    platform,
                 )
                 layer_type = self.layers[layer]["operation"]
             elif (
@@ -224,7 +238,7 @@ class PartitionParser(ModelLayerDescriptor):
                     self.config.max_dsp_util,
                     self.config.max_bram_util,
                     self.layers[layer],
-                    self.platform,
+                    platform,
                 )
                 layer_type = "Pooling"
             elif (
@@ -236,7 +250,7 @@ class PartitionParser(ModelLayerDescriptor):
                     self.config.max_dsp_util,
                     self.config.max_bram_util,
                     self.layers[layer],
-                    self.platform,
+                    platform,
                 )
                 layer_type = "Activation"
             elif (
@@ -247,7 +261,7 @@ class PartitionParser(ModelLayerDescriptor):
                     self.config.max_dsp_util,
                     self.config.max_bram_util,
                     self.layers[layer],
-                    self.platform,
+                    platform,
                 )
                 layer_type = "ElementWise"
             elif (
@@ -259,7 +273,7 @@ class PartitionParser(ModelLayerDescriptor):
                     self.config.max_dsp_util,
                     self.config.max_bram_util,
                     self.layers[layer],
-                    self.platform,
+                    platform,
                 )
             elif self.layers[layer]["operation"] == "SqueezeExcitation":
                 layer_type = self.layers[layer]["operation"]
@@ -267,7 +281,7 @@ class PartitionParser(ModelLayerDescriptor):
                     self.config.max_dsp_util,
                     self.config.max_bram_util,
                     self.layers[layer],
-                    self.platform,
+                    platform,
                 )
             elif self.layers[layer]["operation"] == "BatchNormalization":
                 layer_type = self.layers[layer]["operation"]
@@ -275,7 +289,7 @@ class PartitionParser(ModelLayerDescriptor):
                     self.config.max_dsp_util,
                     self.config.max_bram_util,
                     self.layers[layer],
-                    self.platform,
+                    platform,
                 )
             else:
                 assert False, "{} operation in layer {} is not supported".format(
@@ -328,8 +342,12 @@ class PartitionParser(ModelLayerDescriptor):
 
         return graph
 
-    def model_partition(self, partition: list, name: str) -> None:
-        graph = self.create_graph(partition)
+    def model_partition(
+        self, partition: list, name: str, platform: Platform = None
+    ) -> None:
+        if platform is None:
+            platform = self.platform
+        graph = self.create_graph(partition, platform)
 
         partition_graphs_path = os.path.join(
             os.getcwd(), "fpga_modeling_reports", self.model_name, "partition_graphs"
@@ -353,7 +371,7 @@ class PartitionParser(ModelLayerDescriptor):
         optimizer = SimulatedAnnealing(
             graph,
             config=self.config,
-            platform=self.platform,
+            platform=platform,
             partition_name=name,
             gap_approx=self.gap_approx,
             enable_wandb=self.enable_wandb,
@@ -392,6 +410,8 @@ class PartitionParser(ModelLayerDescriptor):
                 times_repeat,
                 extra_reconfig + 1,
                 wr,
+                partition_results["reloadCycles"],
+                partition_results["doubleBufferWeights"],
                 partition_results["latency(C)"],
                 partition_results["latency(S)"],
                 partition_results["GOP/s"],
@@ -401,11 +421,20 @@ class PartitionParser(ModelLayerDescriptor):
                 partition_results["DSP_RAW"],
                 partition_results["BRAM"],
                 partition_results["BRAM_RAW"],
+                partition_results["URAM"],
+                partition_results["URAM_RAW"],
                 partition_results["depth"],
                 json.dumps(partition_results["branch_depth"], indent=2),
                 partition_results["dataSizeIn"],
                 partition_results["dataSizeOut"],
+                platform.fpga_device,
             ]
+            self.roofline[part_name] = roofline.analyze_partition(
+                partition_results,
+                platform,
+                batch_size=self.config.batch_size,
+                times_repeated=times_repeat,
+            )
 
             report_dict = {}
             if self.enable_wandb:
@@ -414,6 +443,7 @@ class PartitionParser(ModelLayerDescriptor):
                     "Num Layers": num_layers,
                     "Num Splits": extra_reconfig + 1,
                     "Times Weights Reloading": wr,
+                    "Device": platform.fpga_device,
                     "config": partition_results["config"],
                     "structure": partition_results["structure"],
                 }
@@ -427,6 +457,9 @@ class PartitionParser(ModelLayerDescriptor):
                 "Num Layers": num_layers,
                 "Num Splits": extra_reconfig + 1,
                 "Times Weights Reloading": wr,
+                "Weights Reload(C)": partition_results["reloadCycles"],
+                "Double Buffered Weights": partition_results["doubleBufferWeights"],
+                "Device": platform.fpga_device,
                 "Latency(C)": partition_results["latency(C)"],
                 "Latency(S)": partition_results["latency(S)"],
                 "GOP/s": partition_results["GOP/s"],
@@ -436,6 +469,8 @@ class PartitionParser(ModelLayerDescriptor):
                 "DSPs": partition_results["DSP_RAW"],
                 "BRAM %": partition_results["BRAM"],
                 "BRAMs": partition_results["BRAM_RAW"],
+                "URAM %": partition_results["URAM"],
+                "URAMs": partition_results["URAM_RAW"],
                 "depth": partition_results["depth"],
                 "branch_depth": partition_results["branch_depth"],
                 "dataSizeIn(MB)": partition_results["dataSizeIn"],
@@ -446,6 +481,40 @@ class PartitionParser(ModelLayerDescriptor):
             utils.update_report_file(self.partition_model_file, report_dict)
         return extra_reconfig
 
+    def report_roofline(self, top_k: int = 10) -> None:
+        devices = {}
+        for specs in self.roofline.values():
+            if specs["Device"] not in devices:
+                devices[specs["Device"]] = roofline.get_platform_roofline(
+                    Platform(specs["Device"])
+                )
+        bottlenecks = roofline.get_bottleneck_report(self.roofline, top_k=top_k)
+        for node in bottlenecks[:3]:
+            _logger.info(
+                f"Bottleneck {node['node']} ({node['partition']}): {node['Bound']} bound, {node['latency share'] * 100:.2f}% of the total latency"
+            )
+
+        if self.enable_wandb:
+            wandb.log({"Bottlenecks": wandb.Table(dataframe=pd.DataFrame(bottlenecks))})
+        with open(
+            os.path.join(
+                os.getcwd(),
+                "fpga_modeling_reports",
+                self.model_name,
+                self.model_name + "_roofline.json",
+            ),
+            "w",
+        ) as json_file:
+            json.dump(
+                {
+                    "roofline": devices,
+                    "bottlenecks": bottlenecks,
+                    "partitions": self.roofline,
+                },
+                json_file,
+                indent=2,
+            )
+
     def idetify_sequential_duplicates(self):
         partitions = {}
         for i, partition in enumerate(self.partitions):
@@ -506,33 +575,18 @@ class PartitionParser(ModelLayerDescriptor):
         if os.path.exists(self.partition_model_file):
             os.remove(self.partition_model_file)
 
-        if False:
-            # TODO: Find a way to combine this with the partition split functionality
-            duplicates_dict = self.idetify_sequential_duplicates()
+        partition_repeats = self.get_repeated_partitions(self.partitions)
         num_dev_reconfig = len(self.partitions) - 1
         print("Initial number of device reconfigurations: {}".format(num_dev_reconfig))
 
         start = time.time()
 
-        if False:
-            # TODO: Find a way to combine this with the partition split functionality
-            name_offset = 0
-            for i, partition in enumerate(self.partitions):
-                part_name = "part_{}".format(i + name_offset)
-                if i + name_offset in duplicates_dict:
-                    part_name += "+"
-                    part_name += "+".join([
-                        str(x) for x in duplicates_dict[i + name_offset]
-                    ])
-                times_called = (
-                    1
-                    if i + name_offset not in duplicates_dict
-                    else 1 + len(duplicates_dict[i + name_offset])
-                )
-                name_offset += times_called - 1
-                num_dev_reconfig += self.model_partition(partition, name=part_name)
         for i, partition in enumerate(self.partitions):
-            part_name = "part_{}".format(i)
+            if i not in partition_repeats:
+                continue
+            part_name = "part_{}".format(i) + "".join(
+                "+{}".format(j) for j in partition_repeats[i]
+            )
             num_dev_reconfig += self.model_partition(partition, name=part_name)
 
         print("Final number of device reconfigurations: {}.".format(num_dev_reconfig))
@@ -567,12 +621,14 @@ class PartitionParser(ModelLayerDescriptor):
                 for file in os.listdir(log_results_path):
                     os.unlink(os.path.join(log_results_path, file))
 
-        batch_size = np.arange(1, 500, 1)
+        # The partition latencies and workloads are reported for the configured batch size
+        batch_size = np.arange(1, max(500, self.config.batch_size + 1), 1)
         lat_sec = (
             (
                 self.model_avg_metrics["latency(C) Sum"]
                 - self.model_avg_metrics["depth Sum"]
             )
+            / self.config.batch_size
             * batch_size
             + self.model_avg_metrics["depth Sum"]
         ) / (self.platform.clock_freq * 1e6) + (
@@ -586,7 +642,9 @@ class PartitionParser(ModelLayerDescriptor):
             wandb.log({"Latency vs Batch Size": plt})
         else:
             plt.savefig(os.path.join(log_results_path, "latency_vs_batch_size.png"))
-        through_gops_sec = (self.model_avg_metrics["GOPs Sum"] * batch_size) / lat_sec
+        through_gops_sec = (
+            self.model_avg_metrics["GOPs Sum"] / self.config.batch_size * batch_size
+        ) / lat_sec
         plt.cla()
         plt.clf()
         plt.plot(batch_size, through_gops_sec)
@@ -646,6 +704,7 @@ class PartitionParser(ModelLayerDescriptor):
             "Batch 30": lat_sec[29],
             "Batch 100": lat_sec[99],
             "Batch 250": lat_sec[249],
+            f"Batch {self.config.batch_size}": lat_sec[self.config.batch_size - 1],
         }
 
         self.model_avg_metrics["GOPs/s"] = {
@@ -653,24 +712,28 @@ class PartitionParser(ModelLayerDescriptor):
             "Batch 30": through_gops_sec[29],
             "Batch 100": through_gops_sec[99],
             "Batch 250": through_gops_sec[249],
+            f"Batch {self.config.batch_size}": through_gops_sec[self.config.batch_size - 1],
         }
         self.model_avg_metrics["Volumes/s"] = {
             "Batch 1": through_vols_sec[0],
             "Batch 30": through_vols_sec[29],
             "Batch 100": through_vols_sec[99],
             "Batch 250": through_vols_sec[249],
+            f"Batch {self.config.batch_size}": through_vols_sec[self.config.batch_size - 1],
         }
         self.model_avg_metrics["GOPs/s/DSP"] = {
             "Batch 1": gops_sec_dsp[0],
             "Batch 30": gops_sec_dsp[29],
             "Batch 100": gops_sec_dsp[99],
             "Batch 250": gops_sec_dsp[249],
+            f"Batch {self.config.batch_size}": gops_sec_dsp[self.config.batch_size - 1],
         }
         self.model_avg_metrics["GOPs/s/DSP/cycle"] = {
             "Batch 1": gops_sec_dsp_cycle[0],
             "Batch 30": gops_sec_dsp_cycle[29],
             "Batch 100": gops_sec_dsp_cycle[99],
             "Batch 250": gops_sec_dsp_cycle[249],
+            f"Batch {self.config.batch_size}": gops_sec_dsp_cycle[self.config.batch_size - 1],
         }
 
         del self.model_avg_metrics["latency(C)"]
@@ -689,6 +752,7 @@ class PartitionParser(ModelLayerDescriptor):
 
             with open(self.partition_model_file, "w") as json_file:
                 json.dump(dictObj, json_file, indent=2)
+        self.report_roofline()
         end = time.time()
         _logger.info("Partition modeling took {:.2f} seconds".format(end - start))
 
@@ -0,0 +1,134 @@
+import numpy as np
+
+from fpga_hart.platform.platform import Platform
+
+
+def get_platform_roofline(platform: Platform) -> dict:
+    """
+    Roofline of the device: every DSP performs one operation per cycle and the off-chip memory provides mem_bandwidth (bits/sec).
+    """
+    peak_ops = platform.dsp * platform.cycles_per_sec
+    bandwidth = platform.mem_bandwidth / 8
+    return {
+        "Device": platform.fpga_device,
+        "Peak GOP/s": peak_ops * 1e-9,
+        "Bandwidth GB/s": bandwidth * 1e-9,
+        "Ridge point(OP/B)": peak_ops / bandwidth,
+    }
+
+
+def get_bound(depth_share: float, intensity: float, ridge_point: float, mem_bounded: bool) -> str:
+    if depth_share >= 0.5:
+        return "depth"
+    if mem_bounded or intensity < ridge_point:
+        return "bandwidth"
+    return "compute"
+
+
+def analyze_partition(dp_info: dict, platform: Platform, batch_size: int = 1, times_repeated: int = 1, top_k: int = 3) -> dict:
+    """
+    Places a partition and each of its layers on the roofline of the platform and labels them as compute, bandwidth or pipeline depth bound.
+    The partition moves its input and output feature maps (once per weights reloading pass) and the reloaded weights through the off-chip memory.
+    The layers are placed with the feature maps they stream and the DSPs allocated to them, so that a layer whose intensity is below its own ridge point is bandwidth bound when it is fed by (or feeds) the off-chip memory.
+    """
+    roofline = get_platform_roofline(platform)
+    bandwidth = platform.mem_bandwidth / 8
+    wr_factor = dp_info["wr_factor"]
+    layers_info = dp_info["layersInfo"]
+
+    ops = dp_info["GOPs"] * 1e9
+    data_bytes = (
+        (dp_info["dataSizeIn"] + dp_info["dataSizeOut"]) * 1e6 * wr_factor * batch_size
+        + (wr_factor - 1)
+        * sum(
+            info["wordsWeights"] * info["weightsWordBytes"]
+            for info in layers_info.values()
+        )
+    )
+    intensity = ops / data_bytes if data_bytes > 0 else np.inf
+    attainable = min(roofline["Peak GOP/s"] * 1e9, intensity * bandwidth)
+    depth_share = dp_info["depth"] * wr_factor / dp_info["latency(C)"]
+    partition_ii = max(info["II"] for info in layers_info.values())
+
+    layers = {}
+    for node, info in layers_info.items():
+        layer_ops = info["ops"] * batch_size
+        layer_bytes = (
+            (info["wordsIn"] + info["wordsOut"]) * info["wordBytes"] * batch_size
+        )
+        layer_intensity = layer_ops / layer_bytes if layer_bytes > 0 else np.inf
+        layer_peak = max(info["muls"], 1) * platform.cycles_per_sec
+        layers[node] = {
+            "type": info["type"],
+            "II": info["II"],
+            "II share": info["II"] / partition_ii if partition_ii > 0 else 0,
+            "depth": info["depth"],
+            "DSPs": info["DSPs"],
+            "Intensity(OP/B)": layer_intensity,
+            "GOP/s": layer_ops / dp_info["latency(S)"] * 1e-9,
+            "Attainable GOP/s": min(layer_peak, layer_intensity * bandwidth) * 1e-9,
+            "Bound": get_bound(
+                info["depth"] / max(info["II"] * batch_size + info["depth"], 1),
+                layer_intensity if info["offChip"] else np.inf,
+                layer_peak / bandwidth,
+                info["memBounded"],
+            ),
+        }
+
+    bottlenecks = sorted(layers, key=lambda node: layers[node]["II"], reverse=True)[
+        :top_k
+    ]
+    return {
+        "Device": platform.fpga_device,
+        "Times Repeated": times_repeated,
+        "latency(S)": dp_info["latency(S)"],
+        "Intensity(OP/B)": intensity,
+        "GOP/s": dp_info["GOP/s"],
+        "Attainable GOP/s": attainable * 1e-9,
+        "Roofline efficiency": dp_info["GOP/s"] * 1e9 / attainable,
+        "Depth share": depth_share,
+        "Bound": get_bound(
+            depth_share,
+            intensity,
+            roofline["Ridge point(OP/B)"],
+            any(dp_info["memBoundedIn"] + dp_info["memBoundedOut"]),
+        ),
+        "Bottlenecks": [
+            {"node": node, "II share": layers[node]["II share"]} for node in bottlenecks
+        ],
+        "layers": layers,
+    }
+
+
+def get_bottleneck_report(partitions: dict, top_k: int = 10) -> list:
+    """
+    Ranks the layers of all the partitions by the share of the total latency that they account for, taking into account the repetitions and the weights reloading passes of their partitions.
+    The streaming time of a partition is owned by the layer(s) with the maximum II, so that the shares of all the layers add up to the non-depth fraction of the total latency. The rest of the layers are ranked by their II relative to the maximum one.
+    """
+    total_latency = sum(
+        specs["latency(S)"] * specs["Times Repeated"] for specs in partitions.values()
+    )
+    nodes = []
+    for part_name, specs in partitions.items():
+        slowest = [
+            node for node, layer in specs["layers"].items() if layer["II share"] == 1
+        ]
+        streaming_latency = (
+            specs["latency(S)"] * specs["Times Repeated"] * (1 - specs["Depth share"])
+        )
+        for node, layer in specs["layers"].items():
+            nodes.append(
+                {
+                    "partition": part_name,
+                    "node": node,
+                    "type": layer["type"],
+                    "Bound": layer["Bound"],
+                    "II share": layer["II share"],
+                    "latency share": streaming_latency / len(slowest) / total_latency
+                    if node in slowest
+                    else 0,
+                }
+            )
+    return sorted(
+        nodes, key=lambda x: (x["latency share"], x["II share"]), reverse=True
+    )[:top_k]
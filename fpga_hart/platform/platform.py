@@ -20,7 +20,10 @@ class Platform:
         self.cycles_per_sec = self.clock_freq * 1e6
         self.bram = int(config.get(self.fpga_device, "bram"))
         self.bram_Kbytes = int(config.get(self.fpga_device, "bram_type")) / 8
+        self.uram = int(config.get(self.fpga_device, "uram"))
+        self.uram_Kbytes = int(config.get(self.fpga_device, "uram_type")) / 8
         self.dsp = int(config.get(self.fpga_device, "dsp"))
+        self.dsp_type = config.get(self.fpga_device, "dsp_type")
         self.mem_bw = float(config.get(self.fpga_device, "mem_bw"))
         self.mem_bandwidth = self.mem_bw * 1e9
         self.mem_words_per_cycle = (
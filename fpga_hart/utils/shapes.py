@@ -3,22 +3,24 @@ import networkx as nx
 import numpy as np
 import random
 
+from fpga_hart.optimizer.building_block import BuildingBlock
+
 def calc_mape(value_a: int, value_b: int) -> float:
     return (abs(value_a - value_b) / abs(value_a)) * 100
 
-def calc_conv_out_shape(cin: int, din: int, hin: int, kernel_shape: list, pad: list, stride: list, dw: bool, chan_dist_thresh: int = 10, is_pool: bool = False) -> list:
-    kd, kh, _ = kernel_shape
-    pad_d, pad_h, _ = pad
+def calc_conv_out_shape(cin: int, din: int, hin: int, bb_type: BuildingBlock, chan_dist_thresh: int = 10) -> list:
+    kd, kh, _ = bb_type.kernel
+    pad_d, pad_h, _ = bb_type.padding
     if kd == 1:
         pad_d = 0
     if kh == 1:
         pad_h = 0
-    stride_d, stride_h, _ = stride
+    stride_d, stride_h, _ = bb_type.stride
     dout = max(1, math.floor((din + 2*pad_d -kd)/stride_d + 1))
     hout = max(1, math.floor((hin + 2*pad_h -kh)/stride_h + 1))
     wout = hout
 
-    if dw or is_pool:
+    if bb_type.depthwise or bb_type.is_pool:
         cout = cin
     else:
         c_in_range = math.ceil(cin*chan_dist_thresh/100)
@@ -27,19 +29,15 @@ def calc_conv_out_shape(cin: int, din: int, hin: int, kernel_shape: list, pad: l
     return [1, int(cout), int(dout), int(hout), int(wout)]
 
 def get_random_arbitrary_shape(
-    graph: nx.DiGraph, bb_type: str, lookuptable: dict, previous_config: dict = None, chan_dist_thresh: int = 10, depth_dist_thresh: int = 10, height_dist_thresh: int = 10
+    graph: nx.DiGraph, bb_type: BuildingBlock, lookuptable: dict, previous_config: dict = None, chan_dist_thresh: int = 10, depth_dist_thresh: int = 10, height_dist_thresh: int = 10
 ) -> np.array:
     in_shapes = []
     out_shapes = []
-    kernel_shape = [int(x) for x in bb_type.split("k")[-1][:3]] if "Conv" in bb_type or "Pooling" in bb_type else []
-    padding = [int(x) for x in bb_type.split("p")[-1][:3]] if "Conv" in bb_type or "Pooling" in bb_type else []
-    stride = [int(x) for x in bb_type.split("s")[-1][:3]] if "Conv" in bb_type or "Pooling" in bb_type else []
-    dw = True if "Dw" in bb_type else False
     for node in graph.nodes:
         bb = lookuptable[graph.nodes[node]["hw_type"]]
-        if bb == "Activation" and len(graph.nodes[node]["hw"].input_shape) < 5:
+        if bb.operation == "Activation" and len(graph.nodes[node]["hw"].input_shape) < 5:
             continue
-        if bb in bb_type:
+        if bb == bb_type:
             in_shapes.append(graph.nodes[node]["hw"].input_shape)
             out_shapes.append(graph.nodes[node]["hw"].output_shape)
 
@@ -59,11 +57,9 @@ def get_random_arbitrary_shape(
             d_in = np.random.randint(max(1, prev_d_in-d_in_range), prev_d_in+d_in_range)
             h_in = np.random.randint(max(1, prev_h_in-h_in_range), prev_h_in+h_in_range)
 
-            if "Conv" in bb_type:
-                _, c_out, d_out, h_out, _ = calc_conv_out_shape(c_in, d_in, h_in, kernel_shape, padding, stride, dw, chan_dist_thresh)
-            elif "Pooling" in bb_type:
-                _, c_out, d_out, h_out, _ = calc_conv_out_shape(c_in, d_in, h_in, kernel_shape, padding, stride, dw, chan_dist_thresh, is_pool=True)
-            elif "GlobalAveragePool" in bb_type:
+            if bb_type.is_windowed:
+                _, c_out, d_out, h_out, _ = calc_conv_out_shape(c_in, d_in, h_in, bb_type, chan_dist_thresh)
+            elif bb_type.operation == "GlobalAveragePool":
                 c_out = c_in
                 d_out = 1
                 h_out = 1
@@ -85,11 +81,9 @@ def get_random_arbitrary_shape(
         h_in = np.random.randint(h_min, h_max) if h_min != h_max else h_min
         w_in = h_in
 
-        if "Conv" in bb_type:
-            _, c_out, d_out, h_out, _ = calc_conv_out_shape(c_in, d_in, h_in, kernel_shape, padding, stride, dw, chan_dist_thresh)
-        elif "Pooling" in bb_type:
-                _, c_out, d_out, h_out, _ = calc_conv_out_shape(c_in, d_in, h_in, kernel_shape, padding, stride, dw, chan_dist_thresh, is_pool=True)
-        elif "GlobalAveragePool" in bb_type:
+        if bb_type.is_windowed:
+            _, c_out, d_out, h_out, _ = calc_conv_out_shape(c_in, d_in, h_in, bb_type, chan_dist_thresh)
+        elif bb_type.operation == "GlobalAveragePool":
             c_out = c_in
             d_out = 1
             h_out = 1
@@ -116,16 +110,16 @@ def get_random_arbitrary_shape(
     return final_shape_in, final_shape_out
 
 def get_random_shape(
-    graph: nx.DiGraph, bb_type: str, lookuptable: dict, previous_config: dict = None, chan_dist_thresh: int = 10, depth_dist_thresh: int = 10, height_dist_thresh: int = 10
+    graph: nx.DiGraph, bb_type: BuildingBlock, lookuptable: dict, previous_config: dict = None, chan_dist_thresh: int = 10, depth_dist_thresh: int = 10, height_dist_thresh: int = 10
 ) -> np.array:
     shapes_list = []
     for n in nx.topological_sort(graph):
         bb = lookuptable[graph.nodes[n]["hw_type"]]
-        if bb in bb_type and bb == "Gemm":
+        if bb == bb_type and bb.operation == "Gemm":
             shapes_list.append(
                 [graph.nodes[n]["hw"].input_shape, graph.nodes[n]["hw"].output_shape]
             )
-        elif bb in bb_type and np.prod(graph.nodes[n]["hw"].input_shape[2:]) > 1:
+        elif bb == bb_type and np.prod(graph.nodes[n]["hw"].input_shape[2:]) > 1:
             shapes_list.append(
                 [graph.nodes[n]["hw"].input_shape, graph.nodes[n]["hw"].output_shape]
             )
@@ -218,4 +212,63 @@ def get_minmax_width(graph: nx.DiGraph, bb_type: str) -> int:
         if bb == bb_type:
             max_width = max(max_width, graph.nodes[n]["hw"].input_shape[4])
             min_width = min(min_width, graph.nodes[n]["hw"].input_shape[4])
-    return min_width, max_width
\ No newline at end of file
+    return min_width, max_width
+
+
+def get_dim_tiling(
+    in_dim: int, out_dim: int, tile_in: int, kernel: int = 1, stride: int = 1, padding: int = 0
+) -> dict:
+    """
+    Tiling of a single dimension of a layer over a building block that reads up to
+    tile_in elements per call. The halos are only read again at the interior cuts.
+    """
+    tile_in = max(tile_in, kernel)
+    tiles_in = []
+    tiles_out = []
+    out_start = 0
+    while out_start < out_dim:
+        read_start = max(out_start * stride, padding)
+        if in_dim + padding - read_start <= tile_in:
+            out_end = out_dim
+        else:
+            out_end = min((read_start + tile_in - kernel) // stride + 1, out_dim)
+        read_end = min((out_end - 1) * stride + kernel, in_dim + padding)
+        tiles_in.append(read_end - read_start)
+        tiles_out.append(out_end - out_start)
+        out_start = out_end
+    return {
+        "tiles": len(tiles_out),
+        "tile_in": max(tiles_in),
+        "tile_out": max(tiles_out),
+        "reads": sum(tiles_in),
+    }
+
+
+def get_tiling(
+    in_shape: list,
+    out_shape: list,
+    block_shape: list,
+    kernel: list = None,
+    stride: list = None,
+    padding: list = None,
+) -> dict:
+    """
+    Tiling of the (depth, height, width) dimensions of a layer over a building
+    block of block_shape, along with the elements read from the off-chip memory.
+    """
+    kernel = kernel if kernel else [1, 1, 1]
+    stride = stride if stride else [1, 1, 1]
+    padding = padding if padding else [0, 0, 0]
+    dims = [
+        get_dim_tiling(in_shape[i], out_shape[i], block_shape[i], kernel[i], stride[i], padding[i])
+        for i in range(3)
+    ]
+    reads = int(np.prod([d["reads"] for d in dims]))
+    return {
+        "tiles": [d["tiles"] for d in dims],
+        "num_tiles": int(np.prod([d["tiles"] for d in dims])),
+        "tile_in": [d["tile_in"] for d in dims],
+        "tile_out": [d["tile_out"] for d in dims],
+        "reads": reads,
+        "redundant_reads": max(reads / np.prod(in_shape) - 1, 0),
+    }
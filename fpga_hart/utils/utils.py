@@ -5,7 +5,7 @@ import math
 import os
 import random
 import re
-from copy import deepcopy
+from dataclasses import replace
 from functools import reduce
 from typing import Tuple
 
@@ -14,8 +14,6 @@ import pandas as pd
 import scienceplots
 import seaborn as sns
 from matplotlib import pyplot as plt
-from scipy.spatial.distance import cdist
-from sklearn.cluster import KMeans
 
 from fpga_hart import _logger
 from fpga_hart.layers.activation_3d import Activation3DLayer
@@ -26,6 +24,7 @@ from fpga_hart.layers.fully_connected import FCLayer
 from fpga_hart.layers.gap_3d import GAP3DLayer
 from fpga_hart.layers.pooling_3d import Pooling3DLayer
 from fpga_hart.layers.squeeze_excitation import SqueezeExcitationLayer
+from fpga_hart.optimizer.building_block import BuildingBlock
 from fpga_hart.utils.graph_manipulation import get_out_streams
 
 plt.style.use(["science", "ieee", "grid"])
@@ -66,178 +65,54 @@ def get_factors(n, max_parallel=None, keep_percentage=None) -> list:
         return (factors[factors <= max_parallel]).tolist()
 
 
-def combine_building_blocks(building_blocks: list) -> Tuple[list, dict]:
-    conv_blocks_lookup_choices = []
-    conv_blocks_dw_lookup_choices = []
-    pool_blocks_lookup_choices = []
-    conv_blocks_choices = []
-    conv_dw_blocks_choices = []
-    pool_blocks_choices = []
-
-    conv_blocks = []
-    conv_dw_blocks = []
-    pool_blocks = []
-    rest_operations = []
-    for bb in building_blocks:
-        if "Conv" in bb:
-            if "Dw" in bb:
-                conv_dw_blocks.append(bb)
-            else:
-                conv_blocks.append(bb)
-        elif "Pooling" in bb:
-            pool_blocks.append(bb)
+def combine_building_blocks(building_blocks: dict) -> Tuple[list, dict]:
+    """
+    Takes the building block of every hardware type of the graph. Each family of convolutional (standard or depthwise) and pooling blocks is either kept as is or, with equal probability, combined into a single block with the largest kernel and padding and the smallest stride of the family.
+    Returns the final building blocks and the lookup table from hardware types to building blocks.
+    """
+    families = {}
+    final_lookup_table = {}
+    for hw_type, bb in building_blocks.items():
+        if bb.is_windowed:
+            families.setdefault((bb.operation, bb.depthwise), {})[hw_type] = bb
         else:
-            rest_operations.append(bb)
-
-    # Combine convolutional blocks
-    kernel_list = []
-    padding_list = []
-    stride_list = []
-    lookuptable = {}
-    for c in conv_blocks:
-        lookuptable[c.split("p")[0]] = c
-        kernel_shape = [int(x) for x in c.split("k")[-1][:3]]
-        kernel_list.append(kernel_shape)
-        padding = [int(x) for x in c.split("p")[-1][:3]]
-        padding_list.append(padding)
-        stride = [int(x) for x in c.split("s")[-1][:3]]
-        stride_list.append(stride)
-
-    if kernel_list:
-        conv_blocks_choices.append(conv_blocks)
-        conv_blocks_lookup_choices.append(deepcopy(lookuptable))
+            final_lookup_table[hw_type] = bb
+    final_building_blocks = list(final_lookup_table.values())
 
-        combined_kernel = np.max(np.array(kernel_list), axis=0).tolist()
-        combined_padding = np.max(np.array(padding_list), axis=0).tolist()
-        combined_stride = np.min(np.array(stride_list), axis=0).tolist()
-
-        try:
-            index = kernel_list.index(combined_kernel)
-        except ValueError:
-            index = -1
-
-        if index != -1:
-            block = f"{conv_blocks[index].split('p')[0]}p{''.join([str(elem) for elem in combined_padding])}s{''.join([str(elem) for elem in combined_stride])}"
-        else:
-            block = f"Conv3Dk{''.join([str(elem) for elem in combined_kernel])}p{''.join([str(elem) for elem in combined_padding])}s{''.join([str(elem) for elem in combined_stride])}"
-        lookuptable.clear()
-        for c in conv_blocks:
-            lookuptable[c.split("p")[0]] = block
-        conv_blocks_choices.append([block])
-        conv_blocks_lookup_choices.append(deepcopy(lookuptable))
-
-    # Combine pooling blocks
-    kernel_list = []
-    padding_list = []
-    stride_list = []
-    lookuptable = {}
-    for c in pool_blocks:
-        lookuptable[c.split("p")[0]] = c
-        kernel_shape = [int(x) for x in c.split("k")[-1][:3]]
-        kernel_list.append(kernel_shape)
-        padding = [int(x) for x in c.split("p")[-1][:3]]
-        padding_list.append(padding)
-        stride = [int(x) for x in c.split("s")[-1][:3]]
-        stride_list.append(stride)
-
-    if kernel_list:
-        pool_blocks_choices.append(pool_blocks)
-        pool_blocks_lookup_choices.append(deepcopy(lookuptable))
+    for family in families.values():
+        blocks = list(family.values())
+        if random.randint(0, 1) == 0:
+            final_building_blocks += blocks
+            final_lookup_table |= family
+            continue
 
+        kernel_list = [list(bb.kernel) for bb in blocks]
         combined_kernel = np.max(np.array(kernel_list), axis=0).tolist()
-        combined_padding = np.max(np.array(padding_list), axis=0).tolist()
-        combined_stride = np.min(np.array(stride_list), axis=0).tolist()
-
-        try:
-            index = kernel_list.index(combined_kernel)
-        except ValueError:
-            index = -1
-
-        if index != -1:
-            block = f"{pool_blocks[index].split('p')[0]}p{''.join([str(elem) for elem in combined_padding])}s{''.join([str(elem) for elem in combined_stride])}"
-        else:
-            block = f"Poolingk{''.join([str(elem) for elem in combined_kernel])}p{''.join([str(elem) for elem in combined_padding])}s{''.join([str(elem) for elem in combined_stride])}"
-        lookuptable.clear()
-        for c in pool_blocks:
-            lookuptable[c.split("p")[0]] = block
-        pool_blocks_choices.append([block])
-        pool_blocks_lookup_choices.append(deepcopy(lookuptable))
-
-    # Combine convolutional depthwise blocks
-    kernel_list = []
-    padding_list = []
-    stride_list = []
-    lookuptable = {}
-    for c in conv_dw_blocks:
-        lookuptable[c.split("p")[0]] = c
-        kernel_shape = [int(x) for x in c.split("k")[-1][:3]]
-        kernel_list.append(kernel_shape)
-        padding = [int(x) for x in c.split("p")[-1][:3]]
-        padding_list.append(padding)
-        stride = [int(x) for x in c.split("s")[-1][:3]]
-        stride_list.append(stride)
-
-    if kernel_list:
-        conv_dw_blocks_choices.append(conv_dw_blocks)
-        conv_blocks_dw_lookup_choices.append(deepcopy(lookuptable))
-        combined_kernel = np.max(np.array(kernel_list), axis=0).tolist()
-        combined_padding = np.max(np.array(padding_list), axis=0).tolist()
-        combined_stride = np.min(np.array(stride_list), axis=0).tolist()
-
-        try:
-            index = kernel_list.index(combined_kernel)
-        except ValueError:
-            index = -1
-
-        if index != -1:
-            block = f"{conv_dw_blocks[index].split('p')[0]}p{''.join([str(elem) for elem in combined_padding])}s{''.join([str(elem) for elem in combined_stride])}"
+        combined_padding = tuple(np.max(np.array([bb.padding for bb in blocks]), axis=0).tolist())
+        combined_stride = tuple(np.min(np.array([bb.stride for bb in blocks]), axis=0).tolist())
+
+        if combined_kernel in kernel_list:
+            block = replace(
+                blocks[kernel_list.index(combined_kernel)],
+                padding=combined_padding,
+                stride=combined_stride,
+            )
         else:
-            block = f"Conv3DDwk{''.join([str(elem) for elem in combined_kernel])}p{''.join([str(elem) for elem in combined_padding])}s{''.join([str(elem) for elem in combined_stride])}"
-        lookuptable.clear()
-        for c in conv_dw_blocks:
-            lookuptable[c.split("p")[0]] = block
-        conv_blocks_dw_lookup_choices.append(deepcopy(lookuptable))
-        conv_dw_blocks_choices.append([block])
-
-    assert len(conv_blocks_choices) == len(conv_blocks_lookup_choices)
-    assert len(pool_blocks_choices) == len(pool_blocks_lookup_choices)
-    assert len(conv_dw_blocks_choices) == len(conv_blocks_dw_lookup_choices)
-
-    conv_blocks_idx = (
-        random.randint(0, len(conv_blocks_choices) - 1) if conv_blocks_choices else -1
-    )
-    pool_blocks_idx = (
-        random.randint(0, len(pool_blocks_choices) - 1) if pool_blocks_choices else -1
-    )
-    conv_dw_blocks_idx = (
-        random.randint(0, len(conv_dw_blocks_choices) - 1)
-        if conv_dw_blocks_choices
-        else -1
-    )
-    final_building_blocks = deepcopy(rest_operations)
-    if conv_blocks_idx != -1:
-        final_building_blocks += conv_blocks_choices[conv_blocks_idx]
-    if pool_blocks_idx != -1:
-        final_building_blocks += pool_blocks_choices[pool_blocks_idx]
-    if conv_dw_blocks_idx != -1:
-        final_building_blocks += conv_dw_blocks_choices[conv_dw_blocks_idx]
-
-    final_lookup_table = {}
-    for op in rest_operations:
-        final_lookup_table[op] = op
-
-    if conv_blocks_idx != -1:
-        final_lookup_table |= conv_blocks_lookup_choices[conv_blocks_idx]
-    if pool_blocks_idx != -1:
-        final_lookup_table |= pool_blocks_lookup_choices[pool_blocks_idx]
-    if conv_dw_blocks_idx != -1:
-        final_lookup_table |= conv_blocks_dw_lookup_choices[conv_dw_blocks_idx]
+            block = BuildingBlock(
+                operation=blocks[0].operation,
+                kernel=tuple(combined_kernel),
+                padding=combined_padding,
+                stride=combined_stride,
+                depthwise=blocks[0].depthwise,
+            )
+        final_building_blocks.append(block)
+        final_lookup_table |= {hw_type: block for hw_type in family}
 
     return final_building_blocks, final_lookup_table
 
 
 def generate_description_from_type(
-    bb: str,
+    bb: BuildingBlock,
     channels_in_dim: int,
     depth_in_dim: int,
     height_in_dim: int,
@@ -247,12 +122,11 @@ def generate_description_from_type(
     height_out_dim: int,
     width_out_dim: int,
 ):
-    if "Conv" in bb:
-        dw = True if "Dw" in bb else False
-        pw = True if "Pw" in bb else False
-        kernel_shape = [int(x) for x in bb.split("k")[-1][:3]]
-        padding = [int(x) for x in bb.split("p")[-1][:3]]
-        stride = [int(x) for x in bb.split("s")[-1][:3]]
+    if bb.is_conv:
+        dw = bb.depthwise
+        kernel_shape = list(bb.kernel)
+        padding = list(bb.padding)
+        stride = list(bb.stride)
 
         bb_descriptor = {
             "operation": "Conv",
@@ -276,10 +150,10 @@ def generate_description_from_type(
             "dilation": [1, 1, 1],
             "branching": False,
         }
-    elif "Pooling" in bb:
-        kernel_shape = [int(x) for x in bb.split("k")[-1][:3]]
-        padding = [int(x) for x in bb.split("p")[-1][:3]]
-        stride = [int(x) for x in bb.split("s")[-1][:3]]
+    elif bb.is_pool:
+        kernel_shape = list(bb.kernel)
+        padding = list(bb.padding)
+        stride = list(bb.stride)
 
         bb_descriptor = {
             "operation": "Pooling",
@@ -298,7 +172,7 @@ def generate_description_from_type(
             "stride": stride,
             "branching": False,
         }
-    elif bb == "Activation":
+    elif bb.operation == "Activation":
         bb_descriptor = {
             "operation": "Activation",
             "shape_in": [
@@ -312,7 +186,7 @@ def generate_description_from_type(
                 width_in_dim,
             ],
         }
-    elif bb == "GlobalAveragePool":
+    elif bb.operation == "GlobalAveragePool":
         bb_descriptor = {
             "operation": "GlobalAveragePool",
             "shape_in": [
@@ -326,7 +200,7 @@ def generate_description_from_type(
                 1,
             ],
         }
-    elif bb == "ElementWise":
+    elif bb.operation == "ElementWise":
         # TODO: We assume here that we always have two inputs of the same shape. (i.e. no broadcasting)
         bb_descriptor = {
             "operation": "ElementWise",
@@ -342,7 +216,7 @@ def generate_description_from_type(
                 width_in_dim,
             ],
         }
-    elif bb == "Gemm":
+    elif bb.operation == "Gemm":
         bb_descriptor = {
             "operation": "Gemm",
             "shape_in": [[1, channels_in_dim]],
@@ -646,6 +520,8 @@ def generate_layer_config(layer, config, wr_factor=1):
             coarse_out_factor if not depthwise else coarse_in_factor
         )
         layer_config["wr_factor"] = wr_factor
+        layer_config["stream_weights"] = int(len(config) > 3 and bool(config[3]))
+        layer_config["double_buffer_weights"] = int(len(config) > 4 and bool(config[4]))
     elif isinstance(layer, Pooling3DLayer):
         input_shape = layer.input_shape
         output_shape = layer.output_shape
@@ -752,6 +628,10 @@ def generate_layer_config(layer, config, wr_factor=1):
     else:
         assert False, "Not supported layer"
 
+    layer_config["word_length"] = layer.word_length
+    if isinstance(layer, (Convolutional3DLayer, FCLayer)):
+        layer_config["weights_word_length"] = layer.weights_word_length
+
     return layer_config
 
 
@@ -949,55 +829,63 @@ def get_conbinations(list1, list2):
 def normalizeData(data):
     return (data - np.min(data)) / (np.max(data) - np.min(data))
 
-def get_channels_bins(channels, plot_lbow=False, plot_hist=False):
-    X = np.array(channels).reshape(-1, 1)
-
-    distortions = []
-    inertias = []
-    mapping1 = {}
-    mapping2 = {}
-    K = range(1, 10)
-
-    for k in K:
-        # Building and fitting the model
-        kmeanModel = KMeans(n_clusters=k).fit(X)
-
-        distortions.append(
-            sum(np.min(cdist(X, kmeanModel.cluster_centers_, "euclidean"), axis=1))
-            / X.shape[0]
-        )
-        inertias.append(kmeanModel.inertia_)
-
-        mapping1[k] = (
-            sum(np.min(cdist(X, kmeanModel.cluster_centers_, "euclidean"), axis=1))
-            / X.shape[0]
-        )
-        mapping2[k] = kmeanModel.inertia_
-
-    distortions_res = normalizeData(np.array(sorted(mapping1.values(), reverse=True)))
-    k_dist = 0
-    for i in range(len(distortions_res) - 1):
-        dist = np.linalg.norm(distortions_res[i] - distortions_res[i + 1])
-        if dist < 0.05:
-            k_dist = i + 1
-            _logger.info(f"Optimal number of clusters calculated: {i + 1}")
-            break
+def get_natural_breaks(values: np.ndarray, weights: np.ndarray, max_k: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Fisher's exact clustering (Jenks natural breaks) of the sorted values, each one repeated as many times as its weight, into contiguous classes that minimize the within class sum of squared deviations. The dynamic programming solves every number of classes up to max_k at once.
+    Returns the sum of squared deviations of the optimal classification into 1..max_k classes and, for every number of classes and prefix of the values, the index where its last class starts.
+    """
+    num_values = len(values)
+    cum_w = np.concatenate(([0], np.cumsum(weights)))
+    cum_wx = np.concatenate(([0], np.cumsum(weights * values)))
+    cum_wxx = np.concatenate(([0], np.cumsum(weights * values**2)))
+
+    cost = np.full((max_k + 1, num_values + 1), np.inf)
+    cost[0, 0] = 0
+    class_start = np.zeros((max_k + 1, num_values + 1), dtype=int)
+    for k in range(1, max_k + 1):
+        for j in range(k, num_values + 1):
+            # The last class holds the values[i:j] for every candidate start i
+            i = np.arange(k - 1, j)
+            sum_w = cum_w[j] - cum_w[i]
+            sum_wx = cum_wx[j] - cum_wx[i]
+            ssd = cum_wxx[j] - cum_wxx[i] - sum_wx**2 / sum_w
+            total = cost[k - 1, i] + ssd
+            best = np.argmin(total)
+            cost[k, j] = total[best]
+            class_start[k, j] = i[best]
+    return np.maximum(cost[1:, num_values], 0), class_start
+
+
+def get_channels_bins(channels, plot_lbow=False, plot_hist=False, max_k=9, gvf_threshold=0.9):
+    """
+    Bins the channels of the layers with the exact 1-D optimal clustering of get_natural_breaks. The number of bins is the smallest one whose goodness of variance fit (the share of the variance of the channels that is explained by the bins) reaches gvf_threshold.
+    Returns the bins as closed intervals from the smallest to the largest channels of each bin.
+    """
+    X = np.array(channels)
+    values, weights = np.unique(X, return_counts=True)
+    values = values.astype(float)
+    max_k = min(max_k, len(values))
 
-    Kmean = KMeans(n_clusters=k_dist)
-    Kmean.fit(X)
-    kmeans_bins = np.sort(Kmean.cluster_centers_[:, 0])
+    ssd, class_start = get_natural_breaks(values, weights.astype(float), max_k)
+    gvf = 1 - ssd / ssd[0] if ssd[0] > 0 else np.ones(max_k)
+    k_dist = int(np.argmax(gvf >= gvf_threshold)) + 1
+    _logger.info(f"Optimal number of clusters calculated: {k_dist}")
 
     if plot_lbow:
-        plt.plot(K, distortions, "bx-")
+        plt.plot(range(1, max_k + 1), gvf, "bx-")
         plt.xlabel("Values of K")
-        plt.ylabel("Distortion")
-        plt.title("The Elbow Method using Distortion")
+        plt.ylabel("Goodness of variance fit")
+        plt.title("Jenks natural breaks")
         plt.tight_layout()
         plt.show()
 
-    df = pd.DataFrame({"channels": channels})
-    df["channels_bin"] = pd.qcut(df["channels"], q=k_dist)
-    bin_edges = df["channels_bin"].unique()
+    bins = []
+    j = len(values)
+    for k in range(k_dist, 0, -1):
+        i = class_start[k, j]
+        bins.append((int(values[i]), int(values[j - 1])))
+        j = i
+    bin_edges = pd.IntervalIndex.from_tuples(bins[::-1], closed="both")
 
     if plot_hist:
         sns.histplot(X, bins=X.shape[0])
@@ -11,6 +11,9 @@ import wandb
 from fpga_hart import _logger
 from fpga_hart.layers.layer_parser import LayerParser
 from fpga_hart.network.network_parser import NetworkParser
+from fpga_hart.partitions.partition_descriptor import (
+    multi_model_latency_driven_design,
+)
 from fpga_hart.partitions.partition_parser import PartitionParser
 from fpga_hart.platform.platform import Platform
 
@@ -127,7 +130,10 @@ def optimizer() -> None:
         )
 
         if args.target == "throughput":
-            network_parser.parse()
+            if config.pipeline_devices:
+                network_parser.parse_pipeline()
+            else:
+                network_parser.parse()
         elif args.target == "latency":
             pass
     elif args.type == "partition":
@@ -147,7 +153,28 @@ def optimizer() -> None:
             # partition_parser.model_custom_partition(name="conv_relu_seq")
         elif args.target == "latency":
             # partition_parser.find_common_layers(groupping=3)
-            partition_parser.latency_driven_design()
+            model_mix = config.get("model_mix", {})
+            if model_mix:
+                partition_parsers = [
+                    partition_parser
+                    if model_name == args.model_name
+                    else PartitionParser(
+                        model_name=model_name,
+                        se_block=args.se_block,
+                        gap_approx=args.gap_approx,
+                        singlethreaded=args.singlethreaded,
+                        per_layer_plot=args.plot_layers,
+                        platform=platform,
+                        config=config,
+                        enable_wandb=args.enable_wandb,
+                    )
+                    for model_name in model_mix
+                ]
+                multi_model_latency_driven_design(
+                    partition_parsers, list(model_mix.values())
+                )
+            else:
+                partition_parser.latency_driven_design()
     elif args.type == "layer":
         layer_parser = LayerParser(
             model_name=args.model_name,
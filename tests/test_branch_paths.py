@@ -0,0 +1,83 @@
+import itertools
+import random
+import unittest
+from types import SimpleNamespace
+
+import networkx as nx
+import numpy as np
+from ddt import data, ddt, unpack
+
+from fpga_hart.partitions.partition_compose import PartitionComposer
+
+
+def golden_branch_paths(graph, in_point, end_point):
+    paths = []
+    depths = []
+    for path in nx.all_simple_paths(graph, source=in_point, target=end_point):
+        paths.append(path)
+        depths.append(sum(graph.nodes[p]["hw"].depth for p in path[1:-1]))
+    longest_idx = np.argmax(depths)
+    shortest_idx = np.argmin(depths)
+    return (
+        len(paths),
+        (depths[shortest_idx], paths[shortest_idx]),
+        (depths[longest_idx], paths[longest_idx]),
+    )
+
+
+# A single split and merge
+diamond = [("in", "a"), ("a", "b"), ("b", "out"), ("in", "c"), ("c", "out")]
+
+# A diamond inside one of the branches of a wider split, along with a direct connection from the split to the merge
+nested = [
+    ("in", "a"),
+    ("a", "b"),
+    ("b", "c"),
+    ("c", "m"),
+    ("b", "d"),
+    ("d", "e"),
+    ("e", "m"),
+    ("m", "f"),
+    ("f", "out"),
+    ("in", "g"),
+    ("g", "out"),
+    ("in", "out"),
+]
+
+# Two diamonds in sequence bypassed by a third branch, plus a dead end that does not reach the merge
+sequential = [
+    ("in", "a"),
+    ("a", "b"),
+    ("a", "c"),
+    ("b", "d"),
+    ("c", "d"),
+    ("d", "e"),
+    ("d", "f"),
+    ("e", "h"),
+    ("f", "h"),
+    ("h", "out"),
+    ("in", "g"),
+    ("g", "out"),
+    ("c", "dead"),
+]
+
+
+@ddt
+class TestBranchPaths(unittest.TestCase):
+    # A small max depth gives paths of equal depth, which have to be resolved in the order of nx.all_simple_paths
+    @data(*itertools.product([diamond, nested, sequential], [2, 1000], range(5)))
+    @unpack
+    def test_get_branch_paths(self, edges, max_depth, seed):
+        rng = random.Random(seed)
+        graph = nx.DiGraph(edges)
+        for node in graph.nodes:
+            graph.nodes[node]["hw"] = SimpleNamespace(depth=rng.randint(0, max_depth))
+        expected = golden_branch_paths(graph, "in", "out")
+        result = PartitionComposer.get_branch_paths(graph, "in", "out")
+        self.assertEqual(result[0], expected[0])
+        self.assertEqual(result[1], expected[1])
+        self.assertEqual(result[2], expected[2])
+
+
+if __name__ == "__main__":
+    unittest.main()
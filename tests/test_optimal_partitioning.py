@@ -0,0 +1,70 @@
+import itertools
+import random
+import unittest
+
+from ddt import data, ddt, unpack
+
+from fpga_hart.network.network_parser import get_shortest_partitioning
+
+
+def golden_partitioning(num_layers, candidates, costs):
+    best = None
+    for cuts in itertools.product([False, True], repeat=num_layers - 1):
+        bounds = [0] + [i + 1 for i, cut in enumerate(cuts) if cut] + [num_layers]
+        partitions = list(zip(bounds[:-1], bounds[1:]))
+        if any(end not in candidates.get(start, []) for start, end in partitions):
+            continue
+        cost = (
+            sum(costs[p][0] for p in partitions),
+            sum(costs[p][1] for p in partitions),
+        )
+        if best is None or cost[0] < best[1][0] or (cost[0] == best[1][0] and cost[1] < best[1][1] - 1e-9):
+            best = (partitions, cost)
+    return best
+
+
+@ddt
+class TestOptimalPartitioning(unittest.TestCase):
+    @data(*itertools.product([1, 4, 7, 9], [1, 3, 9], [0, 0.3], range(3)))
+    @unpack
+    def test_get_shortest_partitioning(self, num_layers, max_partition_layers, invalid_ratio, seed):
+        # Random (invalid layers, latency) costs for every partition of up to max_partition_layers layers
+        rng = random.Random(seed)
+        candidates = {
+            start: list(range(start + 1, min(start + max_partition_layers, num_layers) + 1))
+            for start in range(num_layers)
+        }
+        costs = {
+            (start, end): (
+                end - start if rng.random() < invalid_ratio else 0,
+                round(rng.uniform(0.1, 1.0) * (end - start) + 0.5, 6),
+            )
+            for start, ends in candidates.items()
+            for end in ends
+        }
+        expected_partitions, expected_cost = golden_partitioning(num_layers, candidates, costs)
+        partitions, cost = get_shortest_partitioning(
+            num_layers, candidates, lambda start, end: (costs[(start, end)], f"{start}-{end}")
+        )
+        self.assertEqual([(start, end) for start, end, _ in partitions], expected_partitions)
+        self.assertEqual([specs for _, _, specs in partitions], [f"{start}-{end}" for start, end in expected_partitions])
+        self.assertEqual(cost[0], expected_cost[0])
+        self.assertAlmostEqual(cost[1], expected_cost[1])
+
+    def test_invalid_partitions_are_avoided(self):
+        # The single partition is faster but does not fit in the device
+        candidates = {0: [2, 4], 2: [4]}
+        costs = {(0, 4): (4, 1.0), (0, 2): (0, 2.0), (2, 4): (0, 2.0)}
+        partitions, cost = get_shortest_partitioning(4, candidates, lambda start, end: (costs[(start, end)], None))
+        self.assertEqual([(start, end) for start, end, _ in partitions], [(0, 2), (2, 4)])
+        self.assertEqual(cost, (0, 4.0))
+
+    def test_unreachable_end(self):
+        candidates = {0: [2], 3: [4]}
+        partitions, cost = get_shortest_partitioning(4, candidates, lambda start, end: ((0, 1.0), None))
+        self.assertIsNone(partitions)
+        self.assertIsNone(cost)
+
+
+if __name__ == "__main__":
+    unittest.main()
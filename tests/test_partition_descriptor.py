@@ -0,0 +1,123 @@
+import unittest
+
+from ddt import data, ddt, unpack
+
+from fpga_hart.partitions.partition_descriptor import (
+    create_partitions, get_layer_segments, get_partition_signature,
+    get_repeated_partitions)
+
+
+def layer(operation, node_in, node_out, channels, branching=False, kernel=None):
+    description = {
+        "operation": operation,
+        "shape_in": [[1, channels, 8, 8, 8] for _ in node_in],
+        "shape_out": [1, channels, 8, 8, 8],
+        "node_in": node_in,
+        "node_out": node_out,
+        "branching": branching,
+    }
+    if kernel is not None:
+        description.update(
+            {
+                "kernel": [channels, channels] + kernel,
+                "bias": [channels],
+                "padding": [k // 2 for k in kernel],
+                "stride": [1, 1, 1],
+                "groups": 1,
+                "dilation": [1, 1, 1],
+            }
+        )
+    return description
+
+
+def residual_block(layers, index, node_in, channels, kernel=[3, 3, 3]):
+    layers[f"Conv_{index}"] = layer("Conv", [node_in], f"{index}", channels, kernel=kernel)
+    layers[f"Relu_{index + 1}"] = layer("Relu", [f"{index}"], f"{index + 1}", channels)
+    layers[f"Conv_{index + 2}"] = layer("Conv", [f"{index + 1}"], f"{index + 2}", channels, kernel=kernel)
+    layers[f"Add_{index + 3}"] = layer("Add", [f"{index + 2}", node_in], f"{index + 3}", channels, branching=True)
+    return f"{index + 3}"
+
+
+def se_block(layers, index, node_in, channels):
+    layers[f"GlobalAveragePool_{index}"] = layer("GlobalAveragePool", [node_in], f"{index}", channels)
+    layers[f"Conv_{index + 1}"] = layer("Conv", [f"{index}"], f"{index + 1}", channels, kernel=[1, 1, 1])
+    layers[f"Relu_{index + 2}"] = layer("Relu", [f"{index + 1}"], f"{index + 2}", channels)
+    layers[f"Conv_{index + 3}"] = layer("Conv", [f"{index + 2}"], f"{index + 3}", channels, kernel=[1, 1, 1])
+    layers[f"Sigmoid_{index + 4}"] = layer("Sigmoid", [f"{index + 3}"], f"{index + 4}", channels)
+    layers[f"Mul_{index + 5}"] = layer("Mul", [f"{index + 4}", node_in], f"{index + 5}", channels, branching=True)
+    return f"{index + 5}"
+
+
+def synthetic_model(blocks):
+    """
+    A stem of a Conv and a Relu followed by the given blocks (residual, se or residual_k1 for a residual block with pointwise kernels) and a final Gemm.
+    """
+    layers = {
+        "Conv_0": layer("Conv", ["input"], "0", 16, kernel=[3, 3, 3]),
+        "Relu_1": layer("Relu", ["0"], "1", 16, branching=True),
+    }
+    node, index = "1", 2
+    for block in blocks:
+        if block == "se":
+            node = se_block(layers, index, node, 16)
+            index += 6
+        else:
+            node = residual_block(layers, index, node, 16, kernel=[1, 1, 1] if block == "residual_k1" else [3, 3, 3])
+            index += 4
+    layers[f"Gemm_{index}"] = layer("Gemm", [node], f"{index}", 16)
+    return layers
+
+
+class PartitionHolder:
+    # The partition descriptor functions are bound as methods of the partition parser
+    create_partitions = create_partitions
+    get_partition_signature = get_partition_signature
+    get_repeated_partitions = get_repeated_partitions
+
+    def __init__(self, layers):
+        self.layers = layers
+
+
+@ddt
+class TestPartitionDescriptor(unittest.TestCase):
+    @data(
+        ([], [1, 1, 1]),
+        (["residual"], [1, 1, 4, 1]),
+        (["residual", "residual", "se"], [1, 1, 4, 4, 6, 1]),
+        (["se", "residual_k1"], [1, 1, 6, 4, 1]),
+    )
+    @unpack
+    def test_get_layer_segments(self, blocks, expected_lengths):
+        layers = synthetic_model(blocks)
+        segments = get_layer_segments(layers)
+        self.assertEqual([len(segment) for segment in segments], expected_lengths)
+        self.assertEqual(sum(segments, []), list(layers))
+
+    @data(
+        ([], [3]),
+        (["residual"], [6, 1]),
+        (["residual", "residual", "se"], [6, 4, 6, 1]),
+        (["se", "residual_k1"], [8, 4, 1]),
+    )
+    @unpack
+    def test_create_partitions(self, blocks, expected_lengths):
+        layers = synthetic_model(blocks)
+        partitions = PartitionHolder(layers).create_partitions(layers)
+        self.assertEqual([len(partition) for partition in partitions], expected_lengths)
+        self.assertEqual(sum(partitions, []), list(layers))
+
+    @data(
+        (["residual", "residual", "residual", "se"], {0: [], 1: [2], 3: [], 4: []}),
+        (["residual", "residual", "se", "residual", "se"], {0: [], 1: [3], 2: [4], 5: []}),
+        (["residual", "residual", "residual_k1", "residual"], {0: [], 1: [3], 2: [], 4: []}),
+    )
+    @unpack
+    def test_get_repeated_partitions(self, blocks, expected):
+        layers = synthetic_model(blocks)
+        parser = PartitionHolder(layers)
+        partitions = parser.create_partitions(layers)
+        self.assertEqual(parser.get_repeated_partitions(partitions), expected)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,58 @@
+import unittest
+
+from ddt import data, ddt, unpack
+
+from fpga_hart.utils.shapes import get_dim_tiling, get_tiling
+
+
+@ddt
+class TestTiling(unittest.TestCase):
+    # (in_dim, out_dim, tile_in, kernel, stride, padding, tiles, tile_in, tile_out, reads)
+    @data(
+        # A block as big as the layer takes it in a single tile and pads its borders itself
+        (112, 112, 112, 3, 1, 1, 1, 112, 112, 112),
+        (8, 8, 16, 3, 1, 1, 1, 8, 8, 8),
+        (112, 56, 112, 3, 2, 1, 1, 112, 56, 112),
+        (16, 16, 16, 1, 1, 0, 1, 16, 16, 16),
+        # Interior cuts read the halo (kernel - stride elements) again
+        (112, 112, 56, 3, 1, 1, 3, 56, 55, 116),
+        (112, 56, 30, 3, 2, 1, 4, 30, 15, 115),
+        (16, 14, 8, 3, 1, 0, 3, 8, 6, 20),
+        # Without a halo the tiles do not overlap
+        (8, 8, 3, 1, 1, 0, 3, 3, 3, 8),
+        (8, 4, 4, 2, 2, 0, 2, 4, 2, 8),
+        # A block smaller than the kernel still takes a whole window
+        (8, 8, 1, 3, 1, 1, 6, 3, 2, 18),
+    )
+    @unpack
+    def test_get_dim_tiling(self, in_dim, out_dim, block_dim, kernel, stride, padding, tiles, tile_in, tile_out, reads):
+        tiling = get_dim_tiling(in_dim, out_dim, block_dim, kernel, stride, padding)
+        self.assertEqual(tiling["tiles"], tiles)
+        self.assertEqual(tiling["tile_in"], tile_in)
+        self.assertEqual(tiling["tile_out"], tile_out)
+        self.assertEqual(tiling["reads"], reads)
+
+    def test_get_tiling_single_tile(self):
+        tiling = get_tiling([16, 112, 112], [16, 112, 112], [16, 112, 112], [3, 3, 3], [1, 1, 1], [1, 1, 1])
+        self.assertEqual(tiling["tiles"], [1, 1, 1])
+        self.assertEqual(tiling["num_tiles"], 1)
+        self.assertEqual(tiling["reads"], 16 * 112 * 112)
+        self.assertEqual(tiling["redundant_reads"], 0)
+
+    def test_get_tiling_halos(self):
+        tiling = get_tiling([16, 112, 112], [16, 112, 112], [16, 56, 112], [3, 3, 3], [1, 1, 1], [1, 1, 1])
+        self.assertEqual(tiling["tiles"], [1, 3, 1])
+        self.assertEqual(tiling["num_tiles"], 3)
+        self.assertEqual(tiling["reads"], 16 * 116 * 112)
+        self.assertAlmostEqual(tiling["redundant_reads"], 4 / 112)
+
+    def test_get_tiling_pointwise(self):
+        tiling = get_tiling([4, 8, 8], [4, 8, 8], [2, 8, 4])
+        self.assertEqual(tiling["tiles"], [2, 1, 2])
+        self.assertEqual(tiling["tile_in"], [2, 8, 4])
+        self.assertEqual(tiling["reads"], 4 * 8 * 8)
+        self.assertEqual(tiling["redundant_reads"], 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
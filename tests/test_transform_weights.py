@@ -0,0 +1,121 @@
+import itertools
+import unittest
+
+import numpy as np
+from ddt import data, ddt, unpack
+
+from fpga_hart.backend.python_prototyping.transform_data import (
+    transform_biases, transform_weights, transform_weights_fc)
+
+
+def golden_transform_weights(weights_raw, coarse_in, coarse_out, wr_factor=1, coarse_group=1, groups=1):
+    num_filters = int(weights_raw.shape[0] / (groups * coarse_out * wr_factor))
+    num_channels = int(weights_raw.shape[1] / coarse_in)
+    kd_size, kh_size, kw_size = weights_raw.shape[2:]
+    weights = np.ndarray(
+        shape=(wr_factor, coarse_group, coarse_in, coarse_out, int(groups / coarse_group), num_channels, num_filters, kh_size, kw_size, kd_size),
+        dtype=np.float32,
+        order="C",
+    )
+    for index, _ in np.ndenumerate(weights):
+        weights[index] = weights_raw[
+            index[4] * coarse_group * num_filters * wr_factor * coarse_out
+            + index[1] * num_filters * wr_factor * coarse_out
+            + index[6] * wr_factor * coarse_out
+            + index[0] * coarse_out
+            + index[3],
+            index[5] * coarse_in + index[2],
+            index[9],
+            index[7],
+            index[8],
+        ]
+    return np.reshape(
+        weights,
+        [wr_factor, coarse_in * coarse_group, coarse_out, int(groups / coarse_group) * num_channels, num_filters, kh_size, kw_size, kd_size],
+    )
+
+
+def golden_transform_weights_fc(weights_raw, coarse_in, coarse_out, wr_factor=1):
+    num_filters = int(weights_raw.shape[0] / (coarse_out * wr_factor))
+    num_channels = int(weights_raw.shape[1] / coarse_in)
+    weights = np.ndarray(
+        shape=(wr_factor, coarse_in, coarse_out, num_channels, num_filters),
+        dtype=np.float32,
+        order="C",
+    )
+    for index, _ in np.ndenumerate(weights):
+        weights[index] = weights_raw[
+            index[4] * wr_factor * coarse_out + index[0] * coarse_out + index[2],
+            index[3] * coarse_in + index[1],
+        ]
+    return weights
+
+
+def golden_transform_biases(biases_raw, coarse_out, wr_factor=1, coarse_group=1, groups=1):
+    num_filters = int(biases_raw.shape[0] / (groups * coarse_out * wr_factor))
+    biases = np.ndarray(
+        shape=(wr_factor, coarse_group, coarse_out, int(groups / coarse_group), num_filters),
+        dtype=np.float32,
+        order="C",
+    )
+    for index, _ in np.ndenumerate(biases):
+        biases[index] = biases_raw[
+            index[3] * coarse_group * num_filters * wr_factor * coarse_out
+            + index[1] * num_filters * wr_factor * coarse_out
+            + index[4] * wr_factor * coarse_out
+            + index[0] * coarse_out
+            + index[2]
+        ]
+    return np.reshape(biases, [wr_factor, coarse_out * coarse_group, int(groups / coarse_group) * num_filters])
+
+
+# (coarse_in, coarse_out, wr_factor, groups, coarse_group, remainder). The remainder adds filters and channels that do not divide evenly by the coarse factors and are truncated
+conv_configurations = [
+    c
+    for c in itertools.product([1, 2, 4], [1, 3], [1, 2], [1, 2, 4], [1, 2], [0])
+    if c[3] % c[4] == 0
+] + [(2, 3, 2, 1, 1, 1), (4, 3, 1, 2, 2, 3), (4, 1, 2, 4, 2, 1)]
+
+# (coarse_in, coarse_out, wr_factor, remainder)
+fc_configurations = list(
+    itertools.product([1, 2, 4], [1, 3], [1, 2], [0])
+) + [(2, 3, 2, 1), (4, 3, 1, 3)]
+
+# (coarse_out, wr_factor, groups, coarse_group, remainder)
+biases_configurations = [
+    c for c in itertools.product([1, 3], [1, 2], [1, 2, 4], [1, 2], [0]) if c[2] % c[3] == 0
+] + [(3, 2, 1, 1, 1), (3, 1, 4, 2, 5)]
+
+
+@ddt
+class TestTransformWeights(unittest.TestCase):
+    @data(*conv_configurations)
+    @unpack
+    def test_transform_weights(self, coarse_in, coarse_out, wr_factor, groups, coarse_group, remainder):
+        weights_raw = np.random.randn(groups * coarse_out * wr_factor * 2 + remainder, coarse_in * 3 + remainder, 3, 2, 1).astype(np.float32)
+        expected = golden_transform_weights(weights_raw, coarse_in, coarse_out, wr_factor, coarse_group, groups)
+        result = transform_weights(weights_raw, coarse_in, coarse_out, wr_factor, coarse_group, groups)
+        self.assertEqual(result.shape, expected.shape)
+        self.assertTrue(np.array_equal(result, expected))
+
+    @data(*fc_configurations)
+    @unpack
+    def test_transform_weights_fc(self, coarse_in, coarse_out, wr_factor, remainder):
+        weights_raw = np.random.randn(coarse_out * wr_factor * 5 + remainder, coarse_in * 4 + remainder).astype(np.float32)
+        expected = golden_transform_weights_fc(weights_raw, coarse_in, coarse_out, wr_factor)
+        result = transform_weights_fc(weights_raw, coarse_in, coarse_out, wr_factor)
+        self.assertEqual(result.shape, expected.shape)
+        self.assertTrue(np.array_equal(result, expected))
+
+    @data(*biases_configurations)
+    @unpack
+    def test_transform_biases(self, coarse_out, wr_factor, groups, coarse_group, remainder):
+        biases_raw = np.random.randn(groups * coarse_out * wr_factor * 3 + remainder).astype(np.float32)
+        expected = golden_transform_biases(biases_raw, coarse_out, wr_factor, coarse_group, groups)
+        result = transform_biases(biases_raw, coarse_out, wr_factor, coarse_group, groups)
+        self.assertEqual(result.shape, expected.shape)
+        self.assertTrue(np.array_equal(result, expected))
+
+
+if __name__ == "__main__":
+    unittest.main()